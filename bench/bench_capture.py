@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+🪩 Capture benchmark suite
+
+Replays a corpus of recorded pages from a local HTTP server through
+disco-dance.py and measures:
+
+  - crawl_page end to end: pages/sec and assets/sec
+  - _rewrite_html_assets, _rewrite_css_urls and _rewrite_srcset_attr in
+    isolation, with every asset already downloaded
+  - peak RSS after each phase
+
+Every captured bundle is checked against its golden manifest in
+bench/golden/, so a performance change that alters the output shows up
+as a parity failure (exit status 1). Each --html-rewriter has its own
+goldens, since the stream rewriter keeps the page's original markup where
+the tree rewriter re-serializes it; everything but index.html must still
+match the tree golden, so the two rewriters find the same assets (except
+on pages with markup inside raw-text elements). Each page
+is also captured twice more and must be reported unchanged the second time,
+as --skip-unchanged would.
+
+The corpus is one directory per page: bench/corpus/<name>/index.html plus
+the stylesheets it uses. Images, fonts, scripts and media it references
+but does not store are served as deterministic synthetic bytes; paths
+that should 404 are listed in the page's .missing file. The server acts
+as an HTTP proxy for GOLDEN_ORIGIN, so captured URLs and asset names do
+not depend on its port. To add a real
+page, save its HTML and CSS under a new directory and record its golden
+manifest with --update-golden.
+
+Usage:
+    python bench/bench_capture.py [--repeat 3] [--pages article,docs] [--asset-workers 4] [--html-rewriter stream]
+    python bench/bench_capture.py --update-golden
+"""
+
+import argparse
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BENCH_DIR = os.path.join(ROOT, "bench")
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "corpus")
+DEFAULT_GOLDEN = os.path.join(BENCH_DIR, "golden")
+# Origin the pages are captured from; requests for it are proxied to the corpus server
+GOLDEN_ORIGIN = "http://corpus.invalid"
+# Throwaway key: the suite never signs or sends anything
+BENCH_PRIVATE_KEY = "0x" + "11" * 32
+# Pages with markup inside <textarea>/<xmp>/<title>: html.parser, the tree
+# rewriter's default, parses it as elements where browsers and the stream
+# rewriter keep it as text, so their bundles differ beyond index.html
+RAW_TEXT_MARKUP_PAGES = {'forms'}
+SYNTHETIC_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg', '.ico',
+    '.woff', '.woff2', '.ttf', '.js', '.mp4', '.webm',
+}
+
+
+def load_disco_dance():
+    """Import disco-dance.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location("disco_dance", os.path.join(ROOT, "disco-dance.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CorpusHandler(SimpleHTTPRequestHandler):
+    """Serves corpus files, synthesizing media the recording did not keep."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this every asset waits on a delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def translate_path(self, path):
+        # Proxied requests carry an absolute URL.
+        return super().translate_path(urlsplit(path).path if '://' in path else path)
+
+    def send_head(self):
+        file_path = self.translate_path(self.path)
+        _, extension = os.path.splitext(file_path)
+        if os.path.exists(file_path) or extension.lower() not in SYNTHETIC_EXTENSIONS or self._listed_missing(file_path):
+            return super().send_head()
+
+        body = synthetic_body(urlsplit(self.path).path)
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(file_path))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body) if self.command == 'GET' else None
+        return None
+
+    def _listed_missing(self, file_path):
+        """Return True if the page's .missing file says this path should 404."""
+        relative = os.path.relpath(file_path, self.directory)
+        page, _, page_path = relative.partition(os.sep)
+        missing_file = os.path.join(self.directory, page, ".missing")
+        if not os.path.exists(missing_file):
+            return False
+        with open(missing_file, "r", encoding="utf-8") as f:
+            return page_path.replace(os.sep, '/') in {line.strip() for line in f}
+
+
+def synthetic_body(url_path):
+    """Return 0.5-32 KiB of bytes derived from the URL path, identical on every run."""
+    seed = hashlib.sha256(url_path.encode('utf-8')).digest()
+    size = 512 + (seed[0] % 64) * 512
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+def start_corpus_server(corpus_dir):
+    """Serve corpus_dir on an ephemeral local port and route GOLDEN_ORIGIN to it; return the server."""
+    handler = functools.partial(CorpusHandler, directory=corpus_dir)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['http_proxy'] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.pop('no_proxy', None)
+    os.environ.pop('NO_PROXY', None)
+    return server
+
+
+def make_mirror(disco_dance, asset_workers, html_rewriter):
+    """Build a capture-only DiscoMirror whose pacing never throttles the local server."""
+    mirror = disco_dance.DiscoMirror(
+        BENCH_PRIVATE_KEY,
+        ipfs_api=None,
+        asset_workers=asset_workers,
+        html_rewriter=html_rewriter,
+    )
+    unlimited = {
+        'rate': 1e9, 'min_rate': 1e9, 'max_rate': 1e9, 'increase': 0.0, 'burst': 1e9, 'max_in_flight': 1e9,
+    }
+    mirror.rate_controller = disco_dance.HostRateController(unlimited)
+    return mirror
+
+
+def bundle_manifest(disco_dance, output_dir):
+    """Return {relative path: sha256} for a bundle, ignoring volatile snapshot.json fields."""
+    manifest = {}
+    for current_dir, _, files in os.walk(output_dir):
+        for name in files:
+            file_path = os.path.join(current_dir, name)
+            relative = os.path.relpath(file_path, output_dir).replace(os.sep, '/')
+            with open(file_path, "rb") as f:
+                data = f.read()
+            if relative == "snapshot.json":
+                snapshot = json.loads(data)
+                for field in disco_dance.VOLATILE_SNAPSHOT_FIELDS:
+                    snapshot.pop(field, None)
+                data = json.dumps(snapshot, sort_keys=True).encode('utf-8')
+            manifest[relative] = hashlib.sha256(data).hexdigest()
+    return dict(sorted(manifest.items()))
+
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_end_to_end(disco_dance, mirror, pages, repeat):
+    """Time crawl_page over every page; return (best seconds, assets per pass, {page: manifest})."""
+    best = None
+    manifests = {}
+    assets = 0
+    for run in range(repeat):
+        assets = 0
+        started = time.perf_counter()
+        for page in pages:
+            with tempfile.TemporaryDirectory(prefix="discoball-bench-") as output_dir:
+                snapshot = mirror.crawl_page(f"{GOLDEN_ORIGIN}/{page}/index.html", "corpus.invalid", f"/{page}/", output_dir)
+                if snapshot is None:
+                    raise RuntimeError(f"crawl_page failed for {page}")
+                assets += snapshot['resources_localized']
+                if run == 0:
+                    manifests[page] = bundle_manifest(disco_dance, output_dir)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, assets, manifests
+
+
+def bench_rewrites(mirror, pages, repeat):
+    """Time the HTML, CSS and srcset rewrites alone, against a warm asset cache."""
+    from bs4 import BeautifulSoup
+
+    timings = {'html': 0.0, 'css': 0.0, 'srcset': 0.0}
+    counts = {'html': 0, 'css': 0, 'srcset': 0}
+    with tempfile.TemporaryDirectory(prefix="discoball-bench-") as output_dir:
+        for page in pages:
+            page_url = f"{GOLDEN_ORIGIN}/{page}/index.html"
+            html_bytes = mirror._fetch(page_url).content
+            asset_cache = {}
+            capture_report = mirror._new_capture_report()
+
+            # Warm-up pass downloads every asset, so timed passes only rewrite.
+            warm_soup = BeautifulSoup(html_bytes, mirror.html_parser)
+            mirror._rewrite_html_assets(warm_soup, page_url, output_dir, asset_cache, capture_report)
+            stylesheets = []
+            for css_url, local_path in asset_cache.items():
+                if local_path and local_path.endswith('.css'):
+                    css_text = mirror._fetch(css_url).text
+                    stylesheets.append((css_text, css_url, local_path))
+                    mirror._rewrite_css_urls(css_text, css_url, output_dir, asset_cache, capture_report, css_path=local_path)
+
+            soups = [BeautifulSoup(html_bytes, mirror.html_parser) for _ in range(repeat)]
+            started = time.perf_counter()
+            for soup in soups:
+                mirror._rewrite_html_assets(soup, page_url, output_dir, asset_cache, capture_report)
+            timings['html'] += (time.perf_counter() - started) / repeat
+            counts['html'] += 1
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for css_text, css_url, local_path in stylesheets:
+                    mirror._rewrite_css_urls(css_text, css_url, output_dir, asset_cache, capture_report, css_path=local_path)
+            timings['css'] += (time.perf_counter() - started) / repeat
+            counts['css'] += len(stylesheets)
+
+            srcset_tags = [
+                [tag for tag in BeautifulSoup(html_bytes, mirror.html_parser).find_all(srcset=True)]
+                for _ in range(repeat)
+            ]
+            started = time.perf_counter()
+            for tags in srcset_tags:
+                for tag in tags:
+                    mirror._rewrite_srcset_attr(tag, page_url, output_dir, asset_cache, capture_report)
+            timings['srcset'] += (time.perf_counter() - started) / repeat
+            counts['srcset'] += len(srcset_tags[0])
+    return timings, counts
+
+
+def tree_mismatches(page, manifest, golden_dir):
+    """Return the files other than index.html where a non-tree bundle differs from the tree golden."""
+    if page in RAW_TEXT_MARKUP_PAGES:
+        return []
+    try:
+        with open(os.path.join(golden_dir, f"{page}.json"), "r", encoding="utf-8") as f:
+            golden = json.load(f)
+    except FileNotFoundError:
+        return []
+    return [
+        path for path in set(golden) | set(manifest)
+        if path != "index.html" and golden.get(path) != manifest.get(path)
+    ]
+
+
+def check_unchanged(disco_dance, mirror, pages):
+    """Capture every page twice; return the pages whose second capture is not reported unchanged."""
+    changed = []
+    for page in pages:
+        with tempfile.TemporaryDirectory(prefix="discoball-bench-") as first_dir, \
+                tempfile.TemporaryDirectory(prefix="discoball-bench-") as second_dir:
+            for output_dir in (first_dir, second_dir):
+                if mirror.crawl_page(f"{GOLDEN_ORIGIN}/{page}/index.html", "corpus.invalid", f"/{page}/", output_dir) is None:
+                    raise RuntimeError(f"crawl_page failed for {page}")
+            published = {'cid': 'previous-capture', 'bundle_digest': disco_dance.bundle_digest(first_dir)}
+            if mirror._bundle_matches_published(second_dir, published, disco_dance.bundle_digest(second_dir)):
+                print(f"  {page:<10} ok")
+            else:
+                changed.append(page)
+                print(f"  {page:<10} CHANGED between two identical captures")
+    return changed
+
+
+def check_parity(manifests, golden_dir, html_rewriter, update):
+    """Compare bundle manifests with the golden ones (or rewrite them); return the pages that differ."""
+    mismatched = []
+    suffix = "" if html_rewriter == 'tree' else f".{html_rewriter}"
+    for page, manifest in manifests.items():
+        golden_path = os.path.join(golden_dir, f"{page}{suffix}.json")
+        if update:
+            os.makedirs(golden_dir, exist_ok=True)
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+                f.write("\n")
+            continue
+        try:
+            with open(golden_path, "r", encoding="utf-8") as f:
+                golden = json.load(f)
+        except FileNotFoundError:
+            print(f"  {page:<10} no golden manifest (run with --update-golden)")
+            mismatched.append(page)
+            continue
+        differing = sorted(
+            path for path in set(golden) | set(manifest) if golden.get(path) != manifest.get(path)
+        )
+        if suffix:
+            differing += sorted(f"{path} (vs tree)" for path in tree_mismatches(page, manifest, golden_dir))
+        if differing:
+            mismatched.append(page)
+            print(f"  {page:<10} MISMATCH in {len(differing)} files: {', '.join(differing[:5])}")
+        else:
+            print(f"  {page:<10} ok ({len(manifest)} files)")
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the disco-dance.py capture path over a page corpus")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Corpus directory (default: bench/corpus)')
+    parser.add_argument('--golden', default=DEFAULT_GOLDEN, help='Golden manifest directory (default: bench/golden)')
+    parser.add_argument('--pages', default=None, help='Comma-separated page names (default: the whole corpus)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes; end-to-end reports the best (default: 3)')
+    parser.add_argument('--asset-workers', type=int, default=1, help='Parallel asset downloads per page (default: 1)')
+    parser.add_argument('--html-rewriter', default='tree', help='DiscoMirror HTML rewriter: tree or stream (default: tree)')
+    parser.add_argument('--update-golden', action='store_true', help='Record the current output as the golden bundles')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    disco_dance = load_disco_dance()
+    pages = args.pages.split(',') if args.pages else sorted(
+        name for name in os.listdir(args.corpus) if os.path.isfile(os.path.join(args.corpus, name, "index.html"))
+    )
+    server = start_corpus_server(args.corpus)
+    mirror = make_mirror(disco_dance, args.asset_workers, args.html_rewriter)
+    try:
+        print(f"Corpus: {len(pages)} pages ({', '.join(pages)}), best of {args.repeat}, "
+              f"{args.asset_workers} asset worker(s), {args.html_rewriter} rewriter\n")
+
+        seconds, assets, manifests = bench_end_to_end(disco_dance, mirror, pages, args.repeat)
+        print("crawl_page end to end")
+        print(f"  {seconds * 1000:9.1f} ms  {len(pages) / seconds:8.1f} pages/s  {assets / seconds:9.1f} assets/s")
+        print(f"  peak RSS {peak_rss_mb():.1f} MiB\n")
+
+        timings, counts = bench_rewrites(mirror, pages, args.repeat)
+        print("Rewrites with a warm asset cache (per pass over the corpus)")
+        print(f"  _rewrite_html_assets  {timings['html'] * 1000:9.2f} ms  ({counts['html']} documents)")
+        print(f"  _rewrite_css_urls     {timings['css'] * 1000:9.2f} ms  ({counts['css']} stylesheets)")
+        print(f"  _rewrite_srcset_attr  {timings['srcset'] * 1000:9.2f} ms  ({counts['srcset']} srcset attributes)")
+        print(f"  peak RSS {peak_rss_mb():.1f} MiB\n")
+
+        print("Golden bundle parity" + (" (updating)" if args.update_golden else ""))
+        mismatched = check_parity(manifests, args.golden, args.html_rewriter, args.update_golden)
+
+        print("\nUnchanged detection (two captures of each page)")
+        mismatched += check_unchanged(disco_dance, mirror, pages)
+    finally:
+        server.shutdown()
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+🪩 Fetch backend benchmark
+
+Fetches a page and every asset it references with each fetch backend
+(requests over HTTP/1.1, httpx over HTTP/2) and reports wall time, bytes
+and the HTTP versions negotiated. Asset requests run concurrently, like
+disco-dance.py with --asset-workers, so multiplexing shows up in the
+numbers. Needs network access to the pages given.
+
+Usage:
+    python bench/bench_fetch_backends.py [--workers 8] [--repeat 3] https://example.com/ ...
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urldefrag
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+USER_AGENT = 'DiscoBall-Mirror/1.0 (+https://github.com/pierce403/discoball)'
+ASSET_SELECTORS = [
+    ('img', 'src'),
+    ('script', 'src'),
+    ('link', 'href'),
+    ('source', 'src'),
+    ('video', 'poster'),
+]
+
+
+def load_disco_dance():
+    """Import disco-dance.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location("disco_dance", os.path.join(ROOT, "disco-dance.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def page_asset_urls(page_url, html_text):
+    """Return the absolute, de-duplicated asset URLs referenced by a page."""
+    soup = BeautifulSoup(html_text, 'html.parser')
+    urls = []
+    for tag_name, attr_name in ASSET_SELECTORS:
+        for tag in soup.find_all(tag_name):
+            value = tag.get(attr_name)
+            if not value or value.startswith(('data:', 'javascript:')):
+                continue
+            url = urldefrag(urljoin(page_url, value))[0]
+            if url.startswith(('http://', 'https://')) and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def fetch_all(backend, page_url, workers):
+    """Fetch a page and its assets; return (seconds, bytes, asset count, failures)."""
+    started = time.perf_counter()
+    page = backend.get(page_url, timeout=30)
+    total_bytes = len(page.content)
+    asset_urls = page_asset_urls(page.url, page.text)
+
+    def fetch_one(asset_url):
+        try:
+            response = backend.get(asset_url, headers={'Referer': page.url}, timeout=30, stream=True)
+        except Exception:
+            return None
+        try:
+            return sum(len(chunk) for chunk in response.iter_content(chunk_size=64 * 1024))
+        except Exception:
+            return None
+        finally:
+            response.close()
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for size in pool.map(fetch_one, asset_urls):
+            if size is None:
+                failures += 1
+            else:
+                total_bytes += size
+    return time.perf_counter() - started, total_bytes, len(asset_urls), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare disco-dance.py fetch backends")
+    parser.add_argument('urls', nargs='+', help='Pages to fetch along with their assets')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent asset fetches (default: 8)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per backend; the best is reported (default: 3)')
+    args = parser.parse_args()
+
+    disco_dance = load_disco_dance()
+    for page_url in args.urls:
+        print(f"\n{page_url}")
+        for name in disco_dance.FETCH_BACKENDS:
+            try:
+                # A fresh backend per run, so every run pays connection setup like a real capture.
+                runs = []
+                for _ in range(args.repeat):
+                    backend = disco_dance.create_fetch_backend(name, USER_AGENT, args.workers)
+                    try:
+                        runs.append(fetch_all(backend, page_url, args.workers))
+                    finally:
+                        backend.close()
+            except Exception as e:
+                print(f"  {name:<9} unavailable: {e}")
+                continue
+            seconds, total_bytes, asset_count, failures = min(runs)
+            print(
+                f"  {name:<9} {seconds * 1000:8.0f} ms  {total_bytes / 1024:9.0f} KiB  "
+                f"{asset_count} assets, {failures} failed"
+            )
+
+
+if __name__ == "__main__":
+    main()
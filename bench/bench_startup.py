@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+🪩 CLI startup benchmark
+
+Runs the cheap entry points of disco-dance.py and disco-party.py (--help,
+argument errors, --create-sample) in fresh interpreters and reports the
+median wall time of each. It also checks, with python -X importtime, that
+none of them loads the heavy libraries (web3, eth_account, ipfshttpclient,
+bs4, dnspython) that only publishing, pinning and capturing need. Exits 1
+when a path imports one of them or runs over --budget, so it can guard
+the cron and systemd timer use case.
+
+Usage:
+    python bench/bench_startup.py [--repeat 5] [--budget 1.0]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Top-level packages a fast path must not import
+HEAVY_MODULES = ('web3', 'eth_account', 'ipfshttpclient', 'bs4', 'dns')
+# (label, script, arguments); each runs in a scratch working directory
+ENTRY_POINTS = [
+    ('disco-dance --help', 'disco-dance.py', ['--help']),
+    ('disco-dance (no URL)', 'disco-dance.py', []),
+    ('disco-party --help', 'disco-party.py', ['--help']),
+    ('disco-party --create-sample', 'disco-party.py', ['--create-sample']),
+]
+
+
+def run_entry_point(script, arguments, work_dir, importtime=False):
+    """Run one entry point in a fresh interpreter; return (seconds, stderr)."""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [os.path.join(ROOT, script)] + arguments
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - started, completed.stderr
+
+
+def imported_heavy_modules(importtime_output):
+    """Return the HEAVY_MODULES named in -X importtime output."""
+    found = set()
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or line.count('|') < 2:
+            continue
+        module = line.rsplit('|', 1)[1].strip()
+        top_level = module.split('.', 1)[0]
+        if top_level in HEAVY_MODULES:
+            found.add(top_level)
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup of disco-dance.py and disco-party.py")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per entry point; the median is reported (default: 5)')
+    parser.add_argument('--budget', type=float, default=1.0, help='Seconds a fast path may take (default: 1.0)')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<30} {'median':>9} {'min':>9}  heavy imports")
+    with tempfile.TemporaryDirectory(prefix="discoball-startup-") as work_dir:
+        for label, script, arguments in ENTRY_POINTS:
+            timings = [run_entry_point(script, arguments, work_dir)[0] for _ in range(args.repeat)]
+            _, importtime_output = run_entry_point(script, arguments, work_dir, importtime=True)
+            heavy = imported_heavy_modules(importtime_output)
+            median = statistics.median(timings)
+            print(f"{label:<30} {median * 1000:7.0f}ms {min(timings) * 1000:7.0f}ms  {', '.join(heavy) or '-'}")
+            if heavy:
+                failures.append(f"{label} imports {', '.join(heavy)}")
+            if median > args.budget:
+                failures.append(f"{label} took {median:.2f}s (budget {args.budget:.2f}s)")
+
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        sys.exit(1)
+    print("\n✅ All fast paths within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,23 +15,43 @@ Requirements:
 """
 
 import argparse
-import dns.resolver
+import codecs
+import contextlib
+import datetime
 import requests
-from bs4 import BeautifulSoup
-import ipfshttpclient
 import json
 import mimetypes
 import os
+import posixpath
+import queue
+import random
 import re
+import signal
+import shutil
 import tempfile
-from web3 import Web3
-from eth_account import Account
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import heapq
+import html
+import io
 import time
-from urllib.parse import urljoin, urlparse
+import xml.etree.ElementTree as ElementTree
+import zlib
+from collections import deque
+from decimal import Decimal
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, urlunparse
 import logging
 from email.utils import parsedate_to_datetime
 
+from discoball_css import find_css_references, rewrite_css_references
+from discoball_optimize import OPTIMIZE_MAX_BYTES, OPTIMIZED_CONTENT_TYPES, optimize_asset
+
+# web3, eth_account, ipfshttpclient, bs4 and dnspython (via discoball_dns) are
+# imported where they are first needed: together they take seconds to load,
+# which --help, argument errors and unchanged cron runs should not pay for.
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -49,123 +69,1471 @@ CONTRACT_ABI = [
         "outputs": [],
         "stateMutability": "nonpayable",
         "type": "function"
+    },
+    {
+        "inputs": [
+            {"internalType": "string", "name": "domain", "type": "string"},
+            {"internalType": "string", "name": "path", "type": "string"}
+        ],
+        "name": "getLatestByDomainPath",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "string", "name": "domain", "type": "string"},
+                    {"internalType": "string", "name": "path", "type": "string"},
+                    {"internalType": "string", "name": "ipfsHash", "type": "string"},
+                    {"internalType": "address", "name": "publisher", "type": "address"},
+                    {"internalType": "uint256", "name": "timestamp", "type": "uint256"},
+                    {"internalType": "uint256", "name": "entryId", "type": "uint256"}
+                ],
+                "internalType": "struct DiscoBallRegistry.MirrorEntry",
+                "name": "",
+                "type": "tuple"
+            }
+        ],
+        "stateMutability": "view",
+        "type": "function"
     }
 ]
 
+# Safety margin applied to estimate_gas for publish transactions
+GAS_ESTIMATE_MARGIN = 1.2
+MAX_RECEIPT_WAITERS = 16
+RECEIPT_POLL_SECONDS = 2.0
+# Replacement transactions must outbid the stuck one by at least 10% on every fee field
+FEE_BUMP_RATIO = 1.125
+OUTBOX_RETENTION_SECONDS = 30 * 24 * 3600
+
+# Selectable with --fetch-backend / DISCOBALL_FETCH_BACKEND
+FETCH_BACKENDS = ('requests', 'http2')
+
+# Per-host request limits shipped next to this script; see HostRateController
+DEFAULT_HOST_LIMITS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "host-limits.json")
+HOST_LIMIT_FIELDS = ('rate', 'min_rate', 'max_rate', 'increase', 'burst', 'max_in_flight')
+RATE_DECREASE_FACTOR = 0.5
+# First wait before retrying deferred assets whose host set no cooldown; doubles every round
+DEFERRED_RETRY_BACKOFF_SECONDS = 1.0
+
+
+# Bundle subdirectory for in-flight streamed downloads; removed before upload
+PARTIAL_DIR_NAME = '.partial'
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# snapshot.json fields that change on every capture even when the page did not
+VOLATILE_SNAPSHOT_FIELDS = ('timestamp', 'metrics')
+
+# Upper bounds (seconds) of the per-host fetch latency histogram buckets
+FETCH_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Per-host counters; the *_seconds ones accumulate time rather than events
+HOST_COUNTERS = ('requests', 'errors', 'retries', 'bytes', 'rate_limit_wait_seconds', 'cooldown_rejections')
+
+# (tag, attribute) pairs that reference render assets
+ASSET_URL_ATTRS = (
+    ('img', 'src'),
+    ('script', 'src'),
+    ('script', 'href'),
+    ('source', 'src'),
+    ('video', 'src'),
+    ('video', 'poster'),
+    ('audio', 'src'),
+    ('iframe', 'src'),
+    ('embed', 'src'),
+    ('track', 'src'),
+    ('object', 'data'),
+    ('input', 'src'),
+    ('image', 'src'),
+    ('image', 'href'),
+    ('image', 'xlink:href'),
+    ('use', 'href'),
+    ('use', 'xlink:href'),
+)
+# Link path extensions followed as pages in --crawl mode
+PAGE_EXTENSIONS = {'', '.html', '.htm', '.xhtml', '.shtml', '.php', '.asp', '.aspx', '.jsp', '.cgi'}
+ASSET_ATTRS_BY_TAG = {}
+for _tag_name, _attr_name in ASSET_URL_ATTRS:
+    ASSET_ATTRS_BY_TAG.setdefault(_tag_name, []).append(_attr_name)
+NETWORK_HINT_REL_VALUES = {'dns-prefetch', 'preconnect', 'prerender', 'pingback'}
+# Passes of the old multi-pass rewrite engine, in order; the single-walk rewrite
+# reports missing resources in this order so capture reports stay the same
+REWRITE_PASSES = tuple(f'{_tag_name}[{_attr_name}]' for _tag_name, _attr_name in ASSET_URL_ATTRS) + (
+    'srcset', 'link', 'meta', 'style', 'style_attr', 'page_link', 'hint:base', 'hint:link', 'hint:meta',
+)
+REWRITE_PASS_RANK = {name: rank for rank, name in enumerate(REWRITE_PASSES)}
+META_IMAGE_KEYS = {'og:image', 'twitter:image', 'twitter:image:src', 'msapplication-tileimage'}
+OFFLINE_CSP = (
+    "default-src 'self' data: blob:; "
+    "img-src 'self' data: blob:; "
+    "media-src 'self' data: blob:; "
+    "font-src 'self' data: blob:; "
+    "style-src 'self' 'unsafe-inline' data: blob:; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' blob:; "
+    "connect-src 'self'; "
+    "frame-src 'self' data: blob:; "
+    "worker-src 'self' blob:; "
+    "child-src 'self' blob:; "
+    "object-src 'self' data: blob:; "
+    "manifest-src 'self'; "
+    "form-action 'self'; "
+    "base-uri 'self'"
+)
+
+# Selectable with --html-rewriter / DISCOBALL_HTML_REWRITER; see StreamingHtmlRewriter
+HTML_REWRITERS = ('tree', 'stream')
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+# Elements whose contents are text, not markup, in an HTML5 tree builder (noscript is
+# markup there, since it parses with scripting off); the stream rewriter copies them verbatim
+RAW_TEXT_ELEMENTS = {'script', 'style', 'textarea', 'title', 'xmp', 'plaintext'}
+# Attributes BeautifulSoup splits into lists; StreamTag does the same so the rewrite helpers see one shape
+MULTI_VALUED_ATTRS = {'class', 'rel', 'rev', 'accept-charset', 'headers', 'accesskey', 'dropzone'}
+# How far into a page browsers look for a <meta charset>
+HTML_CHARSET_PRESCAN_BYTES = 1024
+_META_CHARSET = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+# --daemon recrawl intervals: halved after a capture with a new bundle, grown
+# after an unchanged one, and jittered so targets added together drift apart
+RECRAWL_SHRINK_FACTOR = 0.5
+RECRAWL_GROWTH_FACTOR = 1.5
+RECRAWL_JITTER = 0.1
+BANDWIDTH_WINDOW_SECONDS = 3600
+
+# Sitemaps protocol limit on one (uncompressed) sitemap file
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+# Sitemap files read per run, counting those reached through sitemap indexes
+MAX_SITEMAP_FILES = 1000
+
+# BeautifulSoup parser for captured pages; lxml is faster but serializes
+# pages differently, so it is opt-in (--html-parser lxml)
+DEFAULT_HTML_PARSER = 'html.parser'
+
+def private_key_address(private_key):
+    """Return the checksummed address for a hex private key (eth_keys loads much faster than eth_account)."""
+    from eth_keys import keys
+
+    key_hex = private_key[2:] if private_key[:2].lower() == '0x' else private_key
+    return keys.PrivateKey(bytes.fromhex(key_hex)).public_key.to_checksum_address()
+
+
+def file_sha256(file_path):
+    """Return the hex sha256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as source_file:
+        for chunk in iter(lambda: source_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def comparable_snapshot(snapshot):
+    """Return snapshot.json contents without what differs between two captures of an unchanged page.
+
+    Volatile fields are dropped, and error strings (which carry ports,
+    timings and library wording) are cut down to their reason code.
+    """
+    comparable = {field: value for field, value in snapshot.items() if field not in VOLATILE_SNAPSHOT_FIELDS}
+    comparable['missing_resources'] = [
+        dict(entry, reason=entry.get('reason', '').split(':', 1)[0]) for entry in snapshot.get('missing_resources', [])
+    ]
+    if 'pages' in snapshot:
+        comparable['pages'] = [
+            dict(page, error=page['error'].split(':', 1)[0]) if 'error' in page else page for page in snapshot['pages']
+        ]
+    if 'deferred_assets' in snapshot:
+        comparable['deferred_assets'] = {
+            name: value for name, value in snapshot['deferred_assets'].items() if name != 'wait_seconds'
+        }
+    return comparable
+
+
+def bundle_digest(bundle_dir):
+    """Return a sha256 over a bundle's file paths and contents, with snapshot.json made comparable.
+
+    Unlike a CID it does not depend on how the bundle is laid out in IPFS.
+    """
+    entries = []
+    for current_dir, dirs, files in os.walk(bundle_dir):
+        dirs[:] = [name for name in dirs if name != PARTIAL_DIR_NAME]
+        for name in files:
+            file_path = os.path.join(current_dir, name)
+            relative = os.path.relpath(file_path, bundle_dir).replace(os.sep, '/')
+            if relative == "snapshot.json":
+                with open(file_path, "r", encoding="utf-8") as snapshot_file:
+                    snapshot = comparable_snapshot(json.load(snapshot_file))
+                file_digest = hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode('utf-8')).hexdigest()
+            else:
+                file_digest = file_sha256(file_path)
+            entries.append(f"{relative}\0{file_digest}\n")
+    return hashlib.sha256(''.join(sorted(entries)).encode('utf-8')).hexdigest()
+
+
+def load_json_state(path, default):
+    """Load a JSON state file, returning default if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state file {path}: {e}")
+        return default
+
+
+def save_json_state(path, data):
+    """Atomically write a JSON state file."""
+    state_dir = os.path.dirname(path)
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as state_file:
+        json.dump(data, state_file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def parse_sitemap(data):
+    """Return ('urlset' or 'sitemapindex', [(loc, lastmod)]) for a sitemap document, gzipped or not."""
+    if data[:2] == b'\x1f\x8b':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(data, SITEMAP_MAX_BYTES)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"sitemap is larger than {SITEMAP_MAX_BYTES} bytes")
+    elif len(data) > SITEMAP_MAX_BYTES:
+        raise ValueError(f"sitemap is larger than {SITEMAP_MAX_BYTES} bytes")
+    root = ElementTree.fromstring(data)
+    kind = root.tag.rsplit('}', 1)[-1]
+    if kind not in ('urlset', 'sitemapindex'):
+        raise ValueError(f"not a sitemap (root element <{kind}>)")
+    entry_name = 'url' if kind == 'urlset' else 'sitemap'
+    entries = []
+    for entry in root:
+        if entry.tag.rsplit('}', 1)[-1] != entry_name:
+            continue
+        fields = {field.tag.rsplit('}', 1)[-1]: (field.text or '').strip() for field in entry}
+        if fields.get('loc'):
+            entries.append((fields['loc'], fields.get('lastmod') or None))
+    return kind, entries
+
+
+def normalize_lastmod(lastmod):
+    """Return a sitemap <lastmod> as a UTC ISO 8601 string, so equal times compare equal; None stays None."""
+    if not lastmod:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(lastmod)
+    except ValueError:
+        return lastmod
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc).isoformat()
+
+
+class AssetTooLarge(Exception):
+    """Raised when an asset would exceed the per-asset or per-snapshot byte cap."""
+
+
+class CaptureJournal:
+    """Append-only JSON-lines log of a capture's progress, replayed to resume an interrupted run.
+
+    The first entry describes the run; later entries record finished asset
+    downloads and the captured/uploaded milestones. Each entry is flushed as
+    it is written, so a killed process loses at most the line in flight.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self._valid_bytes = 0
+        self._file = None
+        self._lock = threading.Lock()
+        try:
+            with open(path, "rb") as journal_file:
+                for line in journal_file:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        break
+                    self._valid_bytes += len(line)
+        except FileNotFoundError:
+            pass
+
+    def begin(self, run):
+        """Open the journal for writing; return True if it already holds progress for the same run."""
+        header = self.entries[0] if self.entries else None
+        resuming = bool(header and header.get('type') == 'run' and header.get('run') == run)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if resuming:
+            # Drop a torn last line so appended entries start on a line of their own.
+            with open(self.path, "r+b") as journal_file:
+                journal_file.truncate(self._valid_bytes)
+            self._file = open(self.path, "a", encoding="utf-8")
+        else:
+            self.entries = []
+            self._file = open(self.path, "w", encoding="utf-8")
+            self.record('run', run=run)
+        return resuming
+
+    def record(self, entry_type, **fields):
+        entry = dict(fields, type=entry_type)
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self.entries.append(entry)
+
+    def of_type(self, entry_type):
+        return [entry for entry in self.entries if entry.get('type') == entry_type]
+
+    def last(self, entry_type):
+        return next((entry for entry in reversed(self.entries) if entry.get('type') == entry_type), None)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CidIndex:
+    """Persistent map from file content sha256 to the IPFS CID it was added as."""
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = load_json_state(path, {})
+        self._dirty = False
+        # Batch mode uploads one bundle while the next one streams into IPFS.
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        return self._entries.get(digest)
+
+    def set(self, digest, cid):
+        with self._lock:
+            if self._entries.get(digest) != cid:
+                self._entries[digest] = cid
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        save_json_state(self.path, entries)
+
+
+class HttpCache:
+    """On-disk HTTP cache keyed by URL that revalidates with ETag/Last-Modified."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(cache_dir)
+            if entry.is_file() and entry.name.endswith('.body')
+        )
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _entry_paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.json", f"{base}.body"
+
+    def _load_meta(self, url):
+        meta_path, body_path = self._entry_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(body_path):
+            return None
+        return meta
+
+    def conditional_headers(self, url):
+        """Return If-None-Match/If-Modified-Since headers for a cached URL."""
+        meta = self._load_meta(url)
+        if not meta:
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def cached_response(self, url, not_modified_response, stream=False):
+        """Build a 200 response from the cached body after a 304, or None if the entry vanished.
+
+        With stream the body is read lazily from disk and the file is closed
+        with the response; otherwise it is read up front.
+        """
+        meta = self._load_meta(url)
+        if not meta:
+            return None
+        meta_path, body_path = self._entry_paths(url)
+        try:
+            body_file = open(body_path, "rb")
+        except OSError:
+            return None
+
+        # Servers may refresh validators on a 304.
+        etag = not_modified_response.headers.get('ETag')
+        last_modified = not_modified_response.headers.get('Last-Modified')
+        if (etag and etag != meta.get('etag')) or (last_modified and last_modified != meta.get('last_modified')):
+            meta['etag'] = etag or meta.get('etag')
+            meta['last_modified'] = last_modified or meta.get('last_modified')
+            self._write_meta(meta_path, meta)
+        else:
+            # Touch the entry so LRU eviction sees it as recently used.
+            os.utime(meta_path)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = meta.get('final_url') or url
+        response.headers = requests.structures.CaseInsensitiveDict(meta.get('headers') or {})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.request = not_modified_response.request
+        # store() skips responses that came out of the cache.
+        response.from_cache = True
+        if not stream:
+            with body_file:
+                response._content = body_file.read()
+            return response
+
+        # Serve the body lazily from disk so streaming readers never load it whole.
+        response.raw = body_file
+        close_response = response.close
+
+        def close():
+            # Response.close() leaves raw open once the body has been read.
+            body_file.close()
+            close_response()
+
+        response.close = close
+        return response
+
+    def store(self, url, response, source_path=None):
+        """Cache a 200 response body (or a file already holding it) if it carries validators."""
+        if getattr(response, 'from_cache', False):
+            return
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        if 'no-store' in response.headers.get('Cache-Control', '').lower():
+            return
+
+        body_size = os.path.getsize(source_path) if source_path else len(response.content)
+        if body_size > self.max_bytes:
+            return
+
+        meta_path, body_path = self._entry_paths(url)
+        meta = {
+            'url': url,
+            'final_url': response.url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'headers': {
+                name: response.headers[name]
+                for name in ('Content-Type', 'ETag', 'Last-Modified')
+                if name in response.headers
+            },
+            'size': body_size,
+        }
+        with self._lock:
+            previous_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            if source_path:
+                shutil.copyfile(source_path, tmp_path)
+            else:
+                with open(tmp_path, "wb") as body_file:
+                    body_file.write(response.content)
+            os.replace(tmp_path, body_path)
+            self._write_meta(meta_path, meta)
+            self._total_bytes += body_size - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, meta_path)
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                body_path = entry.path[:-len('.json')] + '.body'
+                try:
+                    body_size = os.path.getsize(body_path)
+                except OSError:
+                    body_size = 0
+                entries.append((entry.stat().st_mtime, entry.path, body_path, body_size))
+
+        entries.sort()
+        for _, meta_path, body_path, body_size in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            for stale_path in (meta_path, body_path):
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+            self._total_bytes -= body_size
+        logger.debug(f"HTTP cache trimmed to {self._total_bytes} bytes")
+
+
+class RequestsFetchBackend:
+    """Fetches over a requests.Session: HTTP/1.1, one pooled connection per in-flight request."""
+
+    name = 'requests'
+
+    def __init__(self, user_agent, pool_size=1):
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        if pool_size > 1:
+            # Let parallel asset fetches keep their connections alive instead of churning the pool.
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, pool_size))
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        return self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+
+    def close(self):
+        self.session.close()
+
+
+class Http2FetchBackend:
+    """Fetches over httpx with HTTP/2, multiplexing concurrent requests on one connection per origin.
+
+    Responses come back as requests.Response objects and transport errors as
+    requests exceptions, so retries, the HTTP cache and streaming downloads
+    behave exactly as with RequestsFetchBackend. Origins that only speak
+    HTTP/1.1 are still fetched, over a pool of ordinary connections.
+    """
+
+    name = 'http2'
+
+    def __init__(self, user_agent, pool_size=1):
+        try:
+            import httpx
+            self.client = httpx.Client(
+                http2=True,
+                follow_redirects=True,
+                max_redirects=requests.models.DEFAULT_REDIRECT_LIMIT,
+                headers={'User-Agent': user_agent},
+                limits=httpx.Limits(max_keepalive_connections=max(10, pool_size)),
+            )
+        except ImportError as e:
+            raise RuntimeError(f"The http2 fetch backend needs httpx with HTTP/2 support (pip install 'httpx[http2]'): {e}")
+        self._httpx = httpx
+        # httpx logs every request at INFO, which would drown out the capture log.
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        try:
+            request = self.client.build_request('GET', url, headers=headers, timeout=timeout)
+            upstream = self.client.send(request, stream=True)
+            if not stream:
+                upstream.read()
+        except self._httpx.HTTPError as e:
+            raise self._translate_error(e) from e
+
+        # httpx has already undone any Content-Encoding, so the body is read as-is.
+        response = self._adapt_response(upstream, io.BytesIO(upstream.content) if not stream else _Http2StreamBody(upstream, self))
+        # Redirect hops, oldest first as in requests, so callers (and the HTTP cache) see the originally requested URL.
+        response.history = [self._adapt_response(hop, io.BytesIO(b'')) for hop in upstream.history]
+        return response
+
+    def _adapt_response(self, upstream, raw):
+        """Return a requests.Response carrying an httpx response's status, headers and URL, reading its body from raw."""
+        response = requests.Response()
+        response.status_code = upstream.status_code
+        response.reason = upstream.reason_phrase
+        response.url = str(upstream.url)
+        response.headers = requests.structures.CaseInsensitiveDict(upstream.headers.multi_items())
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.request = requests.Request('GET', str(upstream.request.url), headers=dict(upstream.request.headers)).prepare()
+        response.raw = raw
+        return response
+
+    def close(self):
+        self.client.close()
+
+    def _translate_error(self, error):
+        """Map an httpx exception onto the requests exception _fetch retries on."""
+        httpx = self._httpx
+        if isinstance(error, httpx.TooManyRedirects):
+            return requests.TooManyRedirects(str(error))
+        if isinstance(error, httpx.TimeoutException):
+            return requests.Timeout(str(error))
+        return requests.ConnectionError(str(error) or type(error).__name__)
+
+
+class _Http2StreamBody:
+    """File-like reader over a streamed httpx response, used as requests.Response.raw."""
+
+    def __init__(self, upstream, backend):
+        self._upstream = upstream
+        self._backend = backend
+        self._chunks = upstream.iter_bytes()
+        self._buffer = bytearray()
+
+    def read(self, amt=None):
+        try:
+            while amt is None or len(self._buffer) < amt:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._buffer += chunk
+        except self._backend._httpx.HTTPError as e:
+            raise self._backend._translate_error(e) from e
+        if amt is None:
+            amt = len(self._buffer)
+        data = bytes(self._buffer[:amt])
+        del self._buffer[:amt]
+        return data
+
+    def close(self):
+        self._upstream.close()
+
+    # requests.Response.close() only closes raw for unconsumed bodies, but always releases the connection.
+    release_conn = close
+
+
+def create_fetch_backend(name, user_agent, pool_size=1):
+    """Build the fetch backend registered under name."""
+    if name == 'http2':
+        return Http2FetchBackend(user_agent, pool_size)
+    if name == 'requests':
+        return RequestsFetchBackend(user_agent, pool_size)
+    raise ValueError(f"Unknown fetch backend {name!r}; expected one of {', '.join(FETCH_BACKENDS)}")
+
+
+class HostRateController:
+    """Per-host token buckets whose rate grows on success and halves on 429/503 (AIMD).
+
+    Each host also gets a cap on concurrent requests and a cooldown when it
+    sends Retry-After, or when it keeps rate limiting us at the minimum rate.
+    """
+
+    def __init__(self, defaults, host_overrides=None, default_cooldown=120.0):
+        self.defaults = defaults
+        self.host_overrides = host_overrides or {}
+        self.default_cooldown = default_cooldown
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+    def limits_for(self, host):
+        """Return the configured limits for a host, most specific domain suffix first."""
+        limits = dict(self.defaults)
+        labels = host.split('.')
+        for index in range(len(labels) - 1, -1, -1):
+            override = self.host_overrides.get('.'.join(labels[index:]))
+            if override:
+                limits.update(override)
+        return limits
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            limits = self.limits_for(host)
+            state = dict(limits, tokens=1.0, refilled_at=time.monotonic(), in_flight=0, cooldown_until=0.0, cooldown_logged=False)
+            self._hosts[host] = state
+        return state
+
+    def acquire(self, host):
+        """Block until the host has a token and a free in-flight slot; raise if it is cooling down."""
+        if not host:
+            return
+        with self._condition:
+            while True:
+                state = self._state(host)
+                now = time.monotonic()
+                if state['cooldown_until'] > now:
+                    raise RuntimeError(
+                        f"Host {host} is in cooldown for another {int(state['cooldown_until'] - now)}s"
+                    )
+                state['tokens'] = min(state['burst'], state['tokens'] + (now - state['refilled_at']) * state['rate'])
+                state['refilled_at'] = now
+                if state['tokens'] >= 1 and state['in_flight'] < state['max_in_flight']:
+                    state['tokens'] -= 1
+                    state['in_flight'] += 1
+                    return
+                # Waiting on a slot is woken by release(); waiting on a token has a known deadline.
+                wait_seconds = (1 - state['tokens']) / state['rate'] if state['tokens'] < 1 else None
+                self._condition.wait(timeout=wait_seconds)
+
+    def release(self, host, status_code=None, retry_after=None, hold_slot=False):
+        """Free the host's in-flight slot and adapt its rate to the response status.
+
+        With hold_slot the slot stays taken (a streamed body is still being
+        read) until release_slot() is called.
+        """
+        if not host:
+            return
+        with self._condition:
+            state = self._state(host)
+            if not hold_slot:
+                state['in_flight'] = max(0, state['in_flight'] - 1)
+            if status_code in (429, 503):
+                already_at_floor = state['rate'] <= state['min_rate']
+                state['rate'] = max(state['min_rate'], state['rate'] * RATE_DECREASE_FACTOR)
+                state['tokens'] = min(state['tokens'], 0.0)
+                cooldown_seconds = retry_after
+                if cooldown_seconds is None and already_at_floor:
+                    cooldown_seconds = self.default_cooldown
+                if cooldown_seconds:
+                    state['cooldown_until'] = time.monotonic() + max(1.0, float(cooldown_seconds))
+                    state['cooldown_logged'] = False
+                    logger.warning(
+                        f"Rate limited by {host} (HTTP {status_code}); "
+                        f"cooling down requests for {int(max(1.0, float(cooldown_seconds)))}s."
+                    )
+                else:
+                    logger.info(f"Rate limited by {host} (HTTP {status_code}); slowing to {state['rate']:.2f} req/s")
+            elif status_code is not None and status_code < 500:
+                state['rate'] = min(state['max_rate'], state['rate'] + state['increase'])
+            self._condition.notify_all()
+
+    def release_slot(self, host):
+        """Free an in-flight slot kept by release(hold_slot=True)."""
+        if not host:
+            return
+        with self._condition:
+            state = self._state(host)
+            state['in_flight'] = max(0, state['in_flight'] - 1)
+            self._condition.notify_all()
+
+    def cooldown_remaining(self, host):
+        """Return cooldown seconds remaining for a host and log once if active."""
+        if not host:
+            return 0.0
+        with self._condition:
+            state = self._hosts.get(host)
+            if state is None:
+                return 0.0
+            remaining_seconds = state['cooldown_until'] - time.monotonic()
+            if remaining_seconds <= 0:
+                return 0.0
+            if not state['cooldown_logged']:
+                logger.info(
+                    f"Host {host} still rate-limited; skipping new requests for {int(remaining_seconds)}s."
+                )
+                state['cooldown_logged'] = True
+            return remaining_seconds
+
+
+class RunMetrics:
+    """Thread-safe stage timings, per-host fetch latency histograms and counters.
+
+    A child (see child()) forwards everything it records to its parent, so a
+    capture can keep its own numbers for snapshot.json while the run-wide
+    totals keep growing for the metrics file.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._stages = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def child(self):
+        return RunMetrics(parent=self)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Add the wall time of the with-block to a stage's total."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.monotonic() - started)
+
+    def add_stage_time(self, name, seconds):
+        with self._lock:
+            totals = self._stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            totals['seconds'] += seconds
+            totals['count'] += 1
+        if self.parent is not None:
+            self.parent.add_stage_time(name, seconds)
+
+    def count(self, host, name, value=1):
+        with self._lock:
+            self._host(host)[name] += value
+        if self.parent is not None:
+            self.parent.count(host, name, value)
+
+    def observe_request(self, host, seconds, status_code):
+        """Record one request's latency and outcome (status_code None for transport errors)."""
+        with self._lock:
+            stats = self._host(host)
+            stats['requests'] += 1
+            latency = stats['latency']
+            for index, bound in enumerate(FETCH_LATENCY_BUCKETS):
+                if seconds <= bound:
+                    latency['buckets'][index] += 1
+                    break
+            latency['sum'] += seconds
+            latency['count'] += 1
+            status_key = str(status_code) if status_code is not None else 'error'
+            stats['status_codes'][status_key] = stats['status_codes'].get(status_key, 0) + 1
+        if self.parent is not None:
+            self.parent.observe_request(host, seconds, status_code)
+
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = {name: 0 for name in HOST_COUNTERS}
+            stats['status_codes'] = {}
+            # Bucket counts are per bucket here; as_dict() makes them cumulative like Prometheus.
+            stats['latency'] = {'buckets': [0] * len(FETCH_LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            self._hosts[host] = stats
+        return stats
+
+    def as_dict(self):
+        """Return a JSON-serializable copy of everything recorded so far."""
+        with self._lock:
+            hosts = {}
+            for host, stats in self._hosts.items():
+                latency = stats['latency']
+                cumulative = []
+                running = 0
+                for bucket_count in latency['buckets']:
+                    running += bucket_count
+                    cumulative.append(running)
+                hosts[host] = dict(
+                    {name: round(stats[name], 3) if name.endswith('_seconds') else stats[name] for name in HOST_COUNTERS},
+                    status_codes=dict(stats['status_codes']),
+                    latency_seconds={
+                        'buckets': {str(bound): total for bound, total in zip(FETCH_LATENCY_BUCKETS, cumulative)},
+                        'sum': round(latency['sum'], 3),
+                        'count': latency['count'],
+                    },
+                )
+            stages = {
+                name: {'seconds': round(totals['seconds'], 3), 'count': totals['count']}
+                for name, totals in self._stages.items()
+            }
+        return {'stages': stages, 'hosts': hosts}
+
+    def host_total(self, name):
+        """Return one per-host counter summed over all hosts."""
+        with self._lock:
+            return sum(stats[name] for stats in self._hosts.values())
+
+    def write(self, path):
+        """Write the metrics as a Prometheus textfile (.prom) or as JSON (anything else)."""
+        if not path.endswith('.prom'):
+            save_json_state(path, dict(self.as_dict(), updated_at=int(time.time())))
+            return
+        metrics_dir = os.path.dirname(path)
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        data = self.as_dict()
+        lines = [
+            "# HELP discoball_stage_seconds_total Wall time spent in each mirror stage.",
+            "# TYPE discoball_stage_seconds_total counter",
+        ]
+        lines += [
+            f'discoball_stage_seconds_total{{stage="{_prometheus_label(name)}"}} {totals["seconds"]}'
+            for name, totals in sorted(data['stages'].items())
+        ]
+        lines += [
+            "# HELP discoball_fetch_duration_seconds Time to response headers per host.",
+            "# TYPE discoball_fetch_duration_seconds histogram",
+        ]
+        for host, stats in sorted(data['hosts'].items()):
+            label = _prometheus_label(host)
+            latency = stats['latency_seconds']
+            for bound, total in latency['buckets'].items():
+                lines.append(f'discoball_fetch_duration_seconds_bucket{{host="{label}",le="{bound}"}} {total}')
+            lines.append(f'discoball_fetch_duration_seconds_bucket{{host="{label}",le="+Inf"}} {latency["count"]}')
+            lines.append(f'discoball_fetch_duration_seconds_sum{{host="{label}"}} {latency["sum"]}')
+            lines.append(f'discoball_fetch_duration_seconds_count{{host="{label}"}} {latency["count"]}')
+        for name in HOST_COUNTERS:
+            metric = f"discoball_fetch_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines += [
+                f'{metric}{{host="{_prometheus_label(host)}"}} {stats[name]}'
+                for host, stats in sorted(data['hosts'].items())
+            ]
+        lines.append("# TYPE discoball_fetch_responses_total counter")
+        for host, stats in sorted(data['hosts'].items()):
+            for status_key, total in sorted(stats['status_codes'].items()):
+                lines.append(
+                    f'discoball_fetch_responses_total{{host="{_prometheus_label(host)}",code="{status_key}"}} {total}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_label(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def load_host_limits(path):
+    """Read default and per-host rate limits from a JSON config file."""
+    config = load_json_state(path, {}) if path else {}
+    unknown = [
+        name for limits in [config.get('default', {})] + list(config.get('hosts', {}).values())
+        for name in limits if name not in HOST_LIMIT_FIELDS
+    ]
+    if unknown:
+        logger.warning(f"Ignoring unknown host limit fields in {path}: {sorted(set(unknown))}")
+
+    def clean(limits):
+        return {name: float(value) for name, value in limits.items() if name in HOST_LIMIT_FIELDS}
+
+    defaults = clean(config.get('default', {}))
+    hosts = {host.lower().strip('.'): clean(limits) for host, limits in config.get('hosts', {}).items()}
+    return defaults, hosts
+
+
+class MfsBundleBuilder:
+    """Assembles a snapshot bundle in IPFS MFS one file at a time."""
+
+    def __init__(self, ipfs, cid_index=None, background=False):
+        self.ipfs = ipfs
+        self.cid_index = cid_index
+        self.staging_dir = f"/discoball/staging-{os.getpid()}-{time.time_ns()}"
+        self.reused_files = 0
+        self.added_files = 0
+        self._known_dirs = {''}
+        self._queued = set()
+        self._futures = []
+        self._closed = False
+        self.ipfs.files.mkdir(self.staging_dir, parents=True)
+        # One writer thread keeps MFS updates ordered while the crawl keeps going.
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+
+    def add_file(self, relative_path, file_path):
+        """Add a finished bundle file from disk."""
+        self._submit(relative_path, file_path)
+
+    def add_bytes(self, relative_path, data):
+        """Add a bundle file from bytes already in memory, skipping a read back from disk."""
+        self._submit(relative_path, data)
+
+    def add_tree(self, root_dir):
+        """Add every file under root_dir that has not been added yet."""
+        for root, dirs, files in os.walk(root_dir):
+            dirs[:] = sorted(d for d in dirs if d != PARTIAL_DIR_NAME)
+            for filename in sorted(files):
+                file_path = os.path.join(root, filename)
+                self.add_file(os.path.relpath(file_path, root_dir), file_path)
+
+    def finish(self):
+        """Wait for queued files, pin the assembled directory and return its root CID."""
+        try:
+            for future in self._futures:
+                future.result()
+            root_cid = self.ipfs.files.stat(self.staging_dir)['Hash']
+            self.ipfs.pin.add(root_cid)
+            if self.cid_index is not None:
+                self.cid_index.save()
+            logger.info(f"Linked {self.reused_files} known files and added {self.added_files} new files to IPFS")
+            return root_cid
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the writer thread and drop the MFS staging directory."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.ipfs.files.rm(self.staging_dir, recursive=True)
+        except Exception as e:
+            logger.debug(f"Could not remove MFS staging dir {self.staging_dir}: {e}")
+
+    def _submit(self, relative_path, source):
+        relative_path = relative_path.replace(os.sep, '/')
+        if relative_path in self._queued:
+            return
+        self._queued.add(relative_path)
+        if self._executor is None:
+            self._write(relative_path, source)
+        else:
+            self._futures.append(self._executor.submit(self._write, relative_path, source))
+
+    def _write(self, relative_path, source):
+        parent = os.path.dirname(relative_path)
+        if parent not in self._known_dirs:
+            self.ipfs.files.mkdir(f"{self.staging_dir}/{parent}", parents=True)
+            self._known_dirs.add(parent)
+        mfs_path = f"{self.staging_dir}/{relative_path}"
+
+        digest = None
+        if self.cid_index is not None:
+            digest = hashlib.sha256(source).hexdigest() if isinstance(source, bytes) else file_sha256(source)
+            known_cid = self.cid_index.get(digest)
+            if known_cid and self._link_local_cid(known_cid, mfs_path):
+                self.reused_files += 1
+                return
+
+        if isinstance(source, bytes):
+            self.ipfs.files.write(mfs_path, io.BytesIO(source), create=True)
+        else:
+            self.ipfs.files.write(mfs_path, source, create=True)
+        if digest is not None:
+            self.cid_index.set(digest, self.ipfs.files.stat(mfs_path)['Hash'])
+        self.added_files += 1
+
+    def _link_local_cid(self, cid, mfs_path):
+        """Link a previously added CID into MFS if its blocks are still in the local repo."""
+        try:
+            stat = self.ipfs.files.stat(f"/ipfs/{cid}", opts={"with-local": "true"}, offline=True)
+            if not stat.get('Local', False):
+                return False
+            self.ipfs.files.cp(f"/ipfs/{cid}", mfs_path, offline=True)
+            return True
+        except Exception as e:
+            logger.debug(f"Known CID {cid} is not available locally: {e}")
+            return False
+
+
+def sniff_html_encoding(content_type, prefix):
+    """Return the encoding of an HTML body from its BOM, Content-Type charset or an early <meta>, else UTF-8."""
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if prefix.startswith(bom):
+            return encoding
+    candidates = []
+    header_charset = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type or '', re.IGNORECASE)
+    if header_charset:
+        candidates.append(header_charset.group(1))
+    meta_charset = _META_CHARSET.search(prefix[:HTML_CHARSET_PRESCAN_BYTES])
+    if meta_charset:
+        candidates.append(meta_charset.group(1).decode('ascii', 'replace'))
+    for candidate in candidates:
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
+class StreamTag:
+    """An element seen by StreamingHtmlRewriter, shaped like the parts of bs4's Tag the rewrite helpers use."""
+
+    def __init__(self, name, attr_pairs, source=None, self_closing=False):
+        self.name = name
+        self.attrs = {}
+        for attr_name, value in attr_pairs:
+            value = value or ''
+            self.attrs[attr_name] = value.split() if attr_name in MULTI_VALUED_ATTRS else value
+        self.string = None
+        self.self_closing = self_closing
+        self._source = source
+        self._original_attrs = dict(self.attrs)
+
+    def __getitem__(self, attr_name):
+        return self.attrs[attr_name]
+
+    def __setitem__(self, attr_name, value):
+        self.attrs[attr_name] = value
+
+    def get(self, attr_name, default=None):
+        return self.attrs.get(attr_name, default)
+
+    def decompose(self):
+        self.attrs = None
+
+    def get_text(self):
+        return self.string or ''
+
+    def clear(self):
+        self.string = ''
+
+    def append(self, text):
+        self.string = (self.string or '') + text
+
+    def start_tag(self):
+        """Return the start tag as written in the page, or rebuilt if an attribute changed."""
+        if self.attrs == self._original_attrs and self._source:
+            return self._source
+        parts = [self.name]
+        for attr_name, value in self.attrs.items():
+            if isinstance(value, list):
+                value = ' '.join(value)
+            escaped = value.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+            parts.append(f'{attr_name}="{escaped}"')
+        return f"<{' '.join(parts)}{' /' if self.self_closing else ''}>"
+
+
+class StreamingHtmlRewriter(HTMLParser):
+    """Rewrites HTML in one incremental pass, writing output as it goes.
+
+    on_element(tag) sees every start tag as a StreamTag and may change its
+    attributes, decompose it, or (for <style>, which is held until its end
+    tag) replace its text. Untouched start tags, text, comments and
+    doctypes are copied through, head_html is written at the start of
+    <head>, and memory is bounded by the largest single tag or inline
+    stylesheet rather than the page.
+    """
+
+    def __init__(self, write, on_element, head_html=''):
+        super().__init__(convert_charrefs=True)
+        self._write = write
+        self._on_element = on_element
+        self._head_html = head_html
+        self._head_written = not head_html
+        self._raw_text_element = None
+        self._pending_style = None
+        self._skip_name = None
+        self._skip_depth = 0
+        self._title_parts = None
+        self.metadata = {'title': '', 'description': '', 'keywords': ''}
+
+    def feed_file(self, file_path, encoding):
+        """Decode and feed a whole file in chunks, then close the parser."""
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        with open(file_path, "rb") as source_file:
+            for chunk in iter(lambda: source_file.read(STREAM_CHUNK_BYTES), b''):
+                self.feed(decoder.decode(chunk))
+        self.feed(decoder.decode(b'', final=True))
+        self.close()
+
+    def close(self):
+        super().close()
+        if self._pending_style is not None:
+            # Unterminated <style>: still emit what was there.
+            self.handle_endtag('style')
+        self._write_head_html()
+
+    def set_cdata_mode(self, elem, **kwargs):
+        # Newer parsers unescape textarea/title text ("escapable"); keep it as written so it is copied verbatim.
+        super().set_cdata_mode(elem)
+
+    def handle_starttag(self, tag, attrs):
+        self._start_element(tag, attrs, self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start_element(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        if self._skip_name is not None:
+            if tag == self._skip_name:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_name = None
+            return
+        if tag == 'style' and self._pending_style is not None:
+            element, self._pending_style = self._pending_style, None
+            self._raw_text_element = None
+            self._on_element(element)
+            if self._write_start_tag(element):
+                self._write(element.string or '')
+                self._write('</style>')
+            return
+        if tag == self._raw_text_element:
+            self._raw_text_element = None
+        if tag == 'title' and self._title_parts is not None:
+            self.metadata['title'] = self.metadata['title'] or ''.join(self._title_parts).strip()
+            self._title_parts = None
+        self._write(f'</{tag}>')
+
+    def handle_data(self, data):
+        if self._skip_name is not None:
+            return
+        if self._pending_style is not None:
+            self._pending_style.string += data
+            return
+        if self._raw_text_element:
+            if self._title_parts is not None:
+                self._title_parts.append(html.unescape(data))
+            self._write(data)
+            return
+        if not self._head_written and data.strip():
+            self._write_head_html()
+        self._write(data.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;'))
+
+    def handle_comment(self, data):
+        if self._skip_name is None:
+            self._write(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self._write(f'<!{decl}>')
+
+    def unknown_decl(self, data):
+        if self._skip_name is None:
+            self._write(f'<![{data}]>')
+
+    def handle_pi(self, data):
+        if self._skip_name is None:
+            self._write(f'<?{data}>')
+
+    def _start_element(self, tag, attrs, self_closing):
+        if self._skip_name is not None:
+            if tag == self._skip_name and not self_closing:
+                self._skip_depth += 1
+            return
+        element = StreamTag(tag, attrs, self.get_starttag_text(), self_closing)
+        self._record_metadata(element)
+        if tag == 'style' and not self_closing:
+            element.string = ''
+            self._pending_style = element
+            self._raw_text_element = tag
+            return
+        self._on_element(element)
+        if tag in RAW_TEXT_ELEMENTS and not self_closing:
+            # Only script and style switch the stdlib parser to raw text on its own.
+            self.set_cdata_mode(tag)
+        if not self._write_start_tag(element) or self_closing:
+            return
+        if tag in RAW_TEXT_ELEMENTS:
+            self._raw_text_element = tag
+        if tag == 'title':
+            self._title_parts = []
+
+    def _write_start_tag(self, element):
+        """Write an element's start tag; return False if it was decomposed."""
+        if element.attrs is None:
+            if element.name not in VOID_ELEMENTS and not element.self_closing:
+                self._skip_name = element.name
+                self._skip_depth = 1
+            return False
+        if element.name == 'head' and not self._head_written:
+            self._write(element.start_tag())
+            self._write_head_html()
+            return True
+        if element.name != 'html':
+            self._write_head_html()
+        self._write(element.start_tag())
+        return True
+
+    def _write_head_html(self):
+        if not self._head_written:
+            self._head_written = True
+            self._write(self._head_html)
+
+    def _record_metadata(self, element):
+        if element.name != 'meta':
+            return
+        name = (element.attrs.get('name') or '').lower()
+        if name in ('description', 'keywords') and not self.metadata[name]:
+            self.metadata[name] = element.attrs.get('content', '')
+
+
 class DiscoMirror:
-    def __init__(self, private_key, rpc_url="https://mainnet.base.org", ipfs_api="/ip4/127.0.0.1/tcp/5001"):
-        """Initialize the disco mirror with Web3 and IPFS connections."""
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
-        self.account = Account.from_key(private_key)
-        self.address = self.account.address
+    def __init__(self, private_key, rpc_url="https://mainnet.base.org", ipfs_api="/ip4/127.0.0.1/tcp/5001",
+                 asset_workers=None, crawl_max_pages=None, crawl_max_depth=None,
+                 http_cache_dir=None, http_cache_max_bytes=None,
+                 content_addressed=False, cid_index_path=None, published_state_path=None,
+                 html_parser=None, max_asset_bytes=None, max_snapshot_bytes=None,
+                 stream_upload=False, outbox_path=None, host_limits_path=None, fetch_backend=None,
+                 work_dir=None, metrics_path=None, optimize_assets=False, html_rewriter=None, max_deferred_wait=None):
+        """Initialize the disco mirror; Web3, the signing account and the resolver load on first use."""
+        self.rpc_url = rpc_url
+        self._private_key = private_key
+        self._w3 = None
+        self._account = None
+        self._contract = None
+        self._dns_verifier = None
+        self.address = private_key_address(private_key)
         self.user_agent = 'DiscoBall-Mirror/1.0 (+https://github.com/pierce403/discoball)'
         self.request_timeout = float(os.getenv("DISCOBALL_REQUEST_TIMEOUT", "30"))
         self.max_fetch_attempts = int(os.getenv("DISCOBALL_MAX_FETCH_ATTEMPTS", "3"))
-        self.default_min_interval = float(os.getenv("DISCOBALL_MIN_REQUEST_INTERVAL", "0.05"))
-        self.wikimedia_min_interval = float(os.getenv("DISCOBALL_WIKIMEDIA_MIN_INTERVAL", "0.25"))
         self.default_rate_limit_cooldown = float(os.getenv("DISCOBALL_RATE_LIMIT_COOLDOWN", "120"))
-        self._host_next_request_at = {}
-        self._host_cooldown_until = {}
-        self._host_cooldown_logged = {}
-        self.http = requests.Session()
-        self.http.headers.update({'User-Agent': self.user_agent})
-        
-        try:
-            self.ipfs = ipfshttpclient.connect(ipfs_api)
-            logger.info(f"Connected to IPFS at {ipfs_api}")
-        except Exception as e:
-            logger.error(f"Failed to connect to IPFS: {e}")
-            raise
-            
-        # Initialize contract
-        self.contract = self.w3.eth.contract(
-            address=Web3.to_checksum_address(CONTRACT_ADDRESS),
-            abi=CONTRACT_ABI
+        if max_deferred_wait is None:
+            max_deferred_wait = os.getenv("DISCOBALL_MAX_DEFERRED_WAIT", "0")
+        self.max_deferred_wait = max(0.0, float(max_deferred_wait))
+        if host_limits_path is None:
+            host_limits_path = os.getenv("DISCOBALL_HOST_LIMITS", DEFAULT_HOST_LIMITS_PATH)
+        if host_limits_path and host_limits_path != DEFAULT_HOST_LIMITS_PATH and not os.path.isfile(host_limits_path):
+            # Only the shipped config may be absent; a mistyped path would silently drop every per-host limit.
+            raise ValueError(f"Host limits file not found: {host_limits_path}")
+        default_limits = {
+            'rate': 1.0 / float(os.getenv("DISCOBALL_MIN_REQUEST_INTERVAL", "0.05")),
+            'min_rate': 0.2,
+            'max_rate': 50.0,
+            'increase': 1.0,
+            'burst': 1.0,
+            'max_in_flight': 6.0,
+        }
+        configured_defaults, host_overrides = load_host_limits(host_limits_path)
+        default_limits.update(configured_defaults)
+        if os.getenv("DISCOBALL_MIN_REQUEST_INTERVAL"):
+            # An explicit interval still wins over the shipped config's default rate.
+            default_limits['rate'] = 1.0 / float(os.getenv("DISCOBALL_MIN_REQUEST_INTERVAL"))
+        self.rate_controller = HostRateController(default_limits, host_overrides, self.default_rate_limit_cooldown)
+        if asset_workers is None:
+            asset_workers = os.getenv("DISCOBALL_ASSET_WORKERS", "1")
+        self.asset_workers = max(1, int(asset_workers))
+        if crawl_max_pages is None:
+            crawl_max_pages = os.getenv("DISCOBALL_CRAWL_MAX_PAGES", "100")
+        if crawl_max_depth is None:
+            crawl_max_depth = os.getenv("DISCOBALL_CRAWL_MAX_DEPTH", "3")
+        self.crawl_max_pages = max(1, int(crawl_max_pages))
+        self.crawl_max_depth = max(0, int(crawl_max_depth))
+        self.http = create_fetch_backend(
+            fetch_backend or os.getenv("DISCOBALL_FETCH_BACKEND", "requests"),
+            self.user_agent,
+            self.asset_workers,
         )
-    
+        logger.debug(f"Fetching with the {self.http.name} backend")
+        self.http_cache = None
+        if http_cache_dir:
+            if http_cache_max_bytes is None:
+                http_cache_max_bytes = int(float(os.getenv("DISCOBALL_HTTP_CACHE_MAX_MB", "512")) * 1024 * 1024)
+            self.http_cache = HttpCache(http_cache_dir, http_cache_max_bytes)
+            logger.info(f"Using HTTP cache at {http_cache_dir}")
+        self.content_addressed = content_addressed
+        self.cid_index = CidIndex(cid_index_path) if cid_index_path else None
+        self.published_state_path = published_state_path
+        self.html_parser = html_parser or os.getenv("DISCOBALL_HTML_PARSER") or DEFAULT_HTML_PARSER
+        self.html_rewriter = html_rewriter or os.getenv("DISCOBALL_HTML_REWRITER", "tree")
+        if self.html_rewriter not in HTML_REWRITERS:
+            raise ValueError(f"Unknown HTML rewriter {self.html_rewriter!r}; expected one of {', '.join(HTML_REWRITERS)}")
+        if max_asset_bytes is None:
+            max_asset_bytes = int(float(os.getenv("DISCOBALL_MAX_ASSET_MB", "0")) * 1024 * 1024)
+        if max_snapshot_bytes is None:
+            max_snapshot_bytes = int(float(os.getenv("DISCOBALL_MAX_SNAPSHOT_MB", "0")) * 1024 * 1024)
+        self.max_asset_bytes = max(0, int(max_asset_bytes))
+        self.max_snapshot_bytes = max(0, int(max_snapshot_bytes))
+        self._capture_lock = threading.Lock()
+        self.stream_upload = stream_upload
+        self.optimize_assets = optimize_assets
+        self.work_dir = work_dir
+        self.pipeline_depth = max(1, int(os.getenv("DISCOBALL_PIPELINE_DEPTH", "2")))
+        self.metrics = RunMetrics()
+        # Captures run one at a time, so fetches are attributed to the one in progress.
+        self._request_metrics = self.metrics
+        self.metrics_path = metrics_path or os.getenv("DISCOBALL_METRICS_FILE") or None
+        self.receipt_timeout = float(os.getenv("DISCOBALL_RECEIPT_TIMEOUT", "120"))
+        priority_fee_gwei = os.getenv("DISCOBALL_PRIORITY_FEE_GWEI")
+        self.priority_fee_wei = int(Decimal(priority_fee_gwei) * 10**9) if priority_fee_gwei else None
+        self.replace_after = float(os.getenv("DISCOBALL_REPLACE_AFTER", "60"))
+        self.max_fee_bumps = int(os.getenv("DISCOBALL_MAX_FEE_BUMPS", "5"))
+        self._next_nonce = None
+        self._nonce_lock = threading.Lock()
+        self.outbox_path = outbox_path
+        self._outbox = {}
+        self._outbox_lock = threading.Lock()
+
+        self.ipfs = None
+        if ipfs_api is None:
+            # Capture-only use (benchmarks, dry runs): bundles are built but cannot be uploaded.
+            logger.info("IPFS disabled; snapshots will not be uploaded")
+        else:
+            try:
+                import ipfshttpclient
+
+                self.ipfs = ipfshttpclient.connect(ipfs_api)
+                logger.info(f"Connected to IPFS at {ipfs_api}")
+            except Exception as e:
+                logger.error(f"Failed to connect to IPFS: {e}")
+                raise
+
+    @property
+    def w3(self):
+        """Web3 connection to the RPC endpoint, created on first use."""
+        if self._w3 is None:
+            from web3 import Web3
+
+            self._w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+        return self._w3
+
+    @property
+    def account(self):
+        """Signing account for publish transactions, created on first use."""
+        if self._account is None:
+            from eth_account import Account
+
+            self._account = Account.from_key(self._private_key)
+        return self._account
+
+    @property
+    def contract(self):
+        """DiscoBallRegistry contract handle, created on first use."""
+        if self._contract is None:
+            self._contract = self.w3.eth.contract(
+                address=self.w3.to_checksum_address(CONTRACT_ADDRESS),
+                abi=CONTRACT_ABI
+            )
+        return self._contract
+
+    @property
+    def dns_verifier(self):
+        """TXT record resolver, created on first use."""
+        if self._dns_verifier is None:
+            from discoball_dns import DnsVerifier
+
+            self._dns_verifier = DnsVerifier()
+        return self._dns_verifier
+
     def verify_dns_record(self, domain):
         """Verify that the domain has the correct DNS TXT record."""
         expected_record = f"discoball-site-verification={self.address}"
-        
-        try:
-            result = dns.resolver.resolve(domain, 'TXT')
-            for rdata in result:
-                txt_record = str(rdata).strip('"')
-                if txt_record == expected_record:
-                    logger.info(f"✅ DNS verification successful for {domain}")
-                    return True
-                    
-            logger.warning(f"⚠️ DNS verification failed for {domain}")
-            logger.warning(f"Expected: {expected_record}")
-            logger.warning(f"Found records: {[str(r).strip('\"') for r in result]}")
-            return False
-            
-        except Exception as e:
-            logger.warning(f"⚠️ DNS lookup failed for {domain}: {e}")
+        answer = self.dns_verifier.lookup(domain)
+        if answer['error']:
+            logger.warning(f"⚠️ DNS lookup failed for {domain}: {answer['error']}")
             return False
+
+        if self.address.lower() in self.dns_verifier.verified_addresses(answer):
+            logger.info(f"✅ DNS verification successful for {domain}")
+            return True
+
+        logger.warning(f"⚠️ DNS verification failed for {domain}")
+        logger.warning(f"Expected: {expected_record}")
+        logger.warning(f"Found records: {answer['records']}")
+        return False
+
+    def verify_dns_records(self, domains):
+        """Verify many domains with one concurrent lookup and return {domain: bool}."""
+        self.dns_verifier.lookup_many(domains)
+        return {domain: self.verify_dns_record(domain) for domain in domains}
     
-    def crawl_page(self, crawl_url, domain, path, output_dir):
+    def crawl_page(self, crawl_url, domain, path, output_dir, bundle_upload=None, journal=None):
         """Crawl a single page and build a browsable snapshot bundle."""
         try:
             logger.info(f"Crawling {crawl_url}")
-            response = self._fetch(crawl_url)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-            resolved_url = response.url
             asset_cache = {}
-            capture_report = {
-                "localized_downloads": 0,
-                "rewritten_references": 0,
-                "blocked_references": 0,
-                "failed_downloads": 0,
-                "missing_resources": [],
-                "_missing_seen": set(),
-            }
-            rewritten_references = self._rewrite_html_assets(
-                soup,
-                resolved_url,
+            capture_report = self._new_capture_report(bundle_upload, journal)
+            with capture_report["_metrics"].stage('page_fetch'):
+                response = self._fetch(crawl_url, stream=self.html_rewriter == 'stream')
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            self._restore_journaled_assets(output_dir, asset_cache, capture_report)
+
+            metadata, rewritten_references = self._capture_html_page(
+                response,
                 output_dir,
+                "index.html",
                 asset_cache,
                 capture_report,
             )
-            self._strip_network_hints(soup, capture_report)
-            self._inject_offline_csp(soup)
-
-            html_output = os.path.join(output_dir, "index.html")
-            with open(html_output, "w", encoding="utf-8") as html_file:
-                html_file.write(str(soup))
-
-            missing_resources = capture_report["missing_resources"]
-            missing_total = len(missing_resources)
-            missing_limit = 100
-
-            snapshot = {
-                'url': resolved_url,
-                'domain': domain,
-                'path': path,
-                'timestamp': int(time.time()),
-                'content_type': response.headers.get('content-type', 'text/html'),
-                'status_code': response.status_code,
-                'metadata': {
-                    'title': soup.title.string if soup.title else '',
-                    'description': self._get_meta_content(soup, 'description'),
-                    'keywords': self._get_meta_content(soup, 'keywords'),
-                },
-                'resources_localized': capture_report["localized_downloads"],
-                'rewritten_references': rewritten_references,
-                'blocked_references': capture_report["blocked_references"],
-                'failed_downloads': capture_report["failed_downloads"],
-                'missing_resources': missing_resources[:missing_limit],
-                'missing_resources_truncated': max(0, missing_total - missing_limit),
-            }
-
-            snapshot_output = os.path.join(output_dir, "snapshot.json")
-            with open(snapshot_output, "w", encoding="utf-8") as metadata_file:
-                json.dump(snapshot, metadata_file, indent=2)
+            self._discard_prefetched(output_dir, capture_report)
+            snapshot = self._build_snapshot(
+                response,
+                metadata,
+                domain,
+                path,
+                rewritten_references,
+                capture_report,
+            )
+            self._write_snapshot(output_dir, snapshot)
 
             logger.info(
-                f"Successfully captured {resolved_url} "
+                f"Successfully captured {snapshot['url']} "
                 f"(localized={snapshot['resources_localized']}, "
                 f"rewritten={rewritten_references}, blocked={snapshot['blocked_references']})"
             )
@@ -174,19 +1542,427 @@ class DiscoMirror:
         except Exception as e:
             logger.exception(f"Failed to crawl {crawl_url}: {e}")
             return None
-    
+
+    def crawl_site(self, start_url, domain, path, output_dir, max_pages=None, max_depth=None, bundle_upload=None,
+                   journal=None):
+        """Crawl same-origin pages breadth-first from start_url into one snapshot bundle."""
+        max_pages = self.crawl_max_pages if max_pages is None else max(1, int(max_pages))
+        max_depth = self.crawl_max_depth if max_depth is None else max(0, int(max_depth))
+        origin = self._url_origin(start_url)
+        page_files = {self._normalize_page_url(start_url): "index.html"}
+        frontier = deque([(start_url, 0)])
+        scheduled_pages = 1
+        asset_cache = {}
+        capture_report = self._new_capture_report(bundle_upload, journal)
+        self._restore_journaled_assets(output_dir, asset_cache, capture_report)
+        rewritten_references = 0
+        pages = []
+        start_response = None
+        start_metadata = None
+
+        while frontier:
+            page_url, depth = frontier.popleft()
+            page_file = page_files[self._normalize_page_url(page_url)]
+            logger.info(f"Crawling {page_url} (depth {depth}, {len(pages) + 1}/{scheduled_pages})")
+
+            try:
+                response = None
+                with capture_report["_metrics"].stage('page_fetch'):
+                    response = self._fetch(page_url, stream=self.html_rewriter == 'stream')
+                response.raise_for_status()
+                content_type = response.headers.get('content-type', '').lower()
+                if 'html' not in content_type:
+                    raise ValueError(f"not an HTML page ({content_type or 'unknown content-type'})")
+                if self._url_origin(response.url) != origin:
+                    raise ValueError(f"redirected off-origin to {response.url}")
+            except Exception as e:
+                if response is not None:
+                    response.close()
+                if start_response is None:
+                    logger.error(f"Failed to crawl {page_url}: {e}")
+                    return None
+                logger.warning(f"Skipping page {page_url}: {e}")
+                self._write_uncaptured_page(output_dir, page_file, page_url)
+                pages.append({'url': page_url, 'file': page_file, 'depth': depth, 'error': str(e)})
+                continue
+
+            page_files.setdefault(self._normalize_page_url(response.url), page_file)
+
+            def resolve_page_link(link_url, depth=depth):
+                nonlocal scheduled_pages
+                page_key = self._normalize_page_url(link_url)
+                if page_key is None or self._url_origin(link_url) != origin:
+                    return None
+                if page_key in page_files:
+                    return page_files[page_key]
+                if depth >= max_depth or scheduled_pages >= max_pages:
+                    return None
+                if not self._looks_like_page_url(page_key):
+                    return None
+                page_files[page_key] = self._build_page_path(page_key)
+                frontier.append((page_key, depth + 1))
+                scheduled_pages += 1
+                return page_files[page_key]
+
+            try:
+                metadata, page_rewrites = self._capture_html_page(
+                    response,
+                    output_dir,
+                    page_file,
+                    asset_cache,
+                    capture_report,
+                    link_resolver=resolve_page_link,
+                )
+            except Exception as e:
+                if start_response is None:
+                    logger.exception(f"Failed to crawl {page_url}: {e}")
+                    return None
+                logger.warning(f"Skipping page {page_url}: {e}")
+                self._write_uncaptured_page(output_dir, page_file, page_url)
+                pages.append({'url': page_url, 'file': page_file, 'depth': depth, 'error': str(e)})
+                continue
+
+            if start_response is None:
+                start_response = response
+                start_metadata = metadata
+            rewritten_references += page_rewrites
+            pages.append({
+                'url': response.url,
+                'file': page_file,
+                'depth': depth,
+                'status_code': response.status_code,
+                'title': metadata['title'],
+            })
+
+        self._discard_prefetched(output_dir, capture_report)
+        snapshot = self._build_snapshot(
+            start_response,
+            start_metadata,
+            domain,
+            path,
+            rewritten_references,
+            capture_report,
+        )
+        snapshot['pages_captured'] = sum(1 for page in pages if 'error' not in page)
+        snapshot['pages'] = pages
+        self._write_snapshot(output_dir, snapshot)
+
+        logger.info(
+            f"Successfully captured {snapshot['pages_captured']}/{len(pages)} pages from {start_url} "
+            f"(localized={snapshot['resources_localized']}, "
+            f"rewritten={rewritten_references}, blocked={snapshot['blocked_references']})"
+        )
+        return snapshot
+
+    def _new_capture_report(self, bundle_upload=None, journal=None):
+        """Return empty capture bookkeeping shared by the rewrite helpers."""
+        self._request_metrics = self.metrics.child()
+        return {
+            "localized_downloads": 0,
+            "rewritten_references": 0,
+            "blocked_references": 0,
+            "failed_downloads": 0,
+            "asset_bytes": 0,
+            "asset_optimization": {},
+            "deferred_assets": {'deferred': 0, 'recovered': 0, 'wait_seconds': 0.0},
+            "_deferral_deadline": None,
+            "missing_resources": [],
+            "_missing_seen": set(),
+            "_prefetched": {},
+            "_bundle_upload": bundle_upload,
+            "_journal": journal,
+            "_metrics": self._request_metrics,
+        }
+
+    def _restore_journaled_assets(self, output_dir, asset_cache, capture_report):
+        """Seed a resumed capture with the assets an interrupted run already finished."""
+        journal = capture_report.get("_journal")
+        if journal is None:
+            return
+        restored = 0
+        for entry in journal.of_type('asset'):
+            if entry['status'] == 'localized':
+                if not os.path.exists(os.path.join(output_dir, entry['local_path'])):
+                    continue
+                asset_cache[entry['url']] = entry['local_path']
+                capture_report["localized_downloads"] += 1
+                capture_report["asset_bytes"] += entry.get('bytes', 0)
+                restored += 1
+            elif entry['status'] == 'skipped':
+                # Size-cap skips would be skipped again; failed downloads get another try.
+                asset_cache[entry['url']] = None
+                self._record_missing_resource(entry['url'], entry['reason'], capture_report)
+        if restored:
+            logger.info(f"↩️ Resuming capture with {restored} assets already downloaded")
+
+    def _journal_asset(self, capture_report, asset_url, status, **fields):
+        """Append an asset download outcome to the run's journal, if there is one."""
+        journal = capture_report.get("_journal")
+        if journal is not None:
+            journal.record('asset', url=asset_url, status=status, **fields)
+
+    def _capture_html_page(self, response, output_dir, html_name, asset_cache, capture_report, link_resolver=None):
+        """Localize a fetched HTML page into output_dir/html_name and return (page metadata, rewrite count)."""
+        if self.html_rewriter == 'stream':
+            return self._stream_html_page(response, output_dir, html_name, asset_cache, capture_report, link_resolver)
+
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(response.content, self.html_parser)
+        rewritten_references = self._rewrite_document(
+            soup,
+            response.url,
+            output_dir,
+            asset_cache,
+            capture_report,
+            link_resolver=link_resolver,
+        )
+        self._inject_offline_csp(soup)
+
+        html_bytes = str(soup).encode('utf-8')
+        with open(os.path.join(output_dir, html_name), "wb") as html_file:
+            html_file.write(html_bytes)
+        self._stream_bundle_file(capture_report, html_name, data=html_bytes)
+        return self._page_metadata(soup), rewritten_references
+
+    def _stream_html_page(self, response, output_dir, html_name, asset_cache, capture_report, link_resolver=None):
+        """Streaming counterpart of _capture_html_page: memory stays flat however large the page is.
+
+        The body is spooled to disk, optionally scanned once to prefetch its
+        assets, then rewritten element by element into html_name as UTF-8.
+        """
+        spool_path = self._spool_page_body(response, output_dir)
+        try:
+            with open(spool_path, "rb") as spool_file:
+                encoding = sniff_html_encoding(response.headers.get('content-type', ''), spool_file.read(HTML_CHARSET_PRESCAN_BYTES))
+            base_url = response.url
+
+            if self._prefetches_assets():
+                raw_urls = []
+                collector = StreamingHtmlRewriter(lambda text: None, lambda tag: raw_urls.extend(self._element_asset_urls(tag)))
+                collector.feed_file(spool_path, encoding)
+                self._prefetch_assets(
+                    self._absolute_asset_urls(raw_urls, base_url),
+                    base_url,
+                    output_dir,
+                    asset_cache,
+                    capture_report,
+                )
+
+            rewrite_count = 0
+
+            def rewrite_element(tag):
+                nonlocal rewrite_count
+                rewrite_count += self._rewrite_element(
+                    tag,
+                    base_url,
+                    output_dir,
+                    asset_cache,
+                    capture_report,
+                    link_resolver,
+                )
+                if not self._is_decomposed(tag):
+                    self._strip_network_hint(tag, capture_report)
+                if not self._is_decomposed(tag) and tag.name == 'meta':
+                    self._rewrite_streamed_meta(tag)
+
+            html_path = os.path.join(output_dir, html_name)
+            csp_meta = StreamTag('meta', [('http-equiv', 'Content-Security-Policy'), ('content', OFFLINE_CSP)]).start_tag()
+            walk_start = self._begin_rewrite_walk(capture_report)
+            try:
+                with open(html_path, "w", encoding="utf-8", newline='') as html_file:
+                    rewriter = StreamingHtmlRewriter(html_file.write, rewrite_element, head_html=csp_meta)
+                    rewriter.feed_file(spool_path, encoding)
+            finally:
+                self._finish_rewrite_walk(capture_report, walk_start)
+        finally:
+            os.remove(spool_path)
+
+        self._stream_bundle_file(capture_report, html_name, file_path=html_path)
+        return rewriter.metadata, rewrite_count
+
+    def _spool_page_body(self, response, output_dir):
+        """Stream a page response body to a file in the bundle's partial dir and return its path."""
+        partial_dir = os.path.join(output_dir, PARTIAL_DIR_NAME)
+        os.makedirs(partial_dir, exist_ok=True)
+        fd, spool_path = tempfile.mkstemp(dir=partial_dir, suffix='.html')
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as spool_file:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                    spool_file.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(spool_path)
+            raise
+        finally:
+            response.close()
+
+        self._request_metrics.count((urlparse(response.url).hostname or '').lower(), 'bytes', size)
+        if self.http_cache:
+            requested_url = response.history[0].url if response.history else response.url
+            self.http_cache.store(requested_url, response, source_path=spool_path)
+        return spool_path
+
+    def _rewrite_streamed_meta(self, tag):
+        """Drop CSP tags (the offline one replaces them) and relabel charset declarations as UTF-8."""
+        attrs = tag.attrs
+        http_equiv = (attrs.get('http-equiv') or '').lower()
+        if http_equiv == 'content-security-policy':
+            tag.decompose()
+        elif 'charset' in attrs:
+            tag['charset'] = 'utf-8'
+        elif http_equiv == 'content-type':
+            tag['content'] = 'text/html; charset=utf-8'
+
+    def _stream_bundle_file(self, capture_report, local_path, data=None, file_path=None):
+        """Hand a finished bundle file to the streaming IPFS upload, if one is running."""
+        bundle_upload = capture_report.get("_bundle_upload")
+        if bundle_upload is None:
+            return
+        if data is not None:
+            bundle_upload.add_bytes(local_path, data)
+        else:
+            bundle_upload.add_file(local_path, file_path)
+
+    def _page_metadata(self, soup):
+        """Extract title/description/keywords recorded in snapshot.json."""
+        return {
+            'title': soup.title.string if soup.title else '',
+            'description': self._get_meta_content(soup, 'description'),
+            'keywords': self._get_meta_content(soup, 'keywords'),
+        }
+
+    def _build_snapshot(self, response, metadata, domain, path, rewritten_references, capture_report):
+        """Assemble snapshot.json contents for a captured bundle."""
+        missing_resources = capture_report["missing_resources"]
+        missing_total = len(missing_resources)
+        missing_limit = 100
+
+        snapshot = {
+            'url': response.url,
+            'domain': domain,
+            'path': path,
+            'timestamp': int(time.time()),
+            'content_type': response.headers.get('content-type', 'text/html'),
+            'status_code': response.status_code,
+            'metadata': metadata,
+            'resources_localized': capture_report["localized_downloads"],
+            'rewritten_references': rewritten_references,
+            'blocked_references': capture_report["blocked_references"],
+            'failed_downloads': capture_report["failed_downloads"],
+            'asset_bytes': capture_report["asset_bytes"],
+            'missing_resources': missing_resources[:missing_limit],
+            'missing_resources_truncated': max(0, missing_total - missing_limit),
+            'metrics': capture_report["_metrics"].as_dict(),
+        }
+        if self.optimize_assets:
+            snapshot['asset_optimization'] = self._optimization_summary(capture_report)
+        if self.max_deferred_wait:
+            deferred_assets = capture_report["deferred_assets"]
+            snapshot['deferred_assets'] = dict(deferred_assets, wait_seconds=round(deferred_assets['wait_seconds'], 3))
+        return snapshot
+
+    def _optimization_summary(self, capture_report):
+        """Summarize what the asset optimization stage saved, overall and per asset kind."""
+        by_type = capture_report["asset_optimization"]
+        bytes_before = sum(totals['bytes_before'] for totals in by_type.values())
+        bytes_after = sum(totals['bytes_after'] for totals in by_type.values())
+        return {
+            'files': sum(totals['files'] for totals in by_type.values()),
+            'optimized_files': sum(totals['optimized_files'] for totals in by_type.values()),
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after,
+            'by_type': {kind: by_type[kind] for kind in sorted(by_type)},
+        }
+
+    def _write_snapshot(self, output_dir, snapshot):
+        """Write snapshot.json into the bundle root."""
+        snapshot_output = os.path.join(output_dir, "snapshot.json")
+        with open(snapshot_output, "w", encoding="utf-8") as metadata_file:
+            json.dump(snapshot, metadata_file, indent=2)
+
+    def _rewrite_page_link(self, tag, base_url, link_resolver):
+        """Point a same-site anchor at its local page copy."""
+        href = tag['href'].strip() if isinstance(tag['href'], str) else ''
+        if self._should_skip_resource(href):
+            return 0
+        absolute_url = urljoin(base_url, href)
+        local_page = link_resolver(absolute_url)
+        if not local_page:
+            return 0
+        fragment = urlparse(absolute_url).fragment
+        tag['href'] = f"{local_page}#{fragment}" if fragment else local_page
+        return 1
+
+    def _normalize_page_url(self, page_url):
+        """Return a dedup key for a page URL (fragment dropped), or None if not crawlable."""
+        parsed = urlparse(page_url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return None
+        return urlunparse((
+            parsed.scheme.lower(),
+            parsed.netloc.lower(),
+            parsed.path or '/',
+            parsed.params,
+            parsed.query,
+            '',
+        ))
+
+    def _url_origin(self, page_url):
+        """Return (scheme, netloc) used for same-origin scoping."""
+        parsed = urlparse(page_url)
+        return parsed.scheme.lower(), parsed.netloc.lower()
+
+    def _looks_like_page_url(self, page_url):
+        """Return True if a link path plausibly serves HTML rather than a download."""
+        _, extension = os.path.splitext(urlparse(page_url).path)
+        return extension.lower() in PAGE_EXTENSIONS
+
+    def _build_page_path(self, page_key):
+        """Generate deterministic local filename for a crawled page."""
+        digest = hashlib.sha256(page_key.encode('utf-8')).hexdigest()[:24]
+        return f"page-{digest}.html"
+
+    def _write_uncaptured_page(self, output_dir, page_file, page_url):
+        """Leave a placeholder for a linked page that could not be captured."""
+        escaped_url = html.escape(page_url, quote=True)
+        with open(os.path.join(output_dir, page_file), "w", encoding="utf-8") as html_file:
+            html_file.write(
+                "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Not captured</title></head>"
+                f"<body><p>This page was not captured in the snapshot.</p>"
+                f"<p>Original: <a href=\"{escaped_url}\">{escaped_url}</a></p></body></html>\n"
+            )
+
     def _get_meta_content(self, soup, name):
         """Extract meta tag content."""
         meta = soup.find('meta', attrs={'name': name})
         return meta.get('content', '') if meta else ''
     
-    def upload_to_ipfs(self, snapshot_dir):
-        """Upload snapshot directory to IPFS and return the root hash."""
+    def upload_to_ipfs(self, snapshot_dir, bundle_upload=None):
+        """Upload snapshot directory to IPFS and return the root hash.
+
+        With bundle_upload, files already streamed during the crawl are only
+        topped up with whatever is still missing (snapshot.json, placeholders).
+        """
+        if self.ipfs is None:
+            logger.error("Failed to upload to IPFS: no IPFS API configured")
+            return None
         try:
-            result = self.ipfs.add(snapshot_dir, recursive=True, pin=True)
-            ipfs_hash = self._extract_ipfs_hash(result, snapshot_dir)
-            if not ipfs_hash:
-                raise ValueError(f"Could not determine root hash from IPFS add response: {result}")
+            if bundle_upload is not None:
+                bundle_upload.add_tree(snapshot_dir)
+                ipfs_hash = bundle_upload.finish()
+            elif self.cid_index is not None:
+                # Assemble in MFS, linking files whose content was already added on earlier runs.
+                bundle_upload = MfsBundleBuilder(self.ipfs, self.cid_index)
+                bundle_upload.add_tree(snapshot_dir)
+                ipfs_hash = bundle_upload.finish()
+            else:
+                result = self.ipfs.add(snapshot_dir, recursive=True, pin=True)
+                ipfs_hash = self._extract_ipfs_hash(result, snapshot_dir)
+                if not ipfs_hash:
+                    raise ValueError(f"Could not determine root hash from IPFS add response: {result}")
 
             logger.info(f"📦 Uploaded snapshot bundle to IPFS: {ipfs_hash}")
             logger.info(f"   Local preview: http://127.0.0.1:8080/ipfs/{ipfs_hash}")
@@ -196,60 +1972,102 @@ class DiscoMirror:
             logger.error(f"Failed to upload to IPFS: {e}")
             return None
 
-    def _fetch(self, target_url, referer=None):
-        """HTTP GET with polite pacing and basic rate-limit awareness."""
+    def _fetch(self, target_url, referer=None, stream=False):
+        """HTTP GET paced by the per-host rate controller, with rate-limit awareness."""
         parsed_target = urlparse(target_url)
         host = (parsed_target.hostname or '').lower()
+        metrics = self._request_metrics
         cooldown_remaining = self._respect_host_cooldown(host)
         if cooldown_remaining > 0:
+            metrics.count(host, 'cooldown_rejections')
             raise RuntimeError(
                 f"Host {host} is in cooldown for another {int(cooldown_remaining)}s"
             )
-        self._wait_for_host_slot(host)
 
         headers = {}
         if referer:
             headers['Referer'] = referer
+        if self.http_cache:
+            headers.update(self.http_cache.conditional_headers(target_url))
 
         last_error = None
         for attempt in range(1, self.max_fetch_attempts + 1):
+            wait_started = time.monotonic()
             try:
-                response = self.http.get(target_url, headers=headers, timeout=self.request_timeout)
+                self.rate_controller.acquire(host)
+            except RuntimeError:
+                metrics.count(host, 'cooldown_rejections')
+                raise
+            request_started = time.monotonic()
+            metrics.count(host, 'rate_limit_wait_seconds', request_started - wait_started)
+            status_code = None
+            retry_after = None
+            streamed_response = None
+            try:
+                response = self.http.get(target_url, headers=headers, timeout=self.request_timeout, stream=stream)
 
-                if response.status_code in (429, 503):
-                    cooldown_seconds = self._get_retry_after_seconds(response.headers.get("Retry-After"))
-                    if cooldown_seconds is None:
-                        cooldown_seconds = self.default_rate_limit_cooldown
-                    self._set_host_cooldown(host, cooldown_seconds, response.status_code)
+                if self.http_cache:
+                    if response.status_code == 304:
+                        cached_response = self.http_cache.cached_response(target_url, response, stream=stream)
+                        # A 304 has no body; hand its connection back to the pool.
+                        response.close()
+                        if cached_response is not None:
+                            status_code = 304
+                            return cached_response
+                        # Cache entry disappeared underneath us; fetch the body unconditionally.
+                        headers.pop('If-None-Match', None)
+                        headers.pop('If-Modified-Since', None)
+                        response = self.http.get(
+                            target_url,
+                            headers=headers,
+                            timeout=self.request_timeout,
+                            stream=stream,
+                        )
+                    if not stream:
+                        # Streaming callers store the body themselves once it is on disk.
+                        self.http_cache.store(target_url, response)
 
+                status_code = response.status_code
+                if status_code in (429, 503):
+                    retry_after = self._get_retry_after_seconds(response.headers.get("Retry-After"))
+                if stream:
+                    streamed_response = response
+                else:
+                    # Streamed bodies are counted by whoever reads them.
+                    metrics.count(host, 'bytes', len(response.content))
                 return response
 
             except requests.RequestException as e:
                 last_error = e
+                metrics.count(host, 'errors')
                 if attempt >= self.max_fetch_attempts:
                     break
-                backoff_seconds = min(2 ** (attempt - 1), 8)
-                time.sleep(backoff_seconds)
+            finally:
+                # A streamed body still occupies the host's connection until the caller closes it.
+                self.rate_controller.release(host, status_code, retry_after, hold_slot=streamed_response is not None)
+                if streamed_response is not None:
+                    self._release_slot_on_close(streamed_response, host)
+                metrics.observe_request(host, time.monotonic() - request_started, status_code)
+            metrics.count(host, 'retries')
+            time.sleep(min(2 ** (attempt - 1), 8))
 
         if last_error:
             raise last_error
         raise RuntimeError(f"Failed to fetch {target_url}")
 
-    def _host_min_interval(self, host):
-        """Return minimum seconds between requests for a host."""
-        if host.endswith("wikimedia.org") or host.endswith("wikipedia.org"):
-            return self.wikimedia_min_interval
-        return self.default_min_interval
+    def _release_slot_on_close(self, response, host):
+        """Make response.close() also free the in-flight slot _fetch kept for its body (once)."""
+        close = response.close
+        unreleased = threading.Lock()
 
-    def _wait_for_host_slot(self, host):
-        """Enforce a minimum inter-request delay per host."""
-        if not host:
-            return
-        now = time.monotonic()
-        ready_at = self._host_next_request_at.get(host, now)
-        if ready_at > now:
-            time.sleep(ready_at - now)
-        self._host_next_request_at[host] = time.monotonic() + self._host_min_interval(host)
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if unreleased.acquire(blocking=False):
+                    self.rate_controller.release_slot(host)
+
+        response.close = close_and_release
 
     def _get_retry_after_seconds(self, retry_after_value):
         """Parse Retry-After header into seconds."""
@@ -270,75 +2088,102 @@ class DiscoMirror:
         except Exception:
             return None
 
-    def _set_host_cooldown(self, host, seconds, status_code):
-        """Pause requests to a host after rate limiting signals."""
-        if not host:
-            return
-        cooldown_until = time.monotonic() + max(1.0, float(seconds))
-        self._host_cooldown_until[host] = cooldown_until
-        self._host_cooldown_logged.pop(host, None)
-        logger.warning(
-            f"Rate limited by {host} (HTTP {status_code}); "
-            f"cooling down requests for {int(max(1.0, float(seconds)))}s."
-        )
-
     def _respect_host_cooldown(self, host):
         """Return cooldown seconds remaining for a host and log once if active."""
-        if not host:
-            return 0.0
-
-        cooldown_until = self._host_cooldown_until.get(host)
-        if cooldown_until is None:
-            return 0.0
+        return self.rate_controller.cooldown_remaining(host)
 
-        now = time.monotonic()
-        if cooldown_until <= now:
-            self._host_cooldown_until.pop(host, None)
-            self._host_cooldown_logged.pop(host, None)
-            return 0.0
+    def _rewrite_html_assets(self, soup, base_url, output_dir, asset_cache, capture_report):
+        """Download referenced assets and rewrite HTML to local snapshot paths."""
+        return self._rewrite_document(
+            soup,
+            base_url,
+            output_dir,
+            asset_cache,
+            capture_report,
+            strip_network_hints=False,
+        )
 
-        remaining_seconds = cooldown_until - now
-        if not self._host_cooldown_logged.get(host):
-            logger.info(
-                f"Host {host} still rate-limited; skipping new requests for {int(remaining_seconds)}s."
+    def _rewrite_document(self, soup, base_url, output_dir, asset_cache, capture_report,
+                          link_resolver=None, strip_network_hints=True):
+        """Rewrite asset references, page links and network hints in a single walk over the tree."""
+        if self._prefetches_assets():
+            self._prefetch_assets(
+                self._collect_html_asset_urls(soup, base_url),
+                base_url,
+                output_dir,
+                asset_cache,
+                capture_report,
             )
-            self._host_cooldown_logged[host] = True
-        return remaining_seconds
 
-    def _rewrite_html_assets(self, soup, base_url, output_dir, asset_cache, capture_report):
-        """Download referenced assets and rewrite HTML to local snapshot paths."""
         rewrite_count = 0
-
-        for tag_name, attr_name in (
-            ('img', 'src'),
-            ('script', 'src'),
-            ('script', 'href'),
-            ('source', 'src'),
-            ('video', 'src'),
-            ('video', 'poster'),
-            ('audio', 'src'),
-            ('iframe', 'src'),
-            ('embed', 'src'),
-            ('track', 'src'),
-            ('object', 'data'),
-            ('input', 'src'),
-            ('image', 'src'),
-            ('image', 'href'),
-            ('image', 'xlink:href'),
-            ('use', 'href'),
-            ('use', 'xlink:href'),
-        ):
-            for tag in soup.find_all(tag_name):
-                rewrite_count += self._rewrite_tag_attr(
+        walk_start = self._begin_rewrite_walk(capture_report)
+        try:
+            for tag in soup.find_all(True):
+                if self._is_decomposed(tag):
+                    continue
+                rewrite_count += self._rewrite_element(
                     tag,
-                    attr_name,
                     base_url,
                     output_dir,
                     asset_cache,
                     capture_report,
+                    link_resolver,
                 )
+                if strip_network_hints and not self._is_decomposed(tag):
+                    self._strip_network_hint(tag, capture_report)
+        finally:
+            self._finish_rewrite_walk(capture_report, walk_start)
+        return rewrite_count
+
+    def _begin_rewrite_walk(self, capture_report):
+        """Start tagging missing resources with their rewrite pass; return where the walk's entries begin."""
+        capture_report["_rewrite_pass"] = 0
+        return len(capture_report["missing_resources"])
+
+    def _finish_rewrite_walk(self, capture_report, walk_start):
+        """Order and deduplicate the walk's missing resources as the multi-pass engine reported them.
+
+        Each pass used to run over the whole document, so entries sort by
+        pass first and keep document order within a pass; a resource missed
+        twice keeps its entry from the earliest pass.
+        """
+        capture_report.pop("_rewrite_pass", None)
+        missing = capture_report["missing_resources"]
+        walk_entries = sorted(missing[walk_start:], key=lambda entry: entry.pop("_pass"))
+        del missing[walk_start:]
+        seen = capture_report.get("_missing_seen")
+        for entry in walk_entries:
+            if seen is not None:
+                key = f"{entry['reason']}|{entry['url']}"
+                if key in seen:
+                    continue
+                seen.add(key)
+            missing.append(entry)
+
+    def _enter_rewrite_pass(self, capture_report, pass_name):
+        """Tag missing resources recorded from here on with pass_name's rank, while a walk is running."""
+        if "_rewrite_pass" in capture_report:
+            capture_report["_rewrite_pass"] = REWRITE_PASS_RANK[pass_name]
+
+    def _rewrite_element(self, tag, base_url, output_dir, asset_cache, capture_report, link_resolver=None):
+        """Apply every rewrite that targets a single element, in the order the multi-pass engine used."""
+        rewrite_count = 0
+        tag_name = tag.name
+
+        for attr_name in ASSET_ATTRS_BY_TAG.get(tag_name, ()):
+            self._enter_rewrite_pass(capture_report, f'{tag_name}[{attr_name}]')
+            rewrite_count += self._rewrite_tag_attr(
+                tag,
+                attr_name,
+                base_url,
+                output_dir,
+                asset_cache,
+                capture_report,
+            )
 
-        for tag in soup.find_all(srcset=True):
+        attrs = tag.attrs
+        if 'srcset' in attrs:
+            self._enter_rewrite_pass(capture_report, 'srcset')
             rewrite_count += self._rewrite_srcset_attr(
                 tag,
                 base_url,
@@ -347,23 +2192,25 @@ class DiscoMirror:
                 capture_report,
             )
 
-        for link in soup.find_all('link', href=True):
-            if not self._is_asset_link(link):
-                continue
+        if tag_name == 'link' and 'href' in attrs and self._is_asset_link(tag):
+            self._enter_rewrite_pass(capture_report, 'link')
             rewrite_count += self._rewrite_tag_attr(
-                link,
+                tag,
                 'href',
                 base_url,
                 output_dir,
                 asset_cache,
                 capture_report,
             )
+            if self._is_decomposed(tag):
+                return rewrite_count
 
-        for meta in soup.find_all('meta', content=True):
-            key = (meta.get('property') or meta.get('name') or '').lower()
-            if key in {'og:image', 'twitter:image', 'twitter:image:src', 'msapplication-tileimage'}:
+        if tag_name == 'meta' and 'content' in attrs:
+            key = (attrs.get('property') or attrs.get('name') or '').lower()
+            if key in META_IMAGE_KEYS:
+                self._enter_rewrite_pass(capture_report, 'meta')
                 rewrite_count += self._rewrite_tag_attr(
-                    meta,
+                    tag,
                     'content',
                     base_url,
                     output_dir,
@@ -371,24 +2218,25 @@ class DiscoMirror:
                     capture_report,
                 )
 
-        for style_tag in soup.find_all('style'):
-            css_text = style_tag.string if style_tag.string is not None else style_tag.get_text()
-            if not css_text:
-                continue
-            rewritten_css = self._rewrite_css_urls(
-                css_text,
-                base_url,
-                output_dir,
-                asset_cache,
-                capture_report,
-            )
-            if rewritten_css != css_text:
-                style_tag.clear()
-                style_tag.append(rewritten_css)
-                rewrite_count += 1
+        if tag_name == 'style':
+            css_text = tag.string if tag.string is not None else tag.get_text()
+            if css_text:
+                self._enter_rewrite_pass(capture_report, 'style')
+                rewritten_css = self._rewrite_css_urls(
+                    css_text,
+                    base_url,
+                    output_dir,
+                    asset_cache,
+                    capture_report,
+                )
+                if rewritten_css != css_text:
+                    tag.clear()
+                    tag.append(rewritten_css)
+                    rewrite_count += 1
 
-        for tag in soup.find_all(style=True):
-            current_style = tag['style']
+        if 'style' in attrs:
+            self._enter_rewrite_pass(capture_report, 'style_attr')
+            current_style = attrs['style']
             rewritten_style = self._rewrite_css_urls(
                 current_style,
                 base_url,
@@ -400,8 +2248,16 @@ class DiscoMirror:
                 tag['style'] = rewritten_style
                 rewrite_count += 1
 
+        if link_resolver is not None and tag_name in ('a', 'area') and 'href' in attrs:
+            self._enter_rewrite_pass(capture_report, 'page_link')
+            rewrite_count += self._rewrite_page_link(tag, base_url, link_resolver)
+
         return rewrite_count
 
+    def _is_decomposed(self, tag):
+        """Return True for tags removed from the tree by an earlier rewrite."""
+        return tag is None or getattr(tag, "attrs", None) is None
+
     def _rewrite_tag_attr(self, tag, attr_name, base_url, output_dir, asset_cache, capture_report):
         """Rewrite a URL-like tag attribute to a local snapshot path."""
         if tag is None or getattr(tag, "attrs", None) is None:
@@ -486,12 +2342,18 @@ class DiscoMirror:
             tag['data-discoball-srcset-blocked'] = "true"
         return 1
 
-    def _rewrite_css_urls(self, css_text, base_url, output_dir, asset_cache, capture_report):
-        """Rewrite CSS url(...) and @import links to local snapshot assets."""
-        def replace_url(match):
-            raw_value = match.group(1).strip().strip('"\'')
+    def _rewrite_css_urls(self, css_text, base_url, output_dir, asset_cache, capture_report, css_path=None):
+        """Rewrite CSS url(...), image-set() and @import references to local snapshot assets.
+
+        css_path is the bundle path of the stylesheet being rewritten; local
+        references are made relative to it so they resolve from its directory.
+        """
+        css_dir = posixpath.dirname(css_path) if css_path else ''
+
+        def replace_reference(kind, raw_value):
+            raw_value = raw_value.strip()
             if self._should_skip_resource(raw_value):
-                return match.group(0)
+                return '' if kind == 'import' else None
 
             rewritten = self._localize_resource(
                 raw_value,
@@ -501,39 +2363,167 @@ class DiscoMirror:
                 capture_report,
             )
             if rewritten:
-                return f'url("{rewritten}")'
+                return posixpath.relpath(rewritten, css_dir) if css_dir else rewritten
 
             capture_report["blocked_references"] += 1
-            self._record_missing_resource(raw_value, "css_url_unavailable", capture_report)
-            return 'url("")'
+            reason = "css_import_unavailable" if kind == 'import' else "css_url_unavailable"
+            self._record_missing_resource(raw_value, reason, capture_report)
+            return ''
 
-        def replace_import(match):
-            raw_value = match.group(1).strip().strip('"\'')
-            if self._should_skip_resource(raw_value):
-                return ""
+        return rewrite_css_references(css_text, replace_reference)
 
-            rewritten = self._localize_resource(
-                raw_value,
-                base_url,
-                output_dir,
-                asset_cache,
-                capture_report,
-            )
-            if rewritten:
-                return f'@import "{rewritten}";'
+    def _collect_html_asset_urls(self, soup, base_url):
+        """Return absolute asset URLs referenced by the document, in document order."""
+        raw_urls = []
+        for tag in soup.find_all(True):
+            raw_urls.extend(self._element_asset_urls(tag))
+        return self._absolute_asset_urls(raw_urls, base_url)
 
-            capture_report["blocked_references"] += 1
-            self._record_missing_resource(raw_value, "css_import_unavailable", capture_report)
-            return ""
-
-        rewritten = re.sub(r'url\(([^)]+)\)', replace_url, css_text, flags=re.IGNORECASE)
-        rewritten = re.sub(
-            r'@import\s+(?:url\(\s*)?[\'"]?([^\'"\)\s;]+)[\'"]?\s*\)?\s*;?',
-            replace_import,
-            rewritten,
-            flags=re.IGNORECASE,
-        )
-        return rewritten
+    def _element_asset_urls(self, tag):
+        """Return the raw asset references of a single element, in attribute order."""
+        raw_urls = []
+        tag_name = tag.name
+        attrs = tag.attrs or {}
+        for attr_name in ASSET_ATTRS_BY_TAG.get(tag_name, ()):
+            value = attrs.get(attr_name)
+            if isinstance(value, str):
+                raw_urls.append(value)
+
+        for entry in (attrs.get('srcset') or '').split(','):
+            parts = entry.split()
+            if parts:
+                raw_urls.append(parts[0])
+
+        if tag_name == 'link' and 'href' in attrs and self._is_asset_link(tag):
+            raw_urls.append(attrs['href'])
+        elif tag_name == 'meta' and 'content' in attrs:
+            key = (attrs.get('property') or attrs.get('name') or '').lower()
+            if key in META_IMAGE_KEYS:
+                raw_urls.append(attrs['content'])
+        elif tag_name == 'style':
+            raw_urls.extend(self._collect_css_asset_urls(tag.get_text()))
+
+        if 'style' in attrs:
+            raw_urls.extend(self._collect_css_asset_urls(attrs['style']))
+        return raw_urls
+
+    def _collect_css_asset_urls(self, css_text):
+        """Return raw url(...), image-set() and @import references found in CSS text."""
+        return [raw_value.strip() for _, raw_value in find_css_references(css_text)]
+
+    def _absolute_asset_urls(self, raw_urls, base_url):
+        """Resolve raw references to unique absolute http(s) URLs."""
+        absolute_urls = []
+        seen = set()
+        for raw_url in raw_urls:
+            raw_url = (raw_url or '').strip()
+            if self._should_skip_resource(raw_url):
+                continue
+            absolute_url = urljoin(base_url, raw_url)
+            if urlparse(absolute_url).scheme not in ('http', 'https') or absolute_url in seen:
+                continue
+            seen.add(absolute_url)
+            absolute_urls.append(absolute_url)
+        return absolute_urls
+
+    def _prefetches_assets(self):
+        """Return True if assets are downloaded ahead of the rewrite pass (parallel or deferred downloads)."""
+        return self.asset_workers > 1 or self.max_deferred_wait > 0
+
+    def _prefetch_assets(self, asset_urls, referer_url, output_dir, asset_cache, capture_report):
+        """Download assets in parallel so the rewrite pass can consume them in order.
+
+        With max_deferred_wait set, assets refused because their host is
+        cooling down (or that got a 429/503) are deferred rather than left
+        out: once every other asset is in, they are retried as their hosts'
+        cooldowns expire, within max_deferred_wait seconds per snapshot.
+        """
+        prefetched = capture_report.setdefault("_prefetched", {})
+        pending = [
+            url for url in asset_urls
+            if url not in asset_cache and url not in prefetched
+        ]
+        if not pending:
+            return
+
+        def fetch_one(asset_url):
+            host = (urlparse(asset_url).hostname or '').lower()
+            if self._respect_host_cooldown(host) > 0:
+                return asset_url, None
+            try:
+                return asset_url, self._fetch_asset_body(asset_url, referer_url, output_dir, capture_report)
+            except Exception as e:
+                if "is in cooldown for another" in str(e) or (self.max_deferred_wait and self._is_rate_limited(e)):
+                    # Deferred, or left to the rewrite pass, which records cooldown skips itself.
+                    return asset_url, None
+                return asset_url, e
+
+        def fetch_all(asset_urls):
+            """Prefetch asset_urls and return those that were rate limited."""
+            rate_limited = []
+            with ThreadPoolExecutor(max_workers=self.asset_workers) as pool:
+                for asset_url, outcome in pool.map(fetch_one, asset_urls):
+                    if outcome is None:
+                        rate_limited.append(asset_url)
+                    else:
+                        prefetched[asset_url] = outcome
+            return rate_limited
+
+        logger.info(f"Prefetching {len(pending)} assets with {self.asset_workers} workers")
+        deferred = fetch_all(pending)
+        if not deferred or not self.max_deferred_wait:
+            return
+
+        stats = capture_report["deferred_assets"]
+        stats['deferred'] += len(deferred)
+        if capture_report["_deferral_deadline"] is None:
+            capture_report["_deferral_deadline"] = time.monotonic() + self.max_deferred_wait
+        retry_round = 0
+        while deferred:
+            cooldowns = {url: self._respect_host_cooldown((urlparse(url).hostname or '').lower()) for url in deferred}
+            # A 429/503 above the host's rate floor sets no cooldown; back off anyway rather than hammer it.
+            wait_seconds = max(min(cooldowns.values()), DEFERRED_RETRY_BACKOFF_SECONDS * 2 ** retry_round)
+            retry_round += 1
+            if wait_seconds > capture_report["_deferral_deadline"] - time.monotonic():
+                logger.warning(
+                    f"Giving up on {len(deferred)} deferred assets: their next retry falls past "
+                    f"the {self.max_deferred_wait:.0f}s deferred wait budget"
+                )
+                for url in deferred:
+                    # Cached as missing so the rewrite pass does not fetch them again one by one.
+                    asset_cache[url] = None
+                    self._record_missing_resource(
+                        url, f"skipped_rate_limited:{(urlparse(url).hostname or '').lower()}", capture_report
+                    )
+                return
+            logger.info(f"⏳ Waiting {wait_seconds:.0f}s for a rate-limited host to retry {len(deferred)} deferred assets")
+            with self._request_metrics.stage('deferred_wait'):
+                time.sleep(wait_seconds)
+            stats['wait_seconds'] += wait_seconds
+            ready = [url for url in deferred if cooldowns[url] <= wait_seconds]
+            still_deferred = fetch_all(ready)
+            stats['recovered'] += sum(1 for url in ready if isinstance(prefetched.get(url), dict))
+            deferred = [url for url in deferred if url not in ready] + still_deferred
+
+    def _is_rate_limited(self, error):
+        """Return True if a fetch error is a 429/503 response."""
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None) in (429, 503)
+
+    def _take_prefetched(self, asset_url, capture_report):
+        """Pop a prefetched download for an asset, re-raising a prefetch error if there was one."""
+        prefetched = capture_report.get("_prefetched")
+        if not prefetched:
+            return None
+        outcome = prefetched.pop(asset_url, None)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _discard_prefetched(self, output_dir, capture_report):
+        """Drop prefetched downloads the rewrite never used, along with their partial files."""
+        capture_report["_prefetched"].clear()
+        shutil.rmtree(os.path.join(output_dir, PARTIAL_DIR_NAME), ignore_errors=True)
 
     def _is_asset_link(self, link_tag):
         """Return True if a <link> tag likely points to a render asset."""
@@ -570,13 +2560,14 @@ class DiscoMirror:
         if parsed.scheme not in ('http', 'https'):
             return None
         host = (parsed.hostname or '').lower()
-        if self._respect_host_cooldown(host) > 0:
-            self._record_missing_resource(absolute_url, f"skipped_rate_limited:{host}", capture_report)
-            return None
-
         if absolute_url in asset_cache:
             return asset_cache[absolute_url]
 
+        already_fetched = absolute_url in capture_report.get("_prefetched", {})
+        if not already_fetched and self._respect_host_cooldown(host) > 0:
+            self._record_missing_resource(absolute_url, f"skipped_rate_limited:{host}", capture_report)
+            return None
+
         local_path = self._download_asset(
             absolute_url,
             base_url,
@@ -591,45 +2582,189 @@ class DiscoMirror:
     def _download_asset(self, asset_url, referer_url, output_dir, asset_cache, capture_report):
         """Download a single asset and optionally rewrite nested CSS references."""
         try:
-            response = self._fetch(asset_url, referer=referer_url)
-            response.raise_for_status()
+            fetched = self._take_prefetched(asset_url, capture_report)
+            if fetched is None:
+                fetched = self._fetch_asset_body(asset_url, referer_url, output_dir, capture_report)
+            response = fetched['response']
+            content_type = fetched['content_type']
 
-            content_type = response.headers.get('content-type', '').split(';')[0].strip()
-            local_path = self._build_asset_path(asset_url, content_type)
-            absolute_output = os.path.join(output_dir, local_path)
-            os.makedirs(os.path.dirname(absolute_output), exist_ok=True)
+            if content_type == 'text/css':
+                # Stylesheets keep URL-based names: their final bytes depend on the nested rewrite below.
+                local_path = self._build_asset_path(asset_url, content_type)
+                absolute_output = os.path.join(output_dir, local_path)
+                os.makedirs(os.path.dirname(absolute_output), exist_ok=True)
 
-            # Register the path before CSS rewrite to prevent recursive import loops.
-            asset_cache[asset_url] = local_path
+                # Register the path before CSS rewrite to prevent recursive import loops.
+                asset_cache[asset_url] = local_path
 
-            content = response.content
-            if content_type == 'text/css':
                 css_text = response.text
+                if self._prefetches_assets():
+                    self._prefetch_assets(
+                        self._absolute_asset_urls(self._collect_css_asset_urls(css_text), response.url),
+                        response.url,
+                        output_dir,
+                        asset_cache,
+                        capture_report,
+                    )
                 rewritten_css = self._rewrite_css_urls(
                     css_text,
                     response.url,
                     output_dir,
                     asset_cache,
                     capture_report,
+                    css_path=local_path,
                 )
-                content = rewritten_css.encode('utf-8')
-
-            with open(absolute_output, "wb") as output_file:
-                output_file.write(content)
+                css_bytes = self._optimize_asset_bytes(rewritten_css.encode('utf-8'), content_type, capture_report)
+                with open(absolute_output, "wb") as output_file:
+                    output_file.write(css_bytes)
+                self._stream_bundle_file(capture_report, local_path, data=css_bytes)
+            else:
+                local_path = self._build_asset_path(
+                    asset_url,
+                    content_type,
+                    content_digest=fetched['digest'] if self.content_addressed else None,
+                )
+                absolute_output = os.path.join(output_dir, local_path)
+                os.makedirs(os.path.dirname(absolute_output), exist_ok=True)
+                asset_cache[asset_url] = local_path
+                if self.content_addressed and os.path.exists(absolute_output):
+                    # Same bytes already captured from another URL.
+                    os.remove(fetched['body_path'])
+                else:
+                    os.replace(fetched['body_path'], absolute_output)
+                    self._optimize_asset_file(absolute_output, content_type, capture_report)
+                    self._stream_bundle_file(capture_report, local_path, file_path=absolute_output)
 
             capture_report["localized_downloads"] += 1
+            self._journal_asset(capture_report, asset_url, 'localized', local_path=local_path, bytes=fetched['size'])
             return local_path
+        except AssetTooLarge as e:
+            asset_cache[asset_url] = None
+            self._record_missing_resource(asset_url, str(e), capture_report)
+            self._journal_asset(capture_report, asset_url, 'skipped', reason=str(e))
+            logger.info(f"Not localizing {asset_url}: {e}")
+            return None
         except Exception as e:
             # Cache failures to avoid repeated retries/noisy logs for duplicate URLs.
             asset_cache[asset_url] = None
             capture_report["failed_downloads"] += 1
             self._record_missing_resource(asset_url, f"download_failed:{e}", capture_report)
+            self._journal_asset(capture_report, asset_url, 'failed', reason=f"download_failed:{e}")
             if "is in cooldown for another" not in str(e):
                 logger.warning(f"Could not localize resource {asset_url}: {e}")
             return None
 
-    def _build_asset_path(self, resource_url, content_type):
-        """Generate deterministic local filename for an asset."""
+    def _optimize_asset_bytes(self, data, content_type, capture_report):
+        """Return data shrunk by the asset optimization stage (unchanged unless it is enabled)."""
+        if not self.optimize_assets:
+            return data
+        with self._request_metrics.stage('optimize'):
+            optimized = optimize_asset(data, content_type)
+        if optimized is None:
+            return data
+        kind, optimized_data = optimized
+        with self._capture_lock:
+            totals = capture_report["asset_optimization"].setdefault(
+                kind, {'files': 0, 'optimized_files': 0, 'bytes_before': 0, 'bytes_after': 0}
+            )
+            totals['files'] += 1
+            totals['optimized_files'] += len(optimized_data) < len(data)
+            totals['bytes_before'] += len(data)
+            totals['bytes_after'] += len(optimized_data)
+        return optimized_data
+
+    def _optimize_asset_file(self, file_path, content_type, capture_report):
+        """Run the asset optimization stage over a localized asset file in place."""
+        if not self.optimize_assets or content_type not in OPTIMIZED_CONTENT_TYPES:
+            return
+        if os.path.getsize(file_path) > OPTIMIZE_MAX_BYTES:
+            # Streamed to disk to keep memory flat; optimizing would read it back in whole.
+            return
+        with open(file_path, "rb") as asset_file:
+            data = asset_file.read()
+        optimized_data = self._optimize_asset_bytes(data, content_type, capture_report)
+        if optimized_data is not data:
+            with open(file_path, "wb") as asset_file:
+                asset_file.write(optimized_data)
+
+    def _fetch_asset_body(self, asset_url, referer_url, output_dir, capture_report):
+        """Fetch an asset, streaming non-CSS bodies to a partial file within the size caps."""
+        # Summed across prefetch workers, so it can exceed the capture's wall time.
+        with self._request_metrics.stage('asset_fetch'):
+            fetched = self._download_asset_body(asset_url, referer_url, output_dir, capture_report)
+        self._request_metrics.count((urlparse(asset_url).hostname or '').lower(), 'bytes', fetched['size'])
+        return fetched
+
+    def _download_asset_body(self, asset_url, referer_url, output_dir, capture_report):
+        """Stream an asset's body to disk (CSS into memory) and return what was fetched."""
+        response = self._fetch(asset_url, referer=referer_url, stream=True)
+        try:
+            response.raise_for_status()
+            content_type = response.headers.get('content-type', '').split(';')[0].strip()
+
+            declared_length = response.headers.get('content-length', '')
+            if self.max_asset_bytes and declared_length.isdigit() and int(declared_length) > self.max_asset_bytes:
+                raise AssetTooLarge(
+                    f"skipped_too_large:{declared_length} bytes exceeds per-asset cap of {self.max_asset_bytes}"
+                )
+
+            fetched = {'response': response, 'content_type': content_type}
+            if content_type == 'text/css':
+                # The nested url() rewrite needs the whole stylesheet as text.
+                content = response.content
+                if self.max_asset_bytes and len(content) > self.max_asset_bytes:
+                    raise AssetTooLarge(
+                        f"skipped_too_large:{len(content)} bytes exceeds per-asset cap of {self.max_asset_bytes}"
+                    )
+                self._reserve_snapshot_bytes(len(content), capture_report)
+                if self.http_cache:
+                    self.http_cache.store(asset_url, response)
+                fetched['size'] = len(content)
+                return fetched
+
+            partial_dir = os.path.join(output_dir, PARTIAL_DIR_NAME)
+            os.makedirs(partial_dir, exist_ok=True)
+            fd, body_path = tempfile.mkstemp(dir=partial_dir)
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as body_file:
+                    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                        if not chunk:
+                            continue
+                        if self.max_asset_bytes and size + len(chunk) > self.max_asset_bytes:
+                            raise AssetTooLarge(
+                                f"skipped_too_large:more than {self.max_asset_bytes} bytes (per-asset cap)"
+                            )
+                        self._reserve_snapshot_bytes(len(chunk), capture_report)
+                        size += len(chunk)
+                        digest.update(chunk)
+                        body_file.write(chunk)
+            except BaseException:
+                # Give back the budget an abandoned download had reserved.
+                self._reserve_snapshot_bytes(-size, capture_report)
+                os.remove(body_path)
+                raise
+
+            if self.http_cache:
+                self.http_cache.store(asset_url, response, source_path=body_path)
+            fetched.update(body_path=body_path, digest=digest.hexdigest(), size=size)
+            return fetched
+        finally:
+            response.close()
+
+    def _reserve_snapshot_bytes(self, byte_count, capture_report):
+        """Count downloaded asset bytes against the per-snapshot cap."""
+        with self._capture_lock:
+            total = capture_report["asset_bytes"] + byte_count
+            if byte_count > 0 and self.max_snapshot_bytes and total > self.max_snapshot_bytes:
+                raise AssetTooLarge(
+                    f"skipped_snapshot_budget:snapshot cap of {self.max_snapshot_bytes} asset bytes reached"
+                )
+            capture_report["asset_bytes"] = total
+
+    def _build_asset_path(self, resource_url, content_type, content_digest=None):
+        """Generate deterministic local filename for an asset (by content hash when a digest is given)."""
         parsed = urlparse(resource_url)
         extension = self._extension_for_content_type(content_type)
         if not extension:
@@ -639,7 +2774,10 @@ class DiscoMirror:
             else:
                 extension = mimetypes.guess_extension(content_type) or '.bin'
 
-        digest = hashlib.sha256(resource_url.encode('utf-8')).hexdigest()[:24]
+        if content_digest:
+            digest = content_digest[:24]
+        else:
+            digest = hashlib.sha256(resource_url.encode('utf-8')).hexdigest()[:24]
         return os.path.join('assets', f"{digest}{extension.lower()}")
 
     def _is_safe_path_extension(self, extension):
@@ -727,6 +2865,15 @@ class DiscoMirror:
 
     def _record_missing_resource(self, resource_url, reason, capture_report):
         """Track resources that could not be captured for offline rendering."""
+        rewrite_pass = capture_report.get("_rewrite_pass")
+        if rewrite_pass is not None:
+            # Ordered and deduplicated when the rewrite walk finishes.
+            capture_report["missing_resources"].append({
+                "url": resource_url,
+                "reason": reason,
+                "_pass": rewrite_pass,
+            })
+            return
         seen = capture_report.get("_missing_seen")
         if seen is not None:
             key = f"{reason}|{resource_url}"
@@ -738,41 +2885,38 @@ class DiscoMirror:
             "reason": reason,
         })
 
-    def _strip_network_hints(self, soup, capture_report):
-        """Remove browser hints that can trigger outbound network calls."""
-        for base_tag in soup.find_all('base'):
-            if base_tag is None or getattr(base_tag, "attrs", None) is None:
-                continue
-            base_href = ((base_tag.attrs or {}).get('href') or '').strip()
+    def _strip_network_hint(self, tag, capture_report):
+        """Remove an element that can trigger outbound network calls (base, hint links, meta refresh)."""
+        tag_name = tag.name
+        if tag_name in ('base', 'link', 'meta'):
+            self._enter_rewrite_pass(capture_report, f'hint:{tag_name}')
+        attrs = tag.attrs or {}
+        if tag_name == 'base':
+            base_href = (attrs.get('href') or '').strip()
             if base_href:
                 capture_report["blocked_references"] += 1
                 self._record_missing_resource(base_href, "base_tag_removed", capture_report)
-            base_tag.decompose()
+            tag.decompose()
 
-        hint_rel_values = {'dns-prefetch', 'preconnect', 'prerender', 'pingback'}
-        for link in soup.find_all('link'):
-            if link is None or getattr(link, "attrs", None) is None:
-                continue
-            rel_attr = (link.attrs or {}).get('rel', [])
+        elif tag_name == 'link':
+            rel_attr = attrs.get('rel', [])
             if isinstance(rel_attr, str):
                 rel_attr = [rel_attr]
             rel_values = {value.lower() for value in rel_attr if isinstance(value, str)}
-            if rel_values.intersection(hint_rel_values):
-                link_href = ((link.attrs or {}).get('href') or '').strip()
+            if rel_values.intersection(NETWORK_HINT_REL_VALUES):
+                link_href = (attrs.get('href') or '').strip()
                 if link_href:
                     capture_report["blocked_references"] += 1
                     self._record_missing_resource(link_href, "network_hint_removed", capture_report)
-                link.decompose()
+                tag.decompose()
 
-        for meta in soup.find_all('meta'):
-            if meta is None or getattr(meta, "attrs", None) is None:
-                continue
-            if ((meta.attrs or {}).get('http-equiv') or '').lower() == 'refresh':
-                refresh_value = ((meta.attrs or {}).get('content') or '').strip()
+        elif tag_name == 'meta':
+            if (attrs.get('http-equiv') or '').lower() == 'refresh':
+                refresh_value = (attrs.get('content') or '').strip()
                 if refresh_value:
                     capture_report["blocked_references"] += 1
                     self._record_missing_resource(refresh_value, "meta_refresh_removed", capture_report)
-                meta.decompose()
+                tag.decompose()
 
     def _inject_offline_csp(self, soup):
         """Inject CSP to prevent loading assets from external origins."""
@@ -781,25 +2925,9 @@ class DiscoMirror:
             if (meta.get('http-equiv') or '').lower() == 'content-security-policy':
                 meta.decompose()
 
-        csp_value = (
-            "default-src 'self' data: blob:; "
-            "img-src 'self' data: blob:; "
-            "media-src 'self' data: blob:; "
-            "font-src 'self' data: blob:; "
-            "style-src 'self' 'unsafe-inline' data: blob:; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval' blob:; "
-            "connect-src 'self'; "
-            "frame-src 'self' data: blob:; "
-            "worker-src 'self' blob:; "
-            "child-src 'self' blob:; "
-            "object-src 'self' data: blob:; "
-            "manifest-src 'self'; "
-            "form-action 'self'; "
-            "base-uri 'self'"
-        )
         csp_tag = soup.new_tag('meta')
         csp_tag['http-equiv'] = 'Content-Security-Policy'
-        csp_tag['content'] = csp_value
+        csp_tag['content'] = OFFLINE_CSP
         head.insert(0, csp_tag)
 
     def _ensure_head(self, soup):
@@ -838,82 +2966,951 @@ class DiscoMirror:
     
     def publish_to_contract(self, domain, path, ipfs_hash):
         """Publish the mirror to the smart contract."""
+        result = self.publish_batch([(domain, path, ipfs_hash)])[0]
+        return result['status'] == 'published'
+
+    def publish_batch(self, entries):
+        """Publish (domain, path, ipfs_hash) entries back to back and return one result dict per entry.
+
+        Nonces are assigned locally, so every transaction is sent before the
+        first receipt is awaited; receipts are then collected concurrently.
+        Every send is written to the outbox first, so a rerun resumes waiting
+        on transactions already in flight instead of publishing them twice.
+        Pending transactions for entries outside this batch are resumed (and
+        fee-bumped) as well, since every new nonce queues behind them.
+        """
+        results = [
+            {'domain': domain, 'path': path, 'ipfs_hash': ipfs_hash, 'status': 'pending'}
+            for domain, path, ipfs_hash in entries
+        ]
         if not self.contract:
             logger.error("Smart contract not initialized")
-            return False
-            
-        try:
-            # Build transaction
-            txn = self.contract.functions.publishMirror(
-                domain, path, ipfs_hash
-            ).build_transaction({
+            for result in results:
+                result.update(status='failed', error='contract not initialized')
+            return results
+
+        self._outbox = self._load_outbox()
+        to_send = []
+        sent = []
+        for result in results:
+            record = self._outbox.get(self._outbox_key(result))
+            if record and record['status'] in ('sent', 'published'):
+                result.update(
+                    status=record['status'],
+                    tx_hash=record['txs'][-1]['tx_hash'],
+                    nonce=record['nonce'],
+                    resumed=True,
+                )
+                if record['status'] == 'published':
+                    result['block'] = record.get('block')
+                    logger.info(f"♻️ {result['domain']}{result['path']} {result['ipfs_hash']} was already published")
+                else:
+                    logger.info(
+                        f"⏳ Resuming pending publish of {result['domain']}{result['path']}: "
+                        f"{result['tx_hash']} (nonce {result['nonce']})"
+                    )
+                    sent.append(result)
+            else:
+                to_send.append(result)
+
+        batch_keys = {self._outbox_key(result) for result in results}
+        for key, record in list(self._outbox.items()):
+            if key in batch_keys or record.get('status') != 'sent':
+                continue
+            earlier = {
+                'domain': record['domain'],
+                'path': record['path'],
+                'ipfs_hash': record['ipfs_hash'],
+                'status': 'sent',
+                'tx_hash': record['txs'][-1]['tx_hash'],
+                'nonce': record['nonce'],
+                'resumed': True,
+            }
+            logger.info(
+                f"⏳ Resuming pending publish of {earlier['domain']}{earlier['path']} from an earlier run: "
+                f"{earlier['tx_hash']} (nonce {earlier['nonce']})"
+            )
+            sent.append(earlier)
+
+        if to_send:
+            try:
+                fees = self._publish_fee_fields()
+            except Exception as e:
+                logger.error(f"Failed to fetch network fees: {e}")
+                for result in to_send:
+                    result.update(status='failed', error=f"fee_lookup_failed:{e}")
+                to_send = []
+
+        for result in to_send:
+            try:
+                self._send_publish(result, fees)
+            except Exception as e:
+                result.update(status='failed', error=str(e))
+                logger.error(f"Failed to publish {result['domain']}{result['path']}: {e}")
+                continue
+            logger.info(
+                f"📡 Transaction sent for {result['domain']}{result['path']}: "
+                f"{result['tx_hash']} (nonce {result['nonce']})"
+            )
+            sent.append(result)
+
+        if sent:
+            with ThreadPoolExecutor(max_workers=min(len(sent), MAX_RECEIPT_WAITERS)) as pool:
+                with self.metrics.stage('receipt_wait'):
+                    list(pool.map(self._await_publish_receipt, sent))
+
+        published = sum(1 for result in results if result['status'] == 'published')
+        if len(results) > 1:
+            logger.info(f"Published {published}/{len(results)} mirrors")
+        return results
+
+    def _publish_fee_fields(self):
+        """Return EIP-1559 fee fields for publish transactions (legacy gasPrice if the chain has no base fee)."""
+        latest_block = self.w3.eth.get_block('latest')
+        base_fee = latest_block.get('baseFeePerGas')
+        if base_fee is None:
+            return {'gasPrice': self.w3.eth.gas_price}
+        if self.priority_fee_wei is not None:
+            priority_fee = self.priority_fee_wei
+        else:
+            priority_fee = self.w3.eth.max_priority_fee
+        # Headroom for the base fee to double before the transaction is priced out.
+        return {
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': 2 * base_fee + priority_fee,
+        }
+
+    def _send_publish(self, result, fees):
+        """Estimate, sign and send one publishMirror transaction using the next local nonce."""
+        function_call = self.contract.functions.publishMirror(
+            result['domain'], result['path'], result['ipfs_hash']
+        )
+        gas_limit = int(function_call.estimate_gas({'from': self.address}) * GAS_ESTIMATE_MARGIN)
+        key = self._outbox_key(result)
+
+        with self._nonce_lock:
+            if self._next_nonce is None:
+                self._next_nonce = max(
+                    self.w3.eth.get_transaction_count(self.address, 'pending'),
+                    self._outbox_next_nonce(),
+                )
+            nonce = self._next_nonce
+            txn = function_call.build_transaction({
                 'from': self.address,
-                'nonce': self.w3.eth.get_transaction_count(self.address),
-                'gas': 500000,
-                'gasPrice': self.w3.eth.gas_price,
+                'nonce': nonce,
+                'gas': gas_limit,
+                **fees,
             })
-            
-            # Sign and send transaction
             signed_txn = self.account.sign_transaction(txn)
-            raw_tx = getattr(signed_txn, "rawTransaction", None)
-            if raw_tx is None:
-                raw_tx = getattr(signed_txn, "raw_transaction", None)
-            if raw_tx is None:
-                raise ValueError("Signed transaction missing raw transaction bytes")
+            tx_hash = self.w3.to_hex(signed_txn.hash)
+            # Record before sending: if we die after the node accepts it, a rerun must not send it again.
+            self._outbox_update(key, {
+                'domain': result['domain'],
+                'path': result['path'],
+                'ipfs_hash': result['ipfs_hash'],
+                'status': 'sent',
+                'nonce': nonce,
+                'gas': gas_limit,
+                'created_at': int(time.time()),
+                'txs': [{'tx_hash': tx_hash, 'fees': dict(fees), 'sent_at': time.time()}],
+            })
+            try:
+                self.w3.eth.send_raw_transaction(self._raw_transaction(signed_txn))
+            except Exception:
+                self._outbox_update(key, None)
+                # The node may know a nonce we do not; resync before the next send.
+                self._next_nonce = None
+                raise
+            self._next_nonce = nonce + 1
 
-            tx_hash = self.w3.eth.send_raw_transaction(raw_tx)
-            
-            logger.info(f"📡 Transaction sent: {tx_hash.hex()}")
-            
-            # Wait for confirmation
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if receipt.status == 1:
-                logger.info(f"✅ Mirror published successfully! Block: {receipt.blockNumber}")
-                return True
+        result.update(status='sent', tx_hash=tx_hash, nonce=nonce, gas=gas_limit, fees=dict(fees))
+        return tx_hash
+
+    def _raw_transaction(self, signed_txn):
+        """Return raw bytes from a signed transaction across eth-account versions."""
+        raw_tx = getattr(signed_txn, "rawTransaction", None)
+        if raw_tx is None:
+            raw_tx = getattr(signed_txn, "raw_transaction", None)
+        if raw_tx is None:
+            raise ValueError("Signed transaction missing raw transaction bytes")
+        return raw_tx
+
+    def _await_publish_receipt(self, result):
+        """Wait for a sent publish transaction; an RPC error fails only this entry."""
+        try:
+            self._wait_for_publish_receipt(result)
+        except Exception as e:
+            # Left as 'sent' in the outbox so the next run resumes waiting on it.
+            result.update(status='failed', error=f"receipt_wait_failed:{e}")
+            logger.error(f"Lost track of {result['tx_hash']} ({result['domain']}{result['path']}): {e}")
+
+    def _wait_for_publish_receipt(self, result):
+        """Wait for a sent publish transaction, replacing it with higher fees while it is stuck."""
+        key = self._outbox_key(result)
+        deadline = time.time() + self.receipt_timeout
+        while True:
+            receipt = self._find_publish_receipt(key)
+            if receipt is not None:
+                break
+
+            now = time.time()
+            record = self._outbox[key]
+            stuck = now - record['txs'][-1]['sent_at'] >= self.replace_after
+            if now >= deadline or stuck:
+                if self.w3.eth.get_transaction_count(self.address, 'latest') > record['nonce']:
+                    # The nonce is used up; look once more in case one of our transactions just landed.
+                    receipt = self._find_publish_receipt(key)
+                    if receipt is not None:
+                        break
+                    self._outbox_update(key, None)
+                    result.update(status='failed', error=f"nonce {record['nonce']} was consumed by another transaction")
+                    logger.error(f"❌ Publish of {result['domain']}{result['path']} was dropped: {result['error']}")
+                    return
+                if now >= deadline:
+                    # Left as 'sent' in the outbox so the next run keeps waiting on it.
+                    result.update(status='failed', error=f"receipt_wait_failed:no receipt after {self.receipt_timeout}s")
+                    logger.error(f"No receipt for {result['tx_hash']} ({result['domain']}{result['path']}) yet")
+                    return
+                if len(record['txs']) <= self.max_fee_bumps:
+                    self._replace_stuck_publish(result, key)
+            time.sleep(RECEIPT_POLL_SECONDS)
+
+        result.update(tx_hash=self.w3.to_hex(receipt.transactionHash), block=receipt.blockNumber)
+        if receipt.status == 1:
+            result['status'] = 'published'
+            self._outbox_update(key, {'status': 'published', 'block': receipt.blockNumber, 'mined_tx': result['tx_hash']})
+            logger.info(
+                f"✅ Mirror published successfully! {result['domain']}{result['path']} Block: {receipt.blockNumber}"
+            )
+        else:
+            result.update(status='reverted', error='transaction reverted')
+            self._outbox_update(key, {'status': 'reverted', 'block': receipt.blockNumber, 'mined_tx': result['tx_hash']})
+            logger.error(f"❌ Transaction failed for {result['domain']}{result['path']}: {result['tx_hash']}")
+
+    def _find_publish_receipt(self, key):
+        """Return the receipt of whichever transaction sent for an outbox entry was mined, if any."""
+        from web3.exceptions import TransactionNotFound
+
+        for tx in reversed(self._outbox[key]['txs']):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx['tx_hash'])
+            except TransactionNotFound:
+                continue
+            except Exception as e:
+                logger.debug(f"Receipt lookup for {tx['tx_hash']} failed: {e}")
+        return None
+
+    def _replace_stuck_publish(self, result, key):
+        """Resend a stuck publish at the same nonce with bumped fees."""
+        record = self._outbox[key]
+        previous_fees = record['txs'][-1]['fees']
+        try:
+            current_fees = self._publish_fee_fields()
+        except Exception as e:
+            logger.debug(f"Fee lookup for replacement failed, bumping previous fees only: {e}")
+            current_fees = {}
+        fees = {
+            name: max(int(value * FEE_BUMP_RATIO) + 1, current_fees.get(name, 0))
+            for name, value in previous_fees.items()
+        }
+
+        txn = self.contract.functions.publishMirror(
+            result['domain'], result['path'], result['ipfs_hash']
+        ).build_transaction({
+            'from': self.address,
+            'nonce': record['nonce'],
+            'gas': record['gas'],
+            **fees,
+        })
+        signed_txn = self.account.sign_transaction(txn)
+        tx_hash = self.w3.to_hex(signed_txn.hash)
+        txs = record['txs'] + [{'tx_hash': tx_hash, 'fees': fees, 'sent_at': time.time()}]
+        self._outbox_update(key, {'txs': txs})
+        try:
+            self.w3.eth.send_raw_transaction(self._raw_transaction(signed_txn))
+        except Exception as e:
+            # Usually the original was mined meanwhile; keep waiting on the hashes we know.
+            logger.warning(f"Could not replace stuck transaction {result['tx_hash']}: {e}")
+            txs = [dict(tx) for tx in record['txs']]
+            txs[-1]['sent_at'] = time.time()
+            self._outbox_update(key, {'txs': txs})
+            return
+        logger.info(
+            f"⛽ Replaced stuck publish of {result['domain']}{result['path']} (nonce {record['nonce']}): "
+            f"{result['tx_hash']} -> {tx_hash}"
+        )
+        result.update(tx_hash=tx_hash, fees=fees)
+
+    def _outbox_key(self, entry):
+        return f"{entry['domain']}|{entry['path']}|{entry['ipfs_hash']}"
+
+    def _load_outbox(self):
+        """Load the publish outbox, dropping settled entries past the retention window."""
+        if not self.outbox_path:
+            return {}
+        outbox = load_json_state(self.outbox_path, {})
+        cutoff = time.time() - OUTBOX_RETENTION_SECONDS
+        return {
+            key: record for key, record in outbox.items()
+            if record.get('status') == 'sent' or record.get('created_at', 0) >= cutoff
+        }
+
+    def _outbox_update(self, key, changes):
+        """Create, update (changes dict) or delete (changes None) an outbox entry and persist it."""
+        with self._outbox_lock:
+            if changes is None:
+                self._outbox.pop(key, None)
             else:
-                logger.error(f"❌ Transaction failed")
-                return False
-                
+                self._outbox[key] = dict(self._outbox.get(key, {}), **changes)
+            if self.outbox_path:
+                save_json_state(self.outbox_path, self._outbox)
+
+    def _outbox_next_nonce(self):
+        """Return the nonce after the highest one still pending in the outbox."""
+        with self._outbox_lock:
+            pending = [record['nonce'] for record in self._outbox.values() if record.get('status') == 'sent']
+        return max(pending) + 1 if pending else 0
+
+    def _last_published(self, domain, path):
+        """Return {'cid', 'bundle_digest'?} for what we last published at domain/path, from local state or the registry."""
+        published = load_json_state(self.published_state_path, {})
+        entry = published.get(f"{domain}{path}")
+        if entry and entry.get('cid'):
+            return entry
+
+        try:
+            latest = self.contract.functions.getLatestByDomainPath(domain, path).call()
         except Exception as e:
-            logger.error(f"Failed to publish to contract: {e}")
+            # The registry reverts when nothing has been published for domain/path yet.
+            logger.debug(f"No registry entry for {domain}{path}: {e}")
+            return None
+        _, _, ipfs_hash, publisher, _, _ = latest
+        if publisher.lower() != self.address.lower():
+            return None
+        return {'cid': ipfs_hash}
+
+    def _record_published_cid(self, domain, path, ipfs_hash, bundle_digest=None):
+        """Remember the CID (and bundle digest, when known) published for domain/path."""
+        published = load_json_state(self.published_state_path, {})
+        entry = {'cid': ipfs_hash, 'published_at': int(time.time())}
+        if bundle_digest:
+            entry['bundle_digest'] = bundle_digest
+        published[f"{domain}{path}"] = entry
+        save_json_state(self.published_state_path, published)
+
+    def _bundle_matches_published(self, snapshot_dir, previous, local_digest):
+        """Return True if the bundle is the one last published, as returned by _last_published."""
+        if previous.get('bundle_digest'):
+            logger.info(f"Local bundle digest {local_digest[:16]} vs {previous['bundle_digest'][:16]} published as {previous['cid']}")
+            return local_digest == previous['bundle_digest']
+        if self.stream_upload or self.cid_index is not None:
+            # An MFS-assembled directory need not hash like `ipfs add -r`; upload once to record a digest.
+            logger.info(f"No bundle digest recorded for {previous['cid']}; uploading to record one")
             return False
-    
-    def mirror_site(self, domain, path, crawl_url):
+        return self._bundle_matches_cid(snapshot_dir, previous['cid'])
+
+    def _bundle_matches_cid(self, snapshot_dir, previous_cid):
+        """Return True if `ipfs add -r` of the bundle, with the previous snapshot.json, hashes to previous_cid."""
+        try:
+            previous_snapshot = json.loads(self.ipfs.cat(f"{previous_cid}/snapshot.json", timeout=30))
+        except Exception as e:
+            logger.warning(f"Could not read snapshot.json from {previous_cid}; assuming the page changed: {e}")
+            return False
+
+        snapshot_path = os.path.join(snapshot_dir, "snapshot.json")
+        with open(snapshot_path, "rb") as snapshot_file:
+            original_snapshot = snapshot_file.read()
+        if comparable_snapshot(json.loads(original_snapshot)) != comparable_snapshot(previous_snapshot):
+            return False
+
+        try:
+            # Only volatile fields differ, so the previous snapshot.json stands in for this one.
+            self._write_snapshot(snapshot_dir, previous_snapshot)
+            result = self.ipfs.add(snapshot_dir, recursive=True, only_hash=True)
+            local_cid = self._extract_ipfs_hash(result, snapshot_dir)
+        except Exception as e:
+            logger.warning(f"Could not hash snapshot bundle locally: {e}")
+            return False
+        finally:
+            with open(snapshot_path, "wb") as snapshot_file:
+                snapshot_file.write(original_snapshot)
+
+        logger.info(f"Local bundle CID {local_cid} vs last published {previous_cid}")
+        return local_cid == previous_cid
+
+    def write_metrics(self):
+        """Write run-wide metrics to the configured metrics file, if any."""
+        if not self.metrics_path:
+            return
+        try:
+            self.metrics.write(self.metrics_path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.metrics_path}: {e}")
+
+    def _open_mirror_job(self, domain, path, crawl_url, crawl=False):
+        """Set up the bundle directory (work dir or temporary) and journal for one mirror run."""
+        job = {
+            'url': crawl_url,
+            'domain': domain,
+            'path': path,
+            'crawl': bool(crawl),
+            'status': 'pending',
+            'stage': None,
+            'ipfs_hash': None,
+            'bundle_digest': None,
+            'error': None,
+            'run_dir': None,
+            'journal': None,
+            'bundle_upload': None,
+            'temp_dir': None,
+            'started_at': time.monotonic(),
+        }
+        if self.work_dir:
+            # One subdirectory per target, so several mirrors can share a work dir.
+            run_dir = os.path.join(self.work_dir, hashlib.sha256(crawl_url.encode('utf-8')).hexdigest()[:16])
+            journal = CaptureJournal(os.path.join(run_dir, "journal.jsonl"))
+            if not journal.begin(self._journal_run_header(crawl_url, crawl)):
+                shutil.rmtree(os.path.join(run_dir, "bundle"), ignore_errors=True)
+            os.makedirs(os.path.join(run_dir, "bundle"), exist_ok=True)
+            job.update(run_dir=run_dir, journal=journal, snapshot_dir=os.path.join(run_dir, "bundle"))
+        else:
+            job['temp_dir'] = tempfile.TemporaryDirectory(prefix="discoball-snapshot-")
+            job['snapshot_dir'] = job['temp_dir'].name
+        return job
+
+    def _journal_run_header(self, crawl_url, crawl):
+        """Describe a run by every option that changes the bundle's bytes; a journal only resumes an identical run."""
+        run = {
+            'url': crawl_url,
+            'crawl': bool(crawl),
+            'content_addressed': bool(self.content_addressed),
+            'html_parser': self.html_parser,
+            'html_rewriter': self.html_rewriter,
+            'optimize_assets': bool(self.optimize_assets),
+            'max_asset_bytes': self.max_asset_bytes,
+            'max_snapshot_bytes': self.max_snapshot_bytes,
+            'max_deferred_wait': self.max_deferred_wait,
+            # Pacing decides which assets a rate-limited host leaves out.
+            'host_limits': {
+                'default': self.rate_controller.defaults,
+                'hosts': self.rate_controller.host_overrides,
+                'cooldown': self.rate_controller.default_cooldown,
+            },
+        }
+        if crawl:
+            run.update(max_pages=self.crawl_max_pages, max_depth=self.crawl_max_depth)
+        return run
+
+    def _capture_stage(self, job):
+        """Crawl a job's target into its bundle directory; return False if the capture failed."""
+        journal = job['journal']
+        if journal and journal.last('uploaded'):
+            return True
+        if journal and journal.last('captured'):
+            logger.info("↩️ Capture already finished; resuming at upload")
+            return True
+
+        if self.stream_upload and self.ipfs is not None:
+            # Files go to IPFS as the crawl produces them, overlapping upload with capture.
+            job['bundle_upload'] = MfsBundleBuilder(self.ipfs, self.cid_index, background=True)
+        crawl = self.crawl_site if job['crawl'] else self.crawl_page
+        with self.metrics.stage('capture'):
+            snapshot = crawl(
+                job['url'],
+                job['domain'],
+                job['path'],
+                job['snapshot_dir'],
+                bundle_upload=job['bundle_upload'],
+                journal=journal,
+            )
+        if not snapshot:
+            logger.error("Failed to crawl page. Cannot proceed.")
+            job.update(status='failed', stage='capture', error='capture failed')
+            return False
+        if journal:
+            journal.record('captured', url=snapshot['url'])
+        return True
+
+    def _upload_stage(self, job):
+        """Add a captured bundle to IPFS and set job['ipfs_hash']; return False if the upload failed.
+
+        With --skip-unchanged, a bundle identical to the last published one is
+        marked 'unchanged' instead of being uploaded again.
+        """
+        journal = job['journal']
+        uploaded = journal.last('uploaded') if journal else None
+        if uploaded:
+            job['ipfs_hash'] = uploaded['cid']
+            logger.info(f"↩️ Bundle was already uploaded as {job['ipfs_hash']}; resuming at publish")
+            self._release_mirror_job(job)
+            return True
+
+        try:
+            if self.published_state_path:
+                job['bundle_digest'] = bundle_digest(job['snapshot_dir'])
+                previous = self._last_published(job['domain'], job['path'])
+                if previous and self._bundle_matches_published(job['snapshot_dir'], previous, job['bundle_digest']):
+                    logger.info(
+                        f"♻️ Snapshot of {job['domain']}{job['path']} is unchanged since {previous['cid']}; "
+                        f"skipping upload and publish"
+                    )
+                    job.update(status='unchanged', ipfs_hash=previous['cid'])
+                    return True
+
+            with self.metrics.stage('upload'):
+                ipfs_hash = self.upload_to_ipfs(job['snapshot_dir'], bundle_upload=job['bundle_upload'])
+            if ipfs_hash and journal:
+                journal.record('uploaded', cid=ipfs_hash)
+        finally:
+            self._release_mirror_job(job)
+
+        if not ipfs_hash:
+            logger.error("Failed to upload to IPFS. Cannot proceed.")
+            job.update(status='failed', stage='upload', error='upload failed')
+            return False
+        job['ipfs_hash'] = ipfs_hash
+        return True
+
+    def _publish_stage(self, jobs):
+        """Publish uploaded jobs in one batch of transactions and finish each of them."""
+        with self.metrics.stage('publish'):
+            results = self.publish_batch([(job['domain'], job['path'], job['ipfs_hash']) for job in jobs])
+        for job, result in zip(jobs, results):
+            job.update(status=result['status'], tx_hash=result.get('tx_hash'))
+            if result['status'] == 'published':
+                if self.published_state_path:
+                    self._record_published_cid(job['domain'], job['path'], job['ipfs_hash'], job.get('bundle_digest'))
+                logger.info(f"🎉 Successfully mirrored {job['domain']}{job['path']}")
+                logger.info(f"   IPFS Hash: {job['ipfs_hash']}")
+                logger.info(f"   Gateway URL: http://127.0.0.1:8080/ipfs/{job['ipfs_hash']}")
+            else:
+                logger.error(f"Failed to publish {job['domain']}{job['path']} to smart contract.")
+                job.update(stage='publish', error=result.get('error') or f"transaction {result['status']}")
+            self._finish_mirror_job(job)
+
+    def _release_mirror_job(self, job):
+        """Stop a job's streaming upload and close its journal and temporary bundle directory."""
+        if job['bundle_upload'] is not None:
+            job['bundle_upload'].close()
+            job['bundle_upload'] = None
+        if job['journal'] is not None:
+            job['journal'].close()
+        if job['temp_dir'] is not None:
+            job['temp_dir'].cleanup()
+            job['temp_dir'] = None
+
+    def _finish_mirror_job(self, job):
+        """Release a job's resources; a run that is done no longer needs its work dir."""
+        self._release_mirror_job(job)
+        job['seconds'] = round(time.monotonic() - job['started_at'], 3)
+        if job['run_dir'] and job['status'] in ('published', 'unchanged'):
+            shutil.rmtree(job['run_dir'], ignore_errors=True)
+
+    def _fail_mirror_job(self, job, stage, error):
+        """Mark a job failed at a stage after an unexpected exception."""
+        logger.exception(f"Mirroring {job['url']} failed during {stage}: {error}")
+        job.update(status='failed', stage=stage, error=str(error))
+
+    def _mirror_job_result(self, job):
+        """Return the report entry for a finished job."""
+        return {
+            'url': job['url'],
+            'domain': job['domain'],
+            'path': job['path'],
+            'dns_verified': job.get('dns_verified', False),
+            'status': job['status'],
+            'failed_stage': job['stage'],
+            'ipfs_hash': job['ipfs_hash'],
+            'tx_hash': job.get('tx_hash'),
+            'error': job['error'],
+            'seconds': job.get('seconds'),
+        }
+
+    def mirror_site(self, domain, path, crawl_url, crawl=False):
         """Complete mirroring process: verify DNS, crawl, upload to IPFS, publish to contract."""
-        logger.info(f"🪩 Starting mirror process for {crawl_url}")
-        
-        # Step 1: Verify DNS record
-        dns_verified = self.verify_dns_record(domain)
-        if not dns_verified:
-            logger.warning("⚠️ DNS verification did not pass. Proceeding anyway; this mirror will be marked UNVERIFIED.")
-        
-        with tempfile.TemporaryDirectory(prefix="discoball-snapshot-") as snapshot_dir:
-            # Step 2: Crawl the page and build a browsable snapshot bundle
-            snapshot = self.crawl_page(crawl_url, domain, path, snapshot_dir)
-            if not snapshot:
-                logger.error("Failed to crawl page. Cannot proceed.")
-                return False, dns_verified
-
-            # Step 3: Upload snapshot bundle directory to IPFS
-            ipfs_hash = self.upload_to_ipfs(snapshot_dir)
-            if not ipfs_hash:
-                logger.error("Failed to upload to IPFS. Cannot proceed.")
-                return False, dns_verified
+        try:
+            logger.info(f"🪩 Starting mirror process for {crawl_url}")
         
-        # Step 4: Publish to smart contract
-        if self.publish_to_contract(domain, path, ipfs_hash):
-            logger.info(f"🎉 Successfully mirrored {domain}{path}")
-            logger.info(f"   IPFS Hash: {ipfs_hash}")
-            logger.info(f"   Gateway URL: http://127.0.0.1:8080/ipfs/{ipfs_hash}")
-            if dns_verified:
-                logger.info("✅ DNS status: VERIFIED")
-            else:
-                logger.warning("⚠️ DNS status: UNVERIFIED")
-            return True, dns_verified
-        else:
-            logger.error("Failed to publish to smart contract.")
+            # Step 1: Verify DNS record
+            with self.metrics.stage('dns'):
+                dns_verified = self.verify_dns_record(domain)
+            if not dns_verified:
+                logger.warning("⚠️ DNS verification did not pass. Proceeding anyway; this mirror will be marked UNVERIFIED.")
+
+            job = self._open_mirror_job(domain, path, crawl_url, crawl)
+            try:
+                # Step 2: Crawl the page and build a browsable snapshot bundle
+                # Step 3: Upload snapshot bundle directory to IPFS
+                if not self._capture_stage(job) or not self._upload_stage(job):
+                    return False, dns_verified
+            finally:
+                self._release_mirror_job(job)
+            if job['status'] == 'unchanged':
+                self._finish_mirror_job(job)
+                return True, dns_verified
+
+            # Step 4: Publish to smart contract
+            self._publish_stage([job])
+            if job['status'] == 'published':
+                if dns_verified:
+                    logger.info("✅ DNS status: VERIFIED")
+                else:
+                    logger.warning("⚠️ DNS status: UNVERIFIED")
+                return True, dns_verified
             return False, dns_verified
+        finally:
+            self.write_metrics()
+
+    def mirror_batch(self, targets, crawl=False, pipeline_depth=None, before_capture=None):
+        """Mirror many (domain, path, crawl_url) targets through pipelined stages; return one result per target.
+
+        Capture runs on the calling thread while upload and publish each run
+        on their own thread, handing jobs on through bounded queues: page N+1
+        is captured while page N uploads and page N-1 publishes. The queue
+        depth caps how many finished bundles wait on disk, and every job
+        waiting to publish goes out in the same batch of transactions.
+
+        before_capture(target), if given, runs before each capture; when it
+        returns False the batch stops there and the remaining targets get no
+        result.
+        """
+        pipeline_depth = self.pipeline_depth if pipeline_depth is None else max(1, int(pipeline_depth))
+        logger.info(f"🪩 Starting batch mirror of {len(targets)} URLs (pipeline depth {pipeline_depth})")
+        with self.metrics.stage('dns'):
+            dns_results = self.verify_dns_records(sorted({domain for domain, _, _ in targets}))
+        upload_queue = queue.Queue(maxsize=pipeline_depth)
+        publish_queue = queue.Queue(maxsize=pipeline_depth)
+        jobs = []
+
+        def upload_worker():
+            while True:
+                job = upload_queue.get()
+                if job is None:
+                    publish_queue.put(None)
+                    return
+                try:
+                    uploaded = self._upload_stage(job)
+                except Exception as e:
+                    self._fail_mirror_job(job, 'upload', e)
+                    uploaded = False
+                if uploaded and job['status'] != 'unchanged':
+                    publish_queue.put(job)
+                else:
+                    self._finish_mirror_job(job)
+
+        def publish_worker():
+            finished = False
+            while not finished:
+                ready = [publish_queue.get()]
+                while True:
+                    try:
+                        ready.append(publish_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                finished = ready[-1] is None
+                ready = [job for job in ready if job is not None]
+                if not ready:
+                    continue
+                try:
+                    self._publish_stage(ready)
+                except Exception as e:
+                    for job in ready:
+                        self._fail_mirror_job(job, 'publish', e)
+                        self._finish_mirror_job(job)
+
+        uploader = threading.Thread(target=upload_worker, name="discoball-upload", daemon=True)
+        publisher = threading.Thread(target=publish_worker, name="discoball-publish", daemon=True)
+        uploader.start()
+        publisher.start()
+        try:
+            for index, (domain, path, crawl_url) in enumerate(targets, start=1):
+                if before_capture is not None and not before_capture((domain, path, crawl_url)):
+                    logger.info(f"Stopping batch before {len(targets) - index + 1} remaining URLs")
+                    break
+                logger.info(f"🪩 [{index}/{len(targets)}] Capturing {crawl_url}")
+                job = self._open_mirror_job(domain, path, crawl_url, crawl)
+                job['dns_verified'] = dns_results.get(domain, False)
+                jobs.append(job)
+                try:
+                    captured = self._capture_stage(job)
+                except Exception as e:
+                    self._fail_mirror_job(job, 'capture', e)
+                    captured = False
+                if captured:
+                    # Blocks while the uploader is pipeline_depth bundles behind.
+                    upload_queue.put(job)
+                else:
+                    self._finish_mirror_job(job)
+        finally:
+            upload_queue.put(None)
+            uploader.join()
+            publisher.join()
+
+        self.write_metrics()
+        results = [self._mirror_job_result(job) for job in jobs]
+        succeeded = sum(1 for result in results if result['status'] in ('published', 'unchanged'))
+        logger.info(f"Batch mirror finished: {succeeded}/{len(results)} URLs published or unchanged")
+        return results
+
+    def discover_sitemaps(self, site_url):
+        """Return the sitemaps to read for site_url: itself, or for a site root its robots.txt Sitemap: lines or /sitemap.xml."""
+        parsed = urlparse(site_url)
+        if parsed.path not in ('', '/') or parsed.query:
+            return [site_url]
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        try:
+            response = self._fetch(f"{origin}/robots.txt")
+            if response.status_code == 200:
+                listed = []
+                for line in response.text.splitlines():
+                    field, _, value = line.partition(':')
+                    if field.strip().lower() == 'sitemap' and value.strip():
+                        listed.append(urljoin(origin + '/', value.strip()))
+                if listed:
+                    logger.info(f"Found {len(listed)} sitemaps in {origin}/robots.txt")
+                    return listed
+        except Exception as e:
+            logger.debug(f"Could not read {origin}/robots.txt: {e}")
+        return [f"{origin}/sitemap.xml"]
+
+    def fetch_sitemap_entries(self, sitemap_urls):
+        """Return {crawl_url: ((domain, path, crawl_url), lastmod)} for the pages the sitemaps list, or None if none could be read.
+
+        Sitemap indexes are followed; pages on other hosts than their sitemap
+        are ignored, as the sitemaps protocol requires.
+        """
+        pending = deque(sitemap_urls)
+        seen = set()
+        read = 0
+        foreign = 0
+        entries = {}
+        while pending:
+            sitemap_url = pending.popleft()
+            if sitemap_url in seen:
+                continue
+            if len(seen) >= MAX_SITEMAP_FILES:
+                logger.warning(f"Stopping after {MAX_SITEMAP_FILES} sitemap files; {len(pending) + 1} not read")
+                break
+            seen.add(sitemap_url)
+            try:
+                response = self._fetch(sitemap_url)
+                response.raise_for_status()
+                kind, listed = parse_sitemap(response.content)
+            except Exception as e:
+                logger.warning(f"Skipping sitemap {sitemap_url}: {e}")
+                continue
+            read += 1
+            sitemap_host = (urlparse(sitemap_url).hostname or '').lower()
+            for loc, lastmod in listed:
+                loc = urljoin(sitemap_url, loc)
+                if (urlparse(loc).hostname or '').lower() != sitemap_host:
+                    foreign += 1
+                    continue
+                if kind == 'sitemapindex':
+                    pending.append(loc)
+                    continue
+                try:
+                    target = parse_target_url(loc)
+                except ValueError as e:
+                    logger.debug(f"Ignoring sitemap entry {loc}: {e}")
+                    continue
+                entries.setdefault(target[2], (target, normalize_lastmod(lastmod)))
+        if foreign:
+            logger.warning(f"Ignored {foreign} sitemap entries on other hosts than their sitemap")
+        if not read:
+            logger.error("No sitemap could be read")
+            return None
+        return entries
+
+    def mirror_sitemap(self, sitemap_urls, state_path, pipeline_depth=None):
+        """Mirror the new and changed pages listed by sitemaps; return one result per queued page, or None.
+
+        state_path records each page's <lastmod> and CID as of its last
+        successful mirror. A page is queued again only when its lastmod moves
+        (pages without a lastmod are mirrored once); changed pages go first,
+        most recently modified first, then new pages in sitemap order.
+        """
+        with self.metrics.stage('sitemap'):
+            entries = self.fetch_sitemap_entries(sitemap_urls)
+        if entries is None:
+            self.write_metrics()
+            return None
+
+        state = load_json_state(state_path, {})
+        changed = []
+        new = []
+        for crawl_url, (target, lastmod) in entries.items():
+            record = state.get(crawl_url)
+            if not record or not record.get('cid'):
+                new.append(target)
+            elif lastmod is not None and lastmod != record.get('lastmod'):
+                changed.append(target)
+        changed.sort(key=lambda target: entries[target[2]][1], reverse=True)
+        logger.info(
+            f"🗺️ Sitemap lists {len(entries)} pages: {len(changed)} changed, {len(new)} new, "
+            f"{len(entries) - len(changed) - len(new)} unchanged since their last mirror"
+        )
+        targets = changed + new
+        if not targets:
+            self.write_metrics()
+            return []
+
+        results = self.mirror_batch(targets, pipeline_depth=pipeline_depth)
+        captured_at = int(time.time())
+        for result in results:
+            if result['status'] in ('published', 'unchanged'):
+                state[result['url']] = {
+                    'lastmod': entries[result['url']][1],
+                    'cid': result['ipfs_hash'],
+                    'captured_at': captured_at,
+                }
+        save_json_state(state_path, state)
+        return results
+
+
+class MirrorScheduler:
+    """Re-mirrors targets forever through one warm DiscoMirror, on per-target adaptive intervals.
+
+    Targets wait in a priority queue ordered by when they are next due. Each
+    round takes up to batch_size due targets through mirror_batch; a target
+    whose capture produced a new bundle comes back sooner, one that was
+    unchanged later, within [min_interval, max_interval]; telling the two
+    apart needs the mirror's published_state_path (--skip-unchanged). Failures
+    retry with exponential backoff. Each target waits before its capture while
+    the bytes fetched over the last hour exceed the bandwidth budget. State
+    survives restarts in state_path.
+    """
+
+    def __init__(self, mirror, targets, state_path, min_interval=None, max_interval=None, batch_size=None,
+                 bandwidth_bytes_per_hour=None):
+        if min_interval is None:
+            min_interval = os.getenv("DISCOBALL_DAEMON_MIN_INTERVAL", "900")
+        if max_interval is None:
+            max_interval = os.getenv("DISCOBALL_DAEMON_MAX_INTERVAL", str(7 * 24 * 3600))
+        if batch_size is None:
+            batch_size = os.getenv("DISCOBALL_DAEMON_BATCH", "20")
+        if bandwidth_bytes_per_hour is None:
+            bandwidth_bytes_per_hour = int(float(os.getenv("DISCOBALL_BANDWIDTH_MB_PER_HOUR", "0")) * 1024 * 1024)
+        self.mirror = mirror
+        self.state_path = state_path
+        self.min_interval = max(1.0, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.batch_size = max(1, int(batch_size))
+        self.bandwidth_bytes_per_hour = max(0, int(bandwidth_bytes_per_hour))
+        self.stop_event = threading.Event()
+        self._bandwidth_log = deque()
+        self._bytes_logged = 0
+
+        saved = load_json_state(state_path, {})
+        now = time.time()
+        self.targets = {}
+        self.schedule = {}
+        self._queue = []
+        for domain, path, crawl_url in targets:
+            self.targets[crawl_url] = (domain, path, crawl_url)
+            record = saved.get(crawl_url) or {'interval': self.min_interval, 'next_due': now, 'cid': None, 'failures': 0}
+            record['interval'] = min(max(record['interval'], self.min_interval), self.max_interval)
+            self.schedule[crawl_url] = record
+            heapq.heappush(self._queue, (record['next_due'], crawl_url))
+        logger.info(f"🗓️ Scheduling {len(self.targets)} targets ({len(self.targets) - len(saved.keys() & self.targets.keys())} new)")
+
+    def run(self, max_rounds=None):
+        """Mirror due targets until stop() is called (or max_rounds rounds have run)."""
+        rounds = 0
+        while not self.stop_event.is_set() and (max_rounds is None or rounds < max_rounds):
+            wait = self._queue[0][0] - time.time() if self._queue else None
+            if wait is None:
+                logger.warning("No targets to schedule")
+                return
+            if wait > 0:
+                logger.info(f"💤 Next target due in {int(wait)}s")
+                if self.stop_event.wait(wait):
+                    return
+                continue
+            self.run_round()
+            rounds += 1
+
+    def stop(self, *_):
+        """Finish the round in progress, then return from run()."""
+        if not self.stop_event.is_set():
+            logger.info("🛑 Stopping after the current round")
+        self.stop_event.set()
+
+    def run_round(self):
+        """Mirror the targets that are due now (at most batch_size, most overdue first); return their results."""
+        now = time.time()
+        due = []
+        while self._queue and self._queue[0][0] <= now and len(due) < self.batch_size:
+            due.append(heapq.heappop(self._queue)[1])
+        if not due:
+            return []
+        logger.info(f"🗓️ {len(due)} targets due; {len(self._queue)} waiting")
+        self._bytes_logged = self.mirror.metrics.host_total('bytes')
+        try:
+            results = self.mirror.mirror_batch(
+                [self.targets[crawl_url] for crawl_url in due],
+                before_capture=lambda target: self._wait_for_bandwidth(),
+            )
+        except Exception as e:
+            logger.exception(f"Mirror round failed: {e}")
+            results = [{'url': crawl_url, 'status': 'failed', 'ipfs_hash': None} for crawl_url in due]
+        self._log_bandwidth()
+        finished = time.time()
+        for result in results:
+            self._reschedule(result, finished)
+        mirrored = {result['url'] for result in results}
+        for crawl_url in due:
+            if crawl_url not in mirrored:
+                # Stopped while waiting for bandwidth: still due, keep its place.
+                heapq.heappush(self._queue, (self.schedule[crawl_url]['next_due'], crawl_url))
+        save_json_state(self.state_path, self.schedule)
+        return results
+
+    def _reschedule(self, result, now):
+        """Adjust a target's interval from its latest result and queue it again."""
+        record = self.schedule[result['url']]
+        record['last_status'] = result['status']
+        record['last_run'] = int(now)
+        if result['status'] in ('published', 'unchanged'):
+            changed = result['ipfs_hash'] != record.get('cid')
+            if record.get('cid') is not None:
+                factor = RECRAWL_SHRINK_FACTOR if changed else RECRAWL_GROWTH_FACTOR
+                record['interval'] = min(max(record['interval'] * factor, self.min_interval), self.max_interval)
+            record['cid'] = result['ipfs_hash']
+            record['failures'] = 0
+            delay = record['interval']
+        else:
+            record['failures'] = record.get('failures', 0) + 1
+            delay = min(self.min_interval * 2 ** (record['failures'] - 1), self.max_interval)
+        delay *= 1 + random.uniform(-RECRAWL_JITTER, RECRAWL_JITTER)
+        record['next_due'] = now + delay
+        heapq.heappush(self._queue, (record['next_due'], result['url']))
+
+    def _log_bandwidth(self):
+        """Add the bytes fetched since the last call to the bandwidth window."""
+        total = self.mirror.metrics.host_total('bytes')
+        if total > self._bytes_logged:
+            self._bandwidth_log.append((time.time(), total - self._bytes_logged))
+        self._bytes_logged = total
+
+    def _wait_for_bandwidth(self):
+        """Wait until the last hour's fetched bytes are under budget; return False if stopped meanwhile."""
+        if self.stop_event.is_set():
+            return False
+        if not self.bandwidth_bytes_per_hour:
+            return True
+        self._log_bandwidth()
+        while True:
+            horizon = time.time() - BANDWIDTH_WINDOW_SECONDS
+            while self._bandwidth_log and self._bandwidth_log[0][0] <= horizon:
+                self._bandwidth_log.popleft()
+            used = sum(byte_count for _, byte_count in self._bandwidth_log)
+            if used < self.bandwidth_bytes_per_hour:
+                return True
+            wait = self._bandwidth_log[0][0] - horizon
+            logger.info(f"⏳ Fetched {used // (1024 * 1024)} MB in the last hour; waiting {int(wait)}s for bandwidth budget")
+            if self.stop_event.wait(wait):
+                return False
 
 
 def parse_target_url(raw_url):
@@ -966,9 +3963,43 @@ def resolve_private_key(private_key_arg, private_key_file):
         f"or create {private_key_file} via deploy-and-verify."
     )
 
+def read_url_file(url_file):
+    """Read one URL per line into (domain, path, crawl_url) targets, skipping repeats."""
+    targets = []
+    seen = set()
+    with open(url_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                target = parse_target_url(line)
+            except ValueError as e:
+                raise ValueError(f"{url_file}:{line_number}: {e}")
+            if target[2] not in seen:
+                seen.add(target[2])
+                targets.append(target)
+    return targets
+
+
+def read_publish_batch(batch_file):
+    """Read '<url> <ipfs_hash>' lines into (domain, path, ipfs_hash) publish entries."""
+    entries = []
+    with open(batch_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError(f"{batch_file}:{line_number}: expected '<url> <ipfs_hash>'")
+            domain, path, _ = parse_target_url(fields[0])
+            entries.append((domain, path, fields[1]))
+    return entries
+
 def main():
     parser = argparse.ArgumentParser(description='🪩 Disco Dance - Mirror your own site')
-    parser.add_argument('url', help='Full URL to mirror (e.g., https://example.com/page)')
+    parser.add_argument('url', nargs='?', help='Full URL to mirror (e.g., https://example.com/page)')
     parser.add_argument('--private-key', help='Ethereum private key')
     parser.add_argument(
         '--private-key-file',
@@ -977,18 +4008,285 @@ def main():
     )
     parser.add_argument('--rpc-url', default='https://mainnet.base.org', help='RPC URL for Base network')
     parser.add_argument('--ipfs-api', default='/ip4/127.0.0.1/tcp/5001', help='IPFS API endpoint')
+    parser.add_argument(
+        '--asset-workers',
+        type=int,
+        default=None,
+        help='Parallel asset downloads per page (default: DISCOBALL_ASSET_WORKERS or 1)'
+    )
+    parser.add_argument(
+        '--state-dir',
+        default=os.getenv("DISCOBALL_STATE_DIR", ".discoball"),
+        help='Directory for persistent local state such as caches (default: .discoball)'
+    )
+    parser.add_argument(
+        '--work-dir',
+        default=None,
+        help='Keep the bundle and a progress journal here so an interrupted run resumes where it stopped'
+    )
+    parser.add_argument(
+        '--http-cache',
+        action='store_true',
+        help='Revalidate fetches against an on-disk HTTP cache in the state dir (ETag/Last-Modified)'
+    )
+    parser.add_argument(
+        '--http-cache-max-mb',
+        type=float,
+        default=None,
+        help='HTTP cache size limit before LRU eviction (default: DISCOBALL_HTTP_CACHE_MAX_MB or 512)'
+    )
+    parser.add_argument(
+        '--content-addressed',
+        action='store_true',
+        help='Name assets by content hash and reuse known IPFS blocks via a digest-to-CID index in the state dir'
+    )
+    parser.add_argument(
+        '--skip-unchanged',
+        action='store_true',
+        help='Skip IPFS upload and publishing when the bundle matches the last CID published for this domain/path'
+    )
+    parser.add_argument(
+        '--stream-upload',
+        action='store_true',
+        help='Write bundle files into IPFS (via MFS) while the crawl is still running'
+    )
+    parser.add_argument(
+        '--optimize-assets',
+        action='store_true',
+        help='Minify CSS/JS, clean up SVG and losslessly recompress PNG/JPEG before bundling'
+    )
+    parser.add_argument(
+        '--fetch-backend',
+        choices=FETCH_BACKENDS,
+        default=None,
+        help='HTTP client for page and asset fetches; http2 needs httpx[http2] (default: DISCOBALL_FETCH_BACKEND or requests)'
+    )
+    parser.add_argument(
+        '--host-limits',
+        metavar='FILE',
+        default=None,
+        help='JSON file with default and per-host request rates/concurrency (default: DISCOBALL_HOST_LIMITS or host-limits.json)'
+    )
+    parser.add_argument(
+        '--html-rewriter',
+        choices=HTML_REWRITERS,
+        default=None,
+        help='tree parses each page with BeautifulSoup; stream rewrites it in one pass with flat memory, '
+             'for very large pages (default: DISCOBALL_HTML_REWRITER or tree)'
+    )
+    parser.add_argument(
+        '--html-parser',
+        choices=['lxml', 'html.parser'],
+        default=None,
+        help='BeautifulSoup parser for captured pages (default: DISCOBALL_HTML_PARSER or html.parser)'
+    )
+    parser.add_argument(
+        '--max-asset-mb',
+        type=float,
+        default=None,
+        help='Skip assets larger than this (default: DISCOBALL_MAX_ASSET_MB or 0 = unlimited)'
+    )
+    parser.add_argument(
+        '--max-deferred-wait',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help='Retry assets from rate-limited hosts once their cooldown ends, waiting up to this long per snapshot '
+             '(default: DISCOBALL_MAX_DEFERRED_WAIT or 0 = skip them)'
+    )
+    parser.add_argument(
+        '--max-snapshot-mb',
+        type=float,
+        default=None,
+        help='Stop localizing assets once a snapshot has downloaded this much (default: DISCOBALL_MAX_SNAPSHOT_MB or 0 = unlimited)'
+    )
+    parser.add_argument(
+        '--publish-batch',
+        metavar='FILE',
+        help="Publish already-uploaded bundles listed as '<url> <ipfs_hash>' lines instead of mirroring a URL"
+    )
+    parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        default=None,
+        help='Write stage timings and per-host fetch metrics here; .prom for a Prometheus textfile, else JSON (default: DISCOBALL_METRICS_FILE)'
+    )
+    parser.add_argument(
+        '--url-file',
+        metavar='FILE',
+        help='Mirror every URL listed in FILE (one per line), overlapping capture, upload and publish'
+    )
+    parser.add_argument(
+        '--sitemap',
+        metavar='URL',
+        help='Mirror the pages a sitemap.xml lists (a site root finds it via robots.txt), '
+             'skipping those whose <lastmod> has not changed since their last mirror'
+    )
+    parser.add_argument(
+        '--report',
+        metavar='FILE',
+        default=None,
+        help='Where --url-file and --sitemap write their per-URL results (default: <state-dir>/batch-report.json)'
+    )
+    parser.add_argument(
+        '--pipeline-depth',
+        type=int,
+        default=None,
+        help='Bundles each --url-file stage may queue for the next (default: DISCOBALL_PIPELINE_DEPTH or 2)'
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running and re-mirror the URL / --url-file targets on adaptive intervals; '
+             'implies --skip-unchanged (state in <state-dir>/schedule.json)'
+    )
+    parser.add_argument(
+        '--min-interval',
+        type=float,
+        default=None,
+        help='Shortest --daemon recrawl interval in seconds (default: DISCOBALL_DAEMON_MIN_INTERVAL or 900)'
+    )
+    parser.add_argument(
+        '--max-interval',
+        type=float,
+        default=None,
+        help='Longest --daemon recrawl interval in seconds (default: DISCOBALL_DAEMON_MAX_INTERVAL or 604800)'
+    )
+    parser.add_argument(
+        '--daemon-batch',
+        type=int,
+        default=None,
+        help='Due targets --daemon mirrors per round (default: DISCOBALL_DAEMON_BATCH or 20)'
+    )
+    parser.add_argument(
+        '--bandwidth-mb-per-hour',
+        type=float,
+        default=None,
+        help='Pause --daemon rounds while the last hour fetched more than this (default: DISCOBALL_BANDWIDTH_MB_PER_HOUR or 0 = unlimited)'
+    )
+    parser.add_argument(
+        '--crawl',
+        action='store_true',
+        help='Follow same-origin links from the URL and mirror every page into one bundle'
+    )
+    parser.add_argument(
+        '--max-pages',
+        type=int,
+        default=None,
+        help='Page limit for --crawl (default: DISCOBALL_CRAWL_MAX_PAGES or 100)'
+    )
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=None,
+        help='Link depth limit for --crawl (default: DISCOBALL_CRAWL_MAX_DEPTH or 3)'
+    )
     
     args = parser.parse_args()
+    if not args.url and not args.publish_batch and not args.url_file and not args.sitemap:
+        parser.error("a URL to mirror (or --url-file / --sitemap / --publish-batch) is required")
+    if args.sitemap and (args.url or args.url_file or args.crawl):
+        parser.error("--sitemap cannot be combined with a URL, --url-file or --crawl")
+    if args.daemon and (args.publish_batch or args.sitemap or args.crawl):
+        parser.error("--daemon mirrors a URL or --url-file targets; it cannot be combined with --publish-batch, --sitemap or --crawl")
     
     try:
-        domain, path, crawl_url = parse_target_url(args.url)
         private_key = resolve_private_key(args.private_key, args.private_key_file)
+        # Bad input fails here, before the mirror loads its network clients.
+        targets = target = sitemap_url = None
+        if not args.publish_batch:
+            targets = read_url_file(args.url_file) if args.url_file else None
+            target = parse_target_url(args.url) if args.url else None
+            sitemap_url = parse_target_url(args.sitemap)[2] if args.sitemap else None
 
         # Initialize disco mirror
-        mirror = DiscoMirror(private_key, args.rpc_url, args.ipfs_api)
+        mirror = DiscoMirror(
+            private_key,
+            args.rpc_url,
+            args.ipfs_api,
+            asset_workers=args.asset_workers,
+            crawl_max_pages=args.max_pages,
+            crawl_max_depth=args.max_depth,
+            http_cache_dir=os.path.join(args.state_dir, "http-cache") if args.http_cache else None,
+            http_cache_max_bytes=(
+                int(args.http_cache_max_mb * 1024 * 1024) if args.http_cache_max_mb is not None else None
+            ),
+            content_addressed=args.content_addressed,
+            cid_index_path=os.path.join(args.state_dir, "cid-index.json") if args.content_addressed else None,
+            published_state_path=(
+                os.path.join(args.state_dir, "published.json") if args.skip_unchanged or args.daemon else None
+            ),
+            html_parser=args.html_parser,
+            html_rewriter=args.html_rewriter,
+            max_asset_bytes=int(args.max_asset_mb * 1024 * 1024) if args.max_asset_mb is not None else None,
+            max_snapshot_bytes=int(args.max_snapshot_mb * 1024 * 1024) if args.max_snapshot_mb is not None else None,
+            max_deferred_wait=args.max_deferred_wait,
+            stream_upload=args.stream_upload,
+            optimize_assets=args.optimize_assets,
+            outbox_path=os.path.join(args.state_dir, "outbox.json"),
+            host_limits_path=args.host_limits,
+            fetch_backend=args.fetch_backend,
+            work_dir=args.work_dir,
+            metrics_path=args.metrics_file,
+        )
+
+        if args.publish_batch:
+            results = mirror.publish_batch(read_publish_batch(args.publish_batch))
+            for result in results:
+                if result['status'] == 'published' and mirror.published_state_path:
+                    mirror._record_published_cid(result['domain'], result['path'], result['ipfs_hash'])
+                marker = "✅" if result['status'] == 'published' else "❌"
+                detail = result.get('tx_hash') or result.get('error', '')
+                print(f"{marker} {result['domain']}{result['path']} {result['ipfs_hash']}: {result['status']} {detail}")
+            mirror.write_metrics()
+            exit(0 if all(result['status'] == 'published' for result in results) else 1)
+
+        if args.daemon:
+            targets = targets or []
+            if target and target not in targets:
+                targets.insert(0, target)
+            scheduler = MirrorScheduler(
+                mirror,
+                targets,
+                os.path.join(args.state_dir, "schedule.json"),
+                min_interval=args.min_interval,
+                max_interval=args.max_interval,
+                batch_size=args.daemon_batch,
+                bandwidth_bytes_per_hour=(
+                    int(args.bandwidth_mb_per_hour * 1024 * 1024) if args.bandwidth_mb_per_hour is not None else None
+                ),
+            )
+            signal.signal(signal.SIGTERM, scheduler.stop)
+            scheduler.run()
+            exit(0)
+
+        if args.url_file or sitemap_url:
+            if sitemap_url:
+                results = mirror.mirror_sitemap(
+                    mirror.discover_sitemaps(sitemap_url),
+                    os.path.join(args.state_dir, "sitemap-state.json"),
+                    pipeline_depth=args.pipeline_depth,
+                )
+                if results is None:
+                    print(f"\n❌ Could not read a sitemap for {sitemap_url}")
+                    exit(1)
+            else:
+                if target and target not in targets:
+                    targets.insert(0, target)
+                results = mirror.mirror_batch(targets, crawl=args.crawl, pipeline_depth=args.pipeline_depth)
+            report_path = args.report or os.path.join(args.state_dir, "batch-report.json")
+            save_json_state(report_path, {'generated_at': int(time.time()), 'results': results})
+            for result in results:
+                marker = "✅" if result['status'] in ('published', 'unchanged') else "❌"
+                detail = result['ipfs_hash'] or result['error'] or ''
+                print(f"{marker} {result['url']}: {result['status']} {detail}")
+            print(f"\n📝 Batch report written to {report_path}")
+            exit(0 if all(result['status'] in ('published', 'unchanged') for result in results) else 1)
+
+        domain, path, crawl_url = target
         
         # Mirror the site
-        success, dns_verified = mirror.mirror_site(domain, path, crawl_url)
+        success, dns_verified = mirror.mirror_site(domain, path, crawl_url, crawl=args.crawl)
         
         if success:
             print(f"\n🎉 Successfully mirrored {crawl_url}")
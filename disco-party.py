@@ -14,14 +14,16 @@ The friends.txt file should contain one Ethereum address per line:
 """
 
 import argparse
-import ipfshttpclient
 import json
 import os
-from web3 import Web3
 import logging
 import time
+from collections import deque
 from typing import List, Dict
 
+# web3, ipfshttpclient and dnspython (via discoball_dns) are imported where
+# they are first needed, so --help, --create-sample and --stats stay fast.
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -67,27 +69,71 @@ CONTRACT_ABI = [
     }
 ]
 
+# Multicall3, deployed at the same address on Base and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3_SIGNATURE = "aggregate3((address,bool,bytes)[])"
+ENTRY_COUNT_SIGNATURE = "getEntryCountByPublisher(address)"
+ENTRIES_SIGNATURE = "getEntriesByPublisher(address,uint256,uint256)"
+MIRROR_ENTRY_TYPE = "(string,string,string,address,uint256,uint256)[]"
+# Entry-count reads packed into one aggregate3 call; each returns a single word
+MULTICALL_MAX_COUNTS = 500
+
 class DiscoParty:
-    def __init__(self, rpc_url="https://mainnet.base.org", ipfs_api="/ip4/127.0.0.1/tcp/5001"):
-        """Initialize the disco party with Web3 and IPFS connections."""
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+    def __init__(self, rpc_url="https://mainnet.base.org", ipfs_api="/ip4/127.0.0.1/tcp/5001", verified_only=False,
+                 multicall=True, multicall_max_entries=None):
+        """Initialize the disco party with an IPFS connection; Web3 and the resolver load on first use."""
+        self.rpc_url = rpc_url
+        self._w3 = None
+        self._contract = None
+        self._dns_verifier = None
+        self.verified_only = verified_only
+        self.multicall = multicall
+        if multicall_max_entries is None:
+            multicall_max_entries = os.getenv("DISCOBALL_MULTICALL_MAX_ENTRIES", "1000")
+        # Upper bound on registry entries per aggregate3 call, lowered below any size the RPC refuses;
+        # the working cap is halved on a refusal and grows back towards the bound.
+        self.multicall_max_entries = max(1, int(multicall_max_entries))
+        self._multicall_entry_cap = self.multicall_max_entries
         
         try:
+            import ipfshttpclient
+
             self.ipfs = ipfshttpclient.connect(ipfs_api)
             logger.info(f"Connected to IPFS at {ipfs_api}")
         except Exception as e:
             logger.error(f"Failed to connect to IPFS: {e}")
             raise
             
-        # Initialize contract
-        if CONTRACT_ADDRESS != "0x...":
-            self.contract = self.w3.eth.contract(
-                address=Web3.to_checksum_address(CONTRACT_ADDRESS),
+        if CONTRACT_ADDRESS == "0x...":
+            logger.error("Contract address not set. Please update CONTRACT_ADDRESS in the script.")
+
+    @property
+    def w3(self):
+        """Web3 connection to the RPC endpoint, created on first use."""
+        if self._w3 is None:
+            from web3 import Web3
+
+            self._w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+        return self._w3
+
+    @property
+    def contract(self):
+        """DiscoBallRegistry contract handle, or None while CONTRACT_ADDRESS is unset."""
+        if self._contract is None and CONTRACT_ADDRESS != "0x...":
+            self._contract = self.w3.eth.contract(
+                address=self.w3.to_checksum_address(CONTRACT_ADDRESS),
                 abi=CONTRACT_ABI
             )
-        else:
-            logger.error("Contract address not set. Please update CONTRACT_ADDRESS in the script.")
-            self.contract = None
+        return self._contract
+
+    @property
+    def dns_verifier(self):
+        """TXT record resolver, created on first use."""
+        if self._dns_verifier is None:
+            from discoball_dns import DnsVerifier
+
+            self._dns_verifier = DnsVerifier()
+        return self._dns_verifier
     
     def load_friends(self, friends_file="friends.txt"):
         """Load friend addresses from file."""
@@ -96,6 +142,8 @@ class DiscoParty:
             logger.info("Create friends.txt with one Ethereum address per line")
             return []
         
+        from eth_utils import to_checksum_address
+
         friends = []
         try:
             with open(friends_file, 'r') as f:
@@ -105,7 +153,7 @@ class DiscoParty:
                         # Basic address validation
                         if line.startswith('0x') and len(line) == 42:
                             try:
-                                checksum_addr = Web3.to_checksum_address(line)
+                                checksum_addr = to_checksum_address(line)
                                 friends.append(checksum_addr)
                                 logger.debug(f"Added friend: {checksum_addr}")
                             except Exception as e:
@@ -156,6 +204,164 @@ class DiscoParty:
             logger.error(f"Failed to get entries for {publisher_address}: {e}")
             return []
     
+    def get_entries_for_publishers(self, publishers, batch_size=50):
+        """Get all entries for many publishers, batching the registry reads through Multicall3.
+
+        Every entry count comes back from one aggregate3 call, then the
+        batch_size pages are packed into aggregate3 calls of at most
+        multicall_max_entries entries. Publishers Multicall3 cannot serve are
+        read one call at a time with get_publisher_entries.
+        """
+        if not self.contract:
+            logger.error("Smart contract not initialized")
+            return {publisher: [] for publisher in publishers}
+        if not self.multicall:
+            return {publisher: self.get_publisher_entries(publisher, batch_size) for publisher in publishers}
+
+        try:
+            counts = self._multicall_entry_counts(publishers)
+        except Exception as e:
+            logger.warning(f"Multicall3 read failed, falling back to one call per publisher: {e}")
+            return {publisher: self.get_publisher_entries(publisher, batch_size) for publisher in publishers}
+
+        entries = {}
+        pages = []
+        for publisher in publishers:
+            total_count = counts.get(publisher)
+            if total_count is None:
+                entries[publisher] = self.get_publisher_entries(publisher, batch_size)
+                continue
+            logger.info(f"Publisher {publisher} has {total_count} entries")
+            entries[publisher] = []
+            pages.extend(
+                (publisher, offset, min(batch_size, total_count - offset))
+                for offset in range(0, total_count, batch_size)
+            )
+
+        failed = set()
+        for (publisher, offset, limit), page_entries in self._multicall_entry_pages(pages):
+            if publisher in failed:
+                continue
+            if page_entries is None:
+                try:
+                    page_entries = self.contract.functions.getEntriesByPublisher(publisher, offset, limit).call()
+                except Exception as e:
+                    logger.error(f"Failed to get entries for {publisher}: {e}")
+                    failed.add(publisher)
+                    entries[publisher] = []
+                    continue
+            entries[publisher].extend(page_entries)
+
+        for publisher in publishers:
+            if counts.get(publisher) is not None and publisher not in failed:
+                logger.info(f"Retrieved {len(entries[publisher])} entries for {publisher}")
+        return entries
+
+    def _aggregate3(self, calls):
+        """Run (target, calldata) calls in one Multicall3 eth_call; return [(success, return data)]."""
+        from eth_abi import decode, encode
+        from eth_utils import function_signature_to_4byte_selector
+
+        calldata = function_signature_to_4byte_selector(AGGREGATE3_SIGNATURE) + encode(
+            ['(address,bool,bytes)[]'],
+            [[(target, True, data) for target, data in calls]],
+        )
+        result = self.w3.eth.call({'to': MULTICALL3_ADDRESS, 'data': calldata})
+        return decode(['(bool,bytes)[]'], bytes(result))[0]
+
+    def _multicall_entry_counts(self, publishers):
+        """Return {publisher: entry count} via aggregate3; publishers whose read reverted are left out."""
+        from eth_abi import decode, encode
+        from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+        registry = to_checksum_address(CONTRACT_ADDRESS)
+        selector = function_signature_to_4byte_selector(ENTRY_COUNT_SIGNATURE)
+        counts = {}
+        for start in range(0, len(publishers), MULTICALL_MAX_COUNTS):
+            chunk = publishers[start:start + MULTICALL_MAX_COUNTS]
+            results = self._aggregate3([(registry, selector + encode(['address'], [publisher])) for publisher in chunk])
+            for publisher, (success, data) in zip(chunk, results):
+                if not success:
+                    continue
+                try:
+                    counts[publisher] = decode(['uint256'], data)[0]
+                except Exception as e:
+                    logger.warning(f"Could not decode the entry count of {publisher}: {e}")
+        logger.info(f"📇 Read entry counts for {len(publishers)} publishers in {-(-len(publishers) // MULTICALL_MAX_COUNTS)} calls")
+        return counts
+
+    def _multicall_entry_pages(self, pages):
+        """Yield ((publisher, offset, limit), entries) for each page, packing pages into aggregate3 calls.
+
+        entries is None for a page Multicall3 could not read or decode. When the RPC
+        rejects a call (response size or eth_call gas limits), the entries
+        cap is halved, oversized pages are split, and the call is retried;
+        each successful call lets the cap grow back by one page, up to just
+        below the smallest size the RPC refused.
+        """
+        from eth_abi import decode, encode
+        from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+        registry = to_checksum_address(CONTRACT_ADDRESS)
+        selector = function_signature_to_4byte_selector(ENTRIES_SIGNATURE)
+        pending = deque(pages)
+        calls_made = 0
+        while pending:
+            publisher, offset, limit = pending.popleft()
+            if limit > self._multicall_entry_cap:
+                pending.appendleft((publisher, offset + self._multicall_entry_cap, limit - self._multicall_entry_cap))
+                limit = self._multicall_entry_cap
+            chunk = [(publisher, offset, limit)]
+            chunk_entries = limit
+            while pending and chunk_entries + pending[0][2] <= self._multicall_entry_cap:
+                chunk.append(pending.popleft())
+                chunk_entries += chunk[-1][2]
+
+            try:
+                calls_made += 1
+                results = self._aggregate3([
+                    (registry, selector + encode(['address', 'uint256', 'uint256'], [publisher, offset, limit]))
+                    for publisher, offset, limit in chunk
+                ])
+            except Exception as e:
+                if chunk_entries <= 1:
+                    logger.warning(f"Multicall3 could not read entry {chunk[0][1]} of {chunk[0][0]}: {e}")
+                    yield chunk[0], None
+                    continue
+                # Never grow back to a size the RPC has refused.
+                self.multicall_max_entries = min(self.multicall_max_entries, chunk_entries - 1)
+                self._multicall_entry_cap = max(1, chunk_entries // 2)
+                logger.warning(
+                    f"RPC rejected a {chunk_entries}-entry multicall ({e}); "
+                    f"retrying with at most {self._multicall_entry_cap} entries per call"
+                )
+                split_pages = []
+                for publisher, offset, limit in chunk:
+                    for split_offset in range(offset, offset + limit, self._multicall_entry_cap):
+                        split_pages.append(
+                            (publisher, split_offset, min(self._multicall_entry_cap, offset + limit - split_offset))
+                        )
+                pending.extendleft(reversed(split_pages))
+                continue
+
+            self._multicall_entry_cap = min(self.multicall_max_entries, self._multicall_entry_cap + chunk[0][2])
+            for page, (success, data) in zip(chunk, results):
+                if not success:
+                    yield page, None
+                    continue
+                try:
+                    # Checksummed publishers, as a contract call through web3 returns them
+                    page_entries = [
+                        (domain, path, ipfs_hash, to_checksum_address(publisher), timestamp, entry_id)
+                        for domain, path, ipfs_hash, publisher, timestamp, entry_id in decode([MIRROR_ENTRY_TYPE], data)[0]
+                    ]
+                except Exception as e:
+                    logger.warning(f"Could not decode entries {page[1]}-{page[1] + page[2] - 1} of {page[0]}: {e}")
+                    page_entries = None
+                yield page, page_entries
+        if calls_made:
+            logger.info(f"📇 Read {len(pages)} entry pages in {calls_made} multicalls")
+
     def pin_ipfs_hash(self, ipfs_hash, metadata=None):
         """Pin an IPFS hash locally."""
         try:
@@ -178,15 +384,22 @@ class DiscoParty:
             logger.error(f"Failed to pin {ipfs_hash}: {e}")
             return False
     
-    def pin_friend_content(self, friend_address):
-        """Pin all content from a specific friend."""
+    def pin_friend_content(self, friend_address, entries=None):
+        """Pin all content from a specific friend (entries, if given, are their already-fetched registry entries)."""
         logger.info(f"🪩 Processing friend: {friend_address}")
         
-        entries = self.get_publisher_entries(friend_address)
+        if entries is None:
+            entries = self.get_publisher_entries(friend_address)
         if not entries:
             logger.info(f"No entries found for {friend_address}")
             return 0
         
+        if self.verified_only:
+            entries = self.filter_verified_entries(entries)
+            if not entries:
+                logger.info(f"No DNS-verified entries for {friend_address}")
+                return 0
+        
         pinned_count = 0
         for entry in entries:
             domain, path, ipfs_hash, publisher, timestamp, entry_id = entry
@@ -208,6 +421,22 @@ class DiscoParty:
         logger.info(f"✨ Pinned {pinned_count}/{len(entries)} entries for {friend_address}")
         return pinned_count
     
+    def filter_verified_entries(self, entries):
+        """Keep entries whose domain's DNS TXT record names their publisher."""
+        from discoball_dns import normalize_domain
+
+        answers = self.dns_verifier.lookup_many({entry[0] for entry in entries})
+        verified = []
+        for entry in entries:
+            domain, path, ipfs_hash, publisher = entry[:4]
+            answer = answers.get(normalize_domain(domain))
+            if answer and publisher.lower() in self.dns_verifier.verified_addresses(answer):
+                verified.append(entry)
+            else:
+                logger.info(f"⏭️ Skipping unverified mirror {domain}{path} ({ipfs_hash})")
+        logger.info(f"🔎 {len(verified)}/{len(entries)} entries are DNS-verified")
+        return verified
+    
     def start_party(self, friends_file="friends.txt"):
         """Start the disco party - pin all friends' content."""
         logger.info("🎉 Starting the disco party!")
@@ -220,10 +449,16 @@ class DiscoParty:
         
         total_pinned = 0
         successful_friends = 0
+        try:
+            entries_by_friend = self.get_entries_for_publishers(friends)
+        except Exception as e:
+            # Each friend's entries are then read on their own below.
+            logger.error(f"Failed to read friends' registry entries: {e}")
+            entries_by_friend = {}
         
         for friend in friends:
             try:
-                pinned_count = self.pin_friend_content(friend)
+                pinned_count = self.pin_friend_content(friend, entries_by_friend.get(friend))
                 if pinned_count > 0:
                     successful_friends += 1
                     total_pinned += pinned_count
@@ -276,6 +511,22 @@ def main():
     parser.add_argument('--ipfs-api', default='/ip4/127.0.0.1/tcp/5001', help='IPFS API endpoint')
     parser.add_argument('--create-sample', action='store_true', help='Create a sample friends.txt file')
     parser.add_argument('--stats', action='store_true', help='Show IPFS statistics')
+    parser.add_argument(
+        '--verified-only',
+        action='store_true',
+        help='Only pin mirrors whose domain has a discoball-site-verification TXT record for the publisher'
+    )
+    parser.add_argument(
+        '--no-multicall',
+        action='store_true',
+        help='Read the registry with one eth_call per publisher and page instead of batching through Multicall3'
+    )
+    parser.add_argument(
+        '--multicall-max-entries',
+        type=int,
+        default=None,
+        help='Registry entries per Multicall3 call before the RPC limits shrink it (default: DISCOBALL_MULTICALL_MAX_ENTRIES or 1000)'
+    )
     
     args = parser.parse_args()
     
@@ -285,7 +536,13 @@ def main():
             return
         
         # Initialize disco party
-        party = DiscoParty(args.rpc_url, args.ipfs_api)
+        party = DiscoParty(
+            args.rpc_url,
+            args.ipfs_api,
+            verified_only=args.verified_only,
+            multicall=not args.no_multicall,
+            multicall_max_entries=args.multicall_max_entries,
+        )
         
         if args.stats:
             party.show_stats()
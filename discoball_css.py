@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+🪩 DiscoBall CSS reference scanner
+
+Finds and rewrites the URLs a stylesheet depends on in a single tokenizing
+pass: url(...) tokens (quoted or not, with CSS escapes), @import targets,
+and bare strings inside image-set(). Comments and ordinary strings are
+skipped as whole tokens, so url( inside them is never mistaken for a
+reference. @font-face src descriptors are covered by their url() tokens,
+while local() and format() strings are left alone. The same token rules
+drive minify_css, which only touches whitespace and comments between them.
+"""
+
+import re
+
+# Every alternative starts with a literal character so the regex engine can
+# skip ahead to candidate positions instead of trying each branch everywhere.
+_URL_BODY = r'[rR][lL]\(\s*(?:"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\'|[^)\\"\'\s]*(?:\\.[^)\\"\'\s]*)*)\s*\)'
+_IMAGE_SET_BODY = r'[mM][aA][gG][eE]-[sS][eE][tT]\('
+_CSS_TOKEN = re.compile(
+    r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+    r'|/\*.*'
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+    r'|u' + _URL_BODY +
+    r'|U' + _URL_BODY +
+    r'|i' + _IMAGE_SET_BODY +
+    r'|I' + _IMAGE_SET_BODY +
+    r'|@[iI][mM][pP][oO][rR][tT](?![\w-])'
+    r'|\\.',
+    re.DOTALL,
+)
+# Tokens inside image-set(...), where nesting has to be tracked
+_IMAGE_SET_TOKEN = re.compile(
+    r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/'
+    r'|/\*.*'
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+    r'|u' + _URL_BODY +
+    r'|U' + _URL_BODY +
+    r'|\\.'
+    r'|\('
+    r'|\)',
+    re.DOTALL,
+)
+_IMPORT_TARGET = re.compile(
+    r'(?:\s+|/\*.*?\*/)*'
+    r'((?:[uU]' + _URL_BODY + r')|"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\')',
+    re.DOTALL,
+)
+# Tokens minify_css must copy verbatim, plus the whitespace and comments it may drop
+_MINIFY_TOKEN = re.compile(
+    r'(?P<comment>/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*.*)'
+    r'|(?P<space>\s+)'
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+    r'|[uU]' + _URL_BODY +
+    r'|\\.',
+    re.DOTALL,
+)
+# Whitespace next to these never separates tokens
+_SPACE_NOT_NEEDED_AFTER = set('{};,(:')
+_SPACE_NOT_NEEDED_BEFORE = set('{};,)!')
+_EMPTY_DECLARATIONS = re.compile(r';+(\})|;{2,}')
+_CSS_ESCAPE = re.compile(r'\\(?:([0-9a-fA-F]{1,6})[ \t\n\r\f]?|(\n)|(.))', re.DOTALL)
+
+
+def _unescape_css(value):
+    """Decode CSS escapes (\\2f, \\", line continuations) in a token value."""
+    if '\\' not in value:
+        return value
+
+    def decode(match):
+        if match.group(1):
+            codepoint = int(match.group(1), 16)
+            if codepoint == 0 or codepoint > 0x10FFFF or 0xD800 <= codepoint <= 0xDFFF:
+                return '\ufffd'
+            return chr(codepoint)
+        if match.group(2):
+            return ''
+        return match.group(3)
+
+    return _CSS_ESCAPE.sub(decode, value)
+
+
+def _string_value(token):
+    """Return the decoded contents of a quoted string token."""
+    quote = token[0]
+    body = token[1:-1] if len(token) > 1 and token.endswith(quote) else token[1:]
+    return _unescape_css(body)
+
+
+def _url_value(token):
+    """Return the decoded URL inside a url(...) token."""
+    inner = token[4:-1].strip()
+    if inner[:1] in ('"', "'"):
+        return _string_value(inner)
+    return _unescape_css(inner)
+
+
+def _may_have_references(css_text):
+    """Cheap check that lets reference-free CSS (most style attributes) skip the scan."""
+    lowered = css_text.lower()
+    return 'url(' in lowered or 'image-set(' in lowered or '@import' in lowered
+
+
+def _follows_identifier(css_text, position):
+    """Return True if the character before position continues an identifier (e.g. the 'x' in xurl()."""
+    if position == 0:
+        return False
+    previous = css_text[position - 1]
+    return previous.isalnum() or previous in '-_' or ord(previous) > 0x7F
+
+
+def _scan_references(css_text):
+    """Yield (kind, value, start, end, drop_start, drop_end) for each URL reference.
+
+    kind is 'url', 'image-set' or 'import'. start/end span the token to
+    replace; drop_start/drop_end span what to remove when the reference is
+    dropped (the whole rule for @import).
+    """
+    resume_at = 0
+    for match in _CSS_TOKEN.finditer(css_text):
+        start = match.start()
+        if start < resume_at:
+            # Already consumed by an image-set() or @import scan below.
+            continue
+        first = css_text[start]
+
+        if first in 'uU':
+            if not _follows_identifier(css_text, start):
+                end = match.end()
+                yield 'url', _url_value(match.group()), start, end, start, end
+        elif first in 'iI':
+            if not _follows_identifier(css_text, start) or css_text.endswith('-webkit-', 0, start):
+                resume_at = yield from _scan_image_set(css_text, match.end())
+        elif first == '@':
+            target = _IMPORT_TARGET.match(css_text, match.end())
+            if target:
+                token_start, resume_at = target.span(1)
+                token = target.group(1)
+                value = _string_value(token) if token[0] in '"\'' else _url_value(token)
+                statement_end = css_text.find(';', resume_at)
+                statement_end = len(css_text) if statement_end < 0 else statement_end + 1
+                yield 'import', value, token_start, resume_at, start, statement_end
+
+
+def _scan_image_set(css_text, position):
+    """Yield references inside an image-set() whose arguments start at position; return its end."""
+    depth = 1
+    search = _IMAGE_SET_TOKEN.search
+    while depth:
+        match = search(css_text, position)
+        if match is None:
+            return len(css_text)
+        start, position = match.span()
+        first = css_text[start]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth -= 1
+        elif first in '"\'' and depth == 1:
+            yield 'image-set', _string_value(match.group()), start, position, start, position
+        elif first in 'uU' and not _follows_identifier(css_text, start):
+            yield 'url', _url_value(match.group()), start, position, start, position
+    return position
+
+
+def find_css_references(css_text):
+    """Return [(kind, url)] for every URL reference in css_text, in source order."""
+    if not css_text or not _may_have_references(css_text):
+        return []
+    return [(kind, value) for kind, value, _, _, _, _ in _scan_references(css_text)]
+
+
+def rewrite_css_references(css_text, replace):
+    """Return css_text with every URL reference passed through replace(kind, url).
+
+    replace returns the new URL, None to keep the reference untouched, or ''
+    to drop it: url("") for url() tokens and image-set() strings, and the
+    whole rule for @import.
+    """
+    if not css_text or not _may_have_references(css_text):
+        return css_text
+    pieces = []
+    position = 0
+    for kind, value, start, end, drop_start, drop_end in _scan_references(css_text):
+        new_url = replace(kind, value)
+        if new_url is None:
+            continue
+        if new_url == '' and kind == 'import':
+            pieces.append(css_text[position:drop_start])
+            position = drop_end
+            continue
+
+        escaped_url = new_url.replace('\\', '\\\\').replace('"', '\\"') if '\\' in new_url or '"' in new_url else new_url
+        pieces.append(css_text[position:start])
+        pieces.append(f'url("{escaped_url}")' if kind == 'url' else f'"{escaped_url}"')
+        position = end
+    pieces.append(css_text[position:])
+    return ''.join(pieces)
+
+
+def _is_name_char(char):
+    """Return True if char can continue a CSS identifier or number."""
+    return char.isalnum() or char in '-_%.#' or ord(char) > 0x7F
+
+
+def minify_css(css_text):
+    """Return css_text with comments dropped and whitespace collapsed.
+
+    Strings, url() tokens and escapes are copied untouched, /*! comments
+    (licence headers) are kept, and a space survives wherever it could
+    separate two tokens, so the result parses to the same stylesheet.
+    """
+    pieces = []
+    pending_space = False
+    pending_comment = False
+    last_plain = False
+    position = 0
+
+    def emit(text, plain=False):
+        nonlocal pending_space, pending_comment, last_plain
+        if plain:
+            # Plain text between tokens holds no whitespace or strings; drop empty declarations.
+            text = _EMPTY_DECLARATIONS.sub(lambda match: match.group(1) or ';', text)
+        if text[0] == '}' and last_plain:
+            pieces[-1] = pieces[-1].rstrip(';')
+            if not pieces[-1]:
+                pieces.pop()
+        previous = pieces[-1][-1] if pieces else ''
+        if pending_space and previous and previous not in _SPACE_NOT_NEEDED_AFTER and text[0] not in _SPACE_NOT_NEEDED_BEFORE:
+            pieces.append(' ')
+        elif pending_comment and previous and _is_name_char(previous) and _is_name_char(text[0]):
+            # A dropped comment still separated two names (a/**/b); keep an empty one.
+            pieces.append('/**/')
+        pieces.append(text)
+        pending_space = pending_comment = False
+        last_plain = plain
+
+    for match in _MINIFY_TOKEN.finditer(css_text):
+        if match.start() > position:
+            emit(css_text[position:match.start()], plain=True)
+        position = match.end()
+        if match.group('space') is not None:
+            pending_space = True
+        elif match.group('comment') is not None:
+            if match.group().startswith('/*!'):
+                emit(match.group())
+            else:
+                pending_comment = True
+        else:
+            emit(match.group())
+    if position < len(css_text):
+        emit(css_text[position:], plain=True)
+    return ''.join(pieces)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+🪩 DiscoBall DNS verification
+
+Shared by disco-dance.py and disco-party.py to check the
+discoball-site-verification=0xAddress TXT records that tie a domain to a
+publisher. Lookups for many domains run concurrently on dnspython's async
+resolver, and answers are cached in memory for the record TTL (negative
+answers for the zone's SOA negative TTL).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import dns.asyncresolver
+import dns.rdatatype
+import dns.resolver
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_PREFIX = "discoball-site-verification="
+
+# Cache bounds, in seconds
+MAX_CACHE_TTL = 24 * 3600
+ERROR_CACHE_TTL = 30
+
+
+def normalize_domain(domain):
+    """Return the cache key for a domain name."""
+    return domain.strip().rstrip('.').lower()
+
+
+class DnsVerifier:
+    """Resolves TXT records for many domains at once and caches the answers for their TTL."""
+
+    def __init__(self, concurrency=None, timeout=None, negative_ttl=None):
+        if concurrency is None:
+            concurrency = os.getenv("DISCOBALL_DNS_CONCURRENCY", "32")
+        if timeout is None:
+            timeout = os.getenv("DISCOBALL_DNS_TIMEOUT", "5")
+        if negative_ttl is None:
+            negative_ttl = os.getenv("DISCOBALL_DNS_NEGATIVE_TTL", "300")
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = float(timeout)
+        self.negative_ttl = max(0, int(negative_ttl))
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, domain):
+        """Return {'records': [...], 'error': ...} for one domain's TXT records."""
+        return self.lookup_many([domain])[normalize_domain(domain)]
+
+    def lookup_many(self, domains):
+        """Resolve TXT records for many domains concurrently, keyed by normalized domain.
+
+        records is [] for NXDOMAIN/no TXT records. On resolver failures it is
+        None and error holds the reason.
+        """
+        wanted = {normalize_domain(domain) for domain in domains if domain and domain.strip()}
+        answers = {}
+        now = time.time()
+        with self._lock:
+            for domain in wanted:
+                cached = self._cache.get(domain)
+                if cached and cached[0] > now:
+                    answers[domain] = cached[1]
+
+        pending = sorted(wanted - answers.keys())
+        if pending:
+            if len(pending) > 1:
+                logger.info(f"Resolving TXT records for {len(pending)} domains")
+            resolved = asyncio.run(self._resolve_all(pending))
+            now = time.time()
+            with self._lock:
+                for domain, answer, ttl in resolved:
+                    self._cache[domain] = (now + min(ttl, MAX_CACHE_TTL), answer)
+                    answers[domain] = answer
+        return answers
+
+    def is_verified(self, domain, address):
+        """Return True if the domain's TXT records name address as its publisher."""
+        return address.lower() in self.verified_addresses(self.lookup(domain))
+
+    def verified_addresses(self, answer):
+        """Return the lowercased addresses claimed by discoball-site-verification records."""
+        return {
+            record[len(VERIFICATION_PREFIX):].strip().lower()
+            for record in answer['records'] or []
+            if record.startswith(VERIFICATION_PREFIX)
+        }
+
+    async def _resolve_all(self, domains):
+        resolver = dns.asyncresolver.Resolver()
+        resolver.lifetime = self.timeout
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def resolve_one(domain):
+            async with semaphore:
+                try:
+                    answer = await resolver.resolve(domain, 'TXT')
+                except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+                    return domain, {'records': [], 'error': None}, self._negative_ttl(e)
+                except Exception as e:
+                    return domain, {'records': None, 'error': str(e) or type(e).__name__}, ERROR_CACHE_TTL
+            records = [b''.join(rdata.strings).decode('utf-8', 'replace') for rdata in answer]
+            return domain, {'records': records, 'error': None}, answer.rrset.ttl
+
+        return await asyncio.gather(*(resolve_one(domain) for domain in domains))
+
+    def _negative_ttl(self, error):
+        """Return how long a negative answer may be cached (RFC 2308), from the SOA if present."""
+        response = None
+        if isinstance(error, dns.resolver.NoAnswer):
+            response = error.kwargs.get('response')
+        elif isinstance(error, dns.resolver.NXDOMAIN):
+            response = next(iter(error.responses().values()), None)
+        for rrset in getattr(response, 'authority', None) or []:
+            if rrset.rdtype == dns.rdatatype.SOA:
+                return min(rrset.ttl, rrset[0].minimum)
+        return self.negative_ttl
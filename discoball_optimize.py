@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+🪩 DiscoBall asset optimizer
+
+Shrinks captured assets before they go into a snapshot bundle, without
+changing how they render or behave:
+
+  - CSS: comments and redundant whitespace (discoball_css.minify_css)
+  - JavaScript: indentation, trailing spaces and blank lines; line breaks
+    stay, so automatic semicolon insertion is unaffected
+  - SVG: comments, <metadata> and Inkscape/Sodipodi editor data
+  - PNG: image data recompressed at maximum zlib effort, text chunks dropped
+  - JPEG: comment, XMP and Photoshop segments dropped (scan data untouched)
+
+Everything is standard library; anything unexpected returns the input as is,
+and so do assets over OPTIMIZE_MAX_BYTES and PNGs whose pixels would not fit
+in PNG_MAX_PIXEL_BYTES, so memory stays bounded whatever a page links to.
+"""
+
+import re
+import struct
+import zlib
+
+from discoball_css import minify_css
+
+# Content type -> optimizer kind, used as the key of the savings report
+OPTIMIZED_CONTENT_TYPES = {
+    'text/css': 'css',
+    'application/javascript': 'js',
+    'application/x-javascript': 'js',
+    'text/javascript': 'js',
+    'image/svg+xml': 'svg',
+    'image/png': 'png',
+    'image/jpeg': 'jpeg',
+}
+
+# Larger assets are stored as downloaded rather than read into memory
+OPTIMIZE_MAX_BYTES = 16 * 1024 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Decompressed image data (filtered scanlines) a PNG may expand to before it is left alone
+PNG_MAX_PIXEL_BYTES = 64 * 1024 * 1024
+# Channels per pixel for each PNG color type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Adam7 passes as (x offset, y offset, x step, y step)
+PNG_ADAM7_PASSES = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+# Ancillary chunks that carry no rendering information
+PNG_DROPPED_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+PNG_ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+JPEG_COMMENT = 0xFE
+JPEG_APP1 = 0xE1
+JPEG_APP13 = 0xED
+JPEG_START_OF_SCAN = 0xDA
+JPEG_XMP_PREFIXES = (b'http://ns.adobe.com/xap/1.0/\x00', b'http://ns.adobe.com/xmp/extension/\x00')
+
+_SVG_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_SVG_METADATA = re.compile(r'<metadata\b[^>]*?(?:/>|>.*?</metadata\s*>)', re.DOTALL)
+_SVG_NAMEDVIEW = re.compile(r'<sodipodi:namedview\b[^>]*?(?:/>|>.*?</sodipodi:namedview\s*>)', re.DOTALL)
+_SVG_EDITOR_ATTR = re.compile(r'\s(?:inkscape|sodipodi):[\w.-]+\s*=\s*(?:"[^"]*"|\'[^\']*\')')
+_SVG_SPACE_BETWEEN_TAGS = re.compile(r'>\s+<')
+# Documents where comments or inter-tag whitespace may be meaningful are left alone
+_SVG_UNSAFE_MARKERS = ('<script', '<![CDATA[', '<!ENTITY')
+# Whitespace between tags only renders inside text content
+_SVG_TEXT_MARKERS = ('<text', '<tspan', '<foreignObject')
+
+
+def optimize_asset(data, content_type):
+    """Return (kind, optimized bytes) for a supported asset, or None if content_type is not optimized.
+
+    The optimized bytes are never larger than data.
+    """
+    kind = OPTIMIZED_CONTENT_TYPES.get(content_type)
+    if kind is None:
+        return None
+    if len(data) > OPTIMIZE_MAX_BYTES:
+        return kind, data
+    try:
+        optimized = _OPTIMIZERS[kind](data)
+    except (ValueError, IndexError, zlib.error, struct.error, UnicodeDecodeError):
+        optimized = data
+    return kind, optimized if len(optimized) < len(data) else data
+
+
+def _optimize_css(data):
+    return minify_css(data.decode('utf-8')).encode('utf-8')
+
+
+def _optimize_js(data):
+    """Strip indentation, trailing whitespace and blank lines from JavaScript."""
+    source = data.decode('utf-8')
+    if '`' in source or re.search(r'\\\r?$', source, re.MULTILINE):
+        # Template literals and line continuations keep leading whitespace inside strings.
+        return data
+    # Split on \n alone: str.splitlines() also breaks on U+2028, form feeds and
+    # the like, which may sit raw inside a string literal.
+    lines = (line.strip(' \t\r') for line in source.split('\n'))
+    return '\n'.join(line for line in lines if line).encode('utf-8')
+
+
+def _optimize_svg(data):
+    """Drop comments, metadata and editor-only markup from an SVG document."""
+    document = data.decode('utf-8')
+    if any(marker in document for marker in _SVG_UNSAFE_MARKERS):
+        return data
+    document = _SVG_COMMENT.sub('', document)
+    document = _SVG_METADATA.sub('', document)
+    document = _SVG_NAMEDVIEW.sub('', document)
+    document = _SVG_EDITOR_ATTR.sub('', document)
+    if not any(marker in document for marker in _SVG_TEXT_MARKERS):
+        document = _SVG_SPACE_BETWEEN_TAGS.sub('><', document)
+    return document.strip().encode('utf-8')
+
+
+def _png_chunks(data):
+    """Yield (type, body, raw chunk bytes) for each chunk of a PNG file."""
+    position = len(PNG_SIGNATURE)
+    while position < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        end = position + 12 + length
+        if end > len(data):
+            raise ValueError("truncated PNG chunk")
+        yield chunk_type, data[position + 8:position + 8 + length], data[position:end]
+        position = end
+        if chunk_type == b'IEND':
+            return
+
+
+def _png_chunk(chunk_type, body):
+    return struct.pack('>I', len(body)) + chunk_type + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+
+def _png_image_data_size(header):
+    """Return the decompressed IDAT size an IHDR chunk body implies (filter bytes included)."""
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', header[:13])
+    if color_type not in PNG_CHANNELS:
+        raise ValueError("invalid PNG color type")
+    bits_per_pixel = bit_depth * PNG_CHANNELS[color_type]
+    passes = PNG_ADAM7_PASSES if interlace else ((0, 0, 1, 1),)
+    size = 0
+    for x_offset, y_offset, x_step, y_step in passes:
+        pass_width = (width - x_offset + x_step - 1) // x_step
+        pass_height = (height - y_offset + y_step - 1) // y_step
+        if pass_width > 0 and pass_height > 0:
+            size += pass_height * (1 + (pass_width * bits_per_pixel + 7) // 8)
+    return size
+
+
+def _optimize_png(data):
+    """Recompress PNG image data as a single IDAT chunk; pixels are unchanged."""
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    chunks = list(_png_chunks(data))
+    if any(chunk_type == b'acTL' for chunk_type, _, _ in chunks):
+        # Animated PNG frames live in fdAT chunks this does not touch.
+        return data
+    if not chunks or chunks[0][0] != b'IHDR':
+        return data
+    expected_size = _png_image_data_size(chunks[0][1])
+    if expected_size > PNG_MAX_PIXEL_BYTES:
+        return data
+    # Decompress no more than the header promises, so a zlib bomb cannot exhaust memory.
+    decompressor = zlib.decompressobj()
+    pixels = decompressor.decompress(
+        b''.join(body for chunk_type, body, _ in chunks if chunk_type == b'IDAT'),
+        expected_size + 1,
+    )
+    if len(pixels) != expected_size or decompressor.unconsumed_tail:
+        return data
+    candidates = []
+    for strategy in PNG_ZLIB_STRATEGIES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        candidates.append(compressor.compress(pixels) + compressor.flush())
+    image_data = min(candidates, key=len)
+
+    pieces = [PNG_SIGNATURE]
+    wrote_image_data = False
+    for chunk_type, _, raw in chunks:
+        if chunk_type == b'IDAT':
+            if not wrote_image_data:
+                pieces.append(_png_chunk(b'IDAT', image_data))
+                wrote_image_data = True
+        elif chunk_type not in PNG_DROPPED_CHUNKS:
+            pieces.append(raw)
+    return b''.join(pieces)
+
+
+def _optimize_jpeg(data):
+    """Drop comment, XMP and Photoshop segments; EXIF (orientation) and ICC profiles stay."""
+    if not data.startswith(b'\xff\xd8'):
+        return data
+    pieces = [data[:2]]
+    position = 2
+    while position < len(data):
+        if data[position] != 0xFF:
+            raise ValueError("JPEG marker expected")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        segment_end = position + 2 + length
+        if segment_end > len(data):
+            raise ValueError("truncated JPEG segment")
+        if marker == JPEG_START_OF_SCAN:
+            pieces.append(data[position:])
+            break
+        body = data[position + 4:segment_end]
+        dropped = (
+            marker == JPEG_COMMENT
+            or marker == JPEG_APP13
+            or (marker == JPEG_APP1 and body.startswith(JPEG_XMP_PREFIXES))
+        )
+        if not dropped:
+            pieces.append(data[position:segment_end])
+        position = segment_end
+    return b''.join(pieces)
+
+
+_OPTIMIZERS = {
+    'css': _optimize_css,
+    'js': _optimize_js,
+    'svg': _optimize_svg,
+    'png': _optimize_png,
+    'jpeg': _optimize_jpeg,
+}